@@ -1,16 +1,20 @@
 from pathlib import Path
 from slither import backend
+from slither.backend.backend import DEFAULT_URL
 from slither.util import util_logging, database
+from slither.util.metrics import start_http_server
 import logging
 from dotenv import load_dotenv
 import os
+import datetime as dt
 
 if __name__ == "__main__":
 
     print('setting up logging...')
     log_dir = Path.cwd() / 'logs'
     log_file = 'main.log'
-    util_logging.setup_logging(log_dir, log_file, logging.INFO)
+    # formatting and file writes happen on a background thread, off the scrape loop
+    util_logging.setup_logging(log_dir, log_file, logging.INFO, flg_queue = True)
     logger = logging.getLogger('default')
     print('loading environment variables...')
     load_dotenv()
@@ -18,12 +22,28 @@ if __name__ == "__main__":
     database = database.SlitherDatabase(
         connection_string=os.environ['CONN_STRING_POSTGRES'],
         # connection_string=os.environ['CONN_STRING_SQLITE'],
-        logger = logger
+        logger = logger,
+        # e.g. SLITHER_PARTITION_HOURS=24 to partition server_user_rank daily and drop old days instead of exiting at the size cap
+        partition_interval = dt.timedelta(hours=float(os.environ['SLITHER_PARTITION_HOURS'])) if os.environ.get('SLITHER_PARTITION_HOURS') else None,
+        archive_dir = os.environ.get('SLITHER_ARCHIVE_DIR'),
+        # seconds between exact storage size samples, sizes are extrapolated from the inserts in between
+        stats_sample_interval = float(os.environ.get('SLITHER_STATS_INTERVAL', 300))
     )
 
     # database.insert_test_cases()
 
+    if os.environ.get('SLITHER_METRICS_PORT'):
+        # e.g. SLITHER_METRICS_PORT=9464 serves the cycle metrics at http://127.0.0.1:9464/metrics
+        start_http_server(int(os.environ['SLITHER_METRICS_PORT']))
+
     backend(
         logger,
-        database = database
+        database = database,
+        url = os.environ.get('SLITHER_URL', DEFAULT_URL),
+        interval = float(os.environ.get('SLITHER_INTERVAL', 3)),
+        # e.g. SLITHER_MIN_INTERVAL=1 SLITHER_MAX_INTERVAL=10 to follow how often the leaderboard changes
+        min_interval = float(os.environ['SLITHER_MIN_INTERVAL']) if os.environ.get('SLITHER_MIN_INTERVAL') else None,
+        max_interval = float(os.environ['SLITHER_MAX_INTERVAL']) if os.environ.get('SLITHER_MAX_INTERVAL') else None,
+        # seconds between the per-stage timing summaries in the log
+        summary_interval = float(os.environ.get('SLITHER_SUMMARY_INTERVAL', 60))
     )
\ No newline at end of file
@@ -0,0 +1,42 @@
+import logging
+import os
+
+import click
+from dotenv import load_dotenv
+
+from slither.util import SlitherDatabase
+
+
+@click.command()
+@click.option('--connection-string', default=None, help="Defaults to $CONN_STRING_POSTGRES.")
+@click.option('--table', 'tables', multiple=True, type=click.Choice(['user_run', 'user_rank_run']),
+              help="Run table to recompute, repeatable. Defaults to both.")
+@click.option('--chunk-rows', default=100_000, show_default=True, help="Rows of history replayed between checkpoints.")
+@click.option('--shards', default=1, show_default=True, help="server_id ranges replayed in parallel by a process pool.")
+@click.option('--name', default='replay', show_default=True, help="Checkpoint name; an interrupted replay of the same name resumes.")
+@click.option('--restart', is_flag=True, help="Ignore the checkpoints of an interrupted replay.")
+def main(connection_string, tables, chunk_rows, shards, name, restart):
+    """Recompute user_run / user_rank_run from the history stored in server_user_rank.
+
+    Stop the backend first; it keeps its open runs in memory.
+    """
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    logger = logging.getLogger('backfill')
+    database = SlitherDatabase(
+        connection_string=connection_string or os.environ['CONN_STRING_POSTGRES'],
+        logger=logger
+    )
+    database.ensure_schema()
+    database.replay_runs(
+        tables = tables or ('user_run', 'user_rank_run'),
+        chunk_rows = chunk_rows,
+        n_shards = shards,
+        name = name,
+        flg_restart = restart
+    )
+    database.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import datetime as dt
+import logging
+import os
+import random
+import string
+import time
+
+import click
+from dotenv import load_dotenv
+
+from slither.util import SlitherDatabase
+
+
+def synthetic_batch(n_servers: int, n_rows: int, cycle: int) -> list[dict]:
+    """Build one scrape cycle worth of server tables in the shape process_table returns."""
+    server_time = (dt.datetime(2025, 1, 1, tzinfo=dt.timezone.utc) + dt.timedelta(seconds=3 * cycle)).isoformat()
+    batch = []
+    for server_idx in range(n_servers):
+        batch.append({
+            'server_id': f"bench_{server_idx}",
+            'server_ip': f"10.0.{server_idx // 256}.{server_idx % 256}",
+            'server_time': server_time,
+            'records': [
+                {
+                    'rank': rank,
+                    'nick': ''.join(random.choices(string.ascii_letters, k=8)),
+                    'score': str(random.randint(1_000, 100_000))
+                }
+                for rank in range(1, n_rows + 1)
+            ]
+        })
+    return batch
+
+
+def run_per_server(database: SlitherDatabase, batches: list[list[dict]]) -> float:
+    start = time.perf_counter()
+    for cycle, batch in enumerate(batches):
+        created_at = dt.datetime.now(dt.timezone.utc)
+        if database.database_type == 'sqlite':
+            # sqlite3 cannot bind the pandas Timestamp the per-server path produces
+            created_at = created_at.isoformat()
+        for data in batch:
+            database.server_user_rank_insert(data, created_at = created_at)
+    return time.perf_counter() - start
+
+
+def run_batched(database: SlitherDatabase, batches: list[list[dict]]) -> float:
+    start = time.perf_counter()
+    for cycle, batch in enumerate(batches):
+        database.server_user_rank_insert_batch(batch, created_at = dt.datetime.now(dt.timezone.utc))
+    return time.perf_counter() - start
+
+
+@click.command()
+@click.option('--connection-string', default=None, help="Defaults to $CONN_STRING_SQLITE.")
+@click.option('--servers', default=300, show_default=True)
+@click.option('--rows', default=10, show_default=True)
+@click.option('--cycles', default=5, show_default=True)
+def main(connection_string, servers, rows, cycles):
+    """Compare rows/sec of the per-server insert path against the batched path.
+
+    Both paths write into server_user_rank, which is truncated before each run.
+    """
+    load_dotenv()
+    logging.basicConfig(level=logging.WARNING)
+    logger = logging.getLogger('benchmark')
+    database = SlitherDatabase(
+        connection_string=connection_string or os.environ['CONN_STRING_SQLITE'],
+        logger=logger
+    )
+    database.validate_storage(flg_drop_table = True)
+
+    n_rows = servers * rows * cycles
+    for label, runner in [('per-server', run_per_server), ('batched', run_batched)]:
+        # fresh synthetic data per path, so neither run hits the primary key of the other
+        batches = [synthetic_batch(servers, rows, cycle) for cycle in range(cycles)]
+        database.query("DELETE FROM server_user_rank;", fetch = 'none', flg_commit = True)
+        elapsed = runner(database, batches)
+        print(f"{label:>10}: {n_rows} rows in {elapsed:.3f}s -> {n_rows / elapsed:,.0f} rows/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import logging
+from pathlib import Path
+import time
+
+from bs4 import BeautifulSoup as soup
+import click
+
+from slither.backend.backend import extract_tables, process_table
+from slither.backend.parser import parse_leaderboard
+
+
+def parse_two_pass(html: str, logger: logging.Logger) -> list[dict]:
+    tables = extract_tables(soup(html, 'html.parser'), logger)
+    return [data for data in (process_table(table, logger) for table in tables) if data]
+
+
+@click.command()
+@click.argument('pages', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--repeat', default=5, show_default=True, help="Parses per page and parser.")
+def main(pages, repeat):
+    """Compare parse throughput of extract_tables + process_table against parse_leaderboard.
+
+    PAGES are saved ntl-slither pages, e.g. the ntl_page_dump.html written with flg_dump_content.
+    """
+    logger = logging.getLogger('benchmark')
+    logger.setLevel(logging.WARNING)
+    htmls = [Path(page).read_text(encoding='utf-8') for page in pages]
+    size_mb = sum(len(html.encode('utf-8')) for html in htmls) / (1024 * 1024)
+
+    for html, page in zip(htmls, pages):
+        if parse_two_pass(html, logger) != parse_leaderboard(html):
+            raise click.ClickException(f"parsers disagree on {page}")
+
+    for label, parse in [('two-pass', lambda html: parse_two_pass(html, logger)), ('single-pass', parse_leaderboard)]:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for html in htmls:
+                parse(html)
+        elapsed = time.perf_counter() - start
+        n_pages = repeat * len(htmls)
+        print(f"{label:>11}: {n_pages / elapsed:8.2f} pages/sec, {repeat * size_mb / elapsed:6.2f} MB/sec")
+
+
+if __name__ == "__main__":
+    main()
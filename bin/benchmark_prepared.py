@@ -0,0 +1,79 @@
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+import click
+from dotenv import load_dotenv
+
+from slither.util import SlitherDatabase
+from slither.util.synthetic import synthetic_cycles
+
+
+def run_cycles(database: SlitherDatabase, cycles: list, flg_prepare: bool) -> float:
+    """Recompute the runs of `cycles` with the SQL run engine, starting from empty run tables."""
+    for table in ('user_run', 'user_rank_run', 'nick_run_stats', 'top_run'):
+        database.query(f"DELETE FROM {table}", fetch = 'none', flg_commit = True)
+    database.top_runs.reset()
+    database.flg_prepare_statements = flg_prepare
+    start = time.perf_counter()
+    for created_at in cycles:
+        database.compute_rank_runs(timestamp = created_at)
+    return time.perf_counter() - start
+
+
+@click.command()
+@click.option('--connection-string', default=None, help="Defaults to $CONN_STRING_POSTGRES, or a temporary SQLite file if unset.")
+@click.option('--servers', default=300, show_default=True)
+@click.option('--rows', default=10, show_default=True)
+@click.option('--cycles', default=1000, show_default=True, help="Cycles to load; servers * rows * cycles rows in total.")
+@click.option('--measure', default=50, show_default=True, help="Trailing cycles to run the run computation for.")
+@click.option('--repeats', default=5, show_default=True, type=click.IntRange(min=1), help="Timed passes per mode, after one warm-up pass each.")
+def main(connection_string, servers, rows, cycles, measure, repeats):
+    """Time the SQL run engine per cycle with and without server-side prepared statements.
+
+    Loads a few million synthetic rows into server_user_rank, then recomputes the runs
+    of the last `measure` cycles in both modes: one untimed warm-up pass each, so neither
+    mode pays for a cold cache, then `repeats` timed passes each, alternating which mode
+    goes first. The difference of the medians per cycle is the planning time the prepared
+    statements save. SQLite reuses compiled statements by their text in either case, so
+    the comparison is only meaningful on Postgres.
+    """
+    load_dotenv()
+    logging.basicConfig(level=logging.WARNING)
+    logger = logging.getLogger('benchmark')
+    with tempfile.TemporaryDirectory() as tmp:
+        database = SlitherDatabase(
+            connection_string=connection_string or os.environ.get('CONN_STRING_POSTGRES') or f"sqlite:///{os.path.join(tmp, 'prepared.db')}",
+            logger=logger,
+            run_engine='sql'
+        )
+        database.validate_storage(flg_drop_table = True)
+
+        start = time.perf_counter()
+        created_ats = []
+        for created_at, batch in synthetic_cycles(servers, rows, cycles, churn = 0.05):
+            database.server_user_rank_insert_batch(batch, created_at = created_at)
+            created_ats.append(created_at)
+        print(f"loaded {servers * rows * cycles:,} rows in {time.perf_counter() - start:.1f}s")
+        if database.database_type == 'postgres':
+            database.query("ANALYZE server_user_rank", fetch = 'none', flg_commit = True)
+
+        measured = created_ats[-measure:]
+        modes = [('unprepared', False), ('prepared', True)]
+        for _, flg_prepare in modes:
+            run_cycles(database, measured, flg_prepare)
+        samples = {label: [] for label, _ in modes}
+        for i in range(repeats):
+            for label, flg_prepare in (modes if i % 2 == 0 else modes[::-1]):
+                samples[label].append(run_cycles(database, measured, flg_prepare) / len(measured))
+        results = {label: statistics.median(elapsed) for label, elapsed in samples.items()}
+        for label, _ in modes:
+            print(f"{label:>10}: {results[label] * 1000:8.2f} ms/cycle (median of {repeats}, {min(samples[label]) * 1000:.2f}-{max(samples[label]) * 1000:.2f})")
+        print(f"{'saved':>10}: {(results['unprepared'] - results['prepared']) * 1000:8.2f} ms/cycle")
+        database.close()
+
+
+if __name__ == "__main__":
+    main()
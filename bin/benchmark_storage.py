@@ -0,0 +1,46 @@
+import logging
+import os
+import tempfile
+import time
+
+import click
+
+from slither.util import SlitherDatabase
+from slither.util.synthetic import synthetic_cycles
+
+
+@click.command()
+@click.option('--servers', default=300, show_default=True)
+@click.option('--rows', default=10, show_default=True)
+@click.option('--cycles', default=200, show_default=True)
+@click.option('--churn', default=0.05, show_default=True, help="Share of ranks replaced by a new player per cycle.")
+def main(servers, rows, cycles, churn):
+    """Compare storage per cycle of the 'rows' and 'compact' storage modes on SQLite.
+
+    Scores drift every cycle, so nearly every server table changes; the compact mode
+    saves space through dictionary encoding and by skipping ranks that did not change.
+    """
+    logging.basicConfig(level=logging.WARNING)
+    logger = logging.getLogger('benchmark')
+    with tempfile.TemporaryDirectory() as tmp:
+        for storage_mode in ('rows', 'compact'):
+            database = SlitherDatabase(
+                connection_string=f"sqlite:///{os.path.join(tmp, storage_mode + '.db')}",
+                logger=logger,
+                storage_mode=storage_mode
+            )
+            database.validate_storage()
+            start = time.perf_counter()
+            for created_at, batch in synthetic_cycles(servers, rows, cycles, churn):
+                database.server_user_rank_insert_batch(batch, created_at = created_at)
+            elapsed = time.perf_counter() - start
+            size_mb = database.fetch_table_size_in_mb()
+            print(
+                f"{storage_mode:>8}: {size_mb:8.2f} MB total, {size_mb * 1024 / cycles:8.2f} KB/cycle, "
+                f"{cycles / elapsed:7.1f} cycles/sec"
+            )
+            database.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+import click
+from dotenv import load_dotenv
+
+from slither.util import SlitherDatabase
+from slither.util.synthetic import synthetic_cycles
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run_case(connection_string: str, run_engine: str, storage_mode: str, logger: logging.Logger, cycles, n_warmup: int) -> dict:
+    """Load `cycles` the way the backend does, one transaction per cycle, and measure the cycles after the warmup."""
+    database = SlitherDatabase(
+        connection_string=connection_string,
+        logger=logger,
+        run_engine=run_engine,
+        storage_mode=storage_mode
+    )
+    try:
+        database.validate_storage(flg_drop_table = True)
+        for table in ('user_run', 'user_rank_run', 'nick_run_stats', 'top_run'):
+            database.query(f"DELETE FROM {table}", fetch = 'none', flg_commit = True)
+        size_before_mb = None
+        latencies = []
+        n_rows = 0
+        for i, (created_at, batch) in enumerate(cycles):
+            if i == n_warmup:
+                size_before_mb = database.fetch_table_size_in_mb()
+            start = time.perf_counter()
+            with database.cycle(created_at):
+                database.server_user_rank_insert_batch(batch, created_at = created_at)
+                database.compute_rank_runs(timestamp = created_at, batch = batch)
+            if i >= n_warmup:
+                latencies.append(time.perf_counter() - start)
+                n_rows += sum(len(data['records']) for data in batch)
+        size_after_mb = database.fetch_table_size_in_mb()
+    finally:
+        database.close()
+    return {
+        'cycles': len(latencies),
+        'cycles_per_sec': len(latencies) / sum(latencies),
+        'rows_per_sec': n_rows / sum(latencies),
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': max(latencies) * 1000,
+        'size_mb': size_after_mb,
+        'growth_kb_per_cycle': (size_after_mb - size_before_mb) * 1024 / len(latencies)
+    }
+
+
+@click.command()
+@click.option('--servers', default=300, show_default=True)
+@click.option('--rows', default=10, show_default=True, help="Ranks per server table.")
+@click.option('--nicks', default=100_000, show_default=True, help="Distinct nicks players are drawn from.")
+@click.option('--churn', default=0.05, show_default=True, help="Share of ranks taken over by a new player per cycle.")
+@click.option('--cycles', default=200, show_default=True)
+@click.option('--warmup', default=20, show_default=True, help="Leading cycles loaded but not measured.")
+@click.option('--seed', default=0, show_default=True)
+@click.option('--postgres', default=None,
+              help="Postgres to benchmark as well; its slither tables are DROPPED. Defaults to $CONN_STRING_BENCHMARK.")
+@click.option('--run-engine', 'run_engines', multiple=True, type=click.Choice(['memory', 'sql']),
+              help="Repeatable. Defaults to both.")
+@click.option('--storage-mode', 'storage_modes', multiple=True, type=click.Choice(['rows', 'compact']),
+              help="Repeatable. Defaults to both.")
+@click.option('--json', 'json_path', default=None, type=click.Path(dir_okay=False), help="Also write the results to this file.")
+def main(servers, rows, nicks, churn, cycles, warmup, seed, postgres, run_engines, storage_modes, json_path):
+    """Benchmark a full backend cycle, insert and run computation, on synthetic leaderboards.
+
+    Every combination of database, run engine and storage mode loads the same cycles
+    into empty tables and reports throughput, cycle latency and storage growth. Run it
+    before and after a storage or run engine change to compare them.
+    """
+    load_dotenv()
+    logging.basicConfig(level=logging.WARNING)
+    logger = logging.getLogger('benchmark')
+    # every case starts by dropping the tables, which warns
+    logger.setLevel(logging.ERROR)
+    if warmup >= cycles:
+        raise click.BadParameter("must be smaller than --cycles", param_hint='--warmup')
+    postgres = postgres or os.environ.get('CONN_STRING_BENCHMARK')
+    # generated once, so every case sees identical input and generation is not timed
+    data = list(synthetic_cycles(servers, rows, cycles, churn, seed = seed, n_nicks = nicks))
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        databases = [('sqlite', None)] + ([('postgres', postgres)] if postgres else [])
+        for database_name, connection_string in databases:
+            for run_engine in run_engines or ('memory', 'sql'):
+                for storage_mode in storage_modes or ('rows', 'compact'):
+                    if storage_mode == 'compact' and run_engine != 'memory':
+                        continue  # not a supported combination
+                    if database_name == 'sqlite':
+                        connection_string = f"sqlite:///{os.path.join(tmp, f'{run_engine}_{storage_mode}.db')}"
+                    result = {
+                        'database': database_name,
+                        'run_engine': run_engine,
+                        'storage_mode': storage_mode,
+                        **run_case(connection_string, run_engine, storage_mode, logger, data, warmup)
+                    }
+                    results.append(result)
+                    print(
+                        f"{database_name:>8} {run_engine:>6} {storage_mode:>7}: "
+                        f"{result['cycles_per_sec']:7.1f} cycles/sec, p50 {result['p50_ms']:7.2f} ms, "
+                        f"p99 {result['p99_ms']:7.2f} ms, {result['growth_kb_per_cycle']:8.2f} KB/cycle "
+                        f"({result['size_mb']:.2f} MB)"
+                    )
+
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as file:
+            json.dump({
+                'parameters': {
+                    'servers': servers, 'rows': rows, 'nicks': nicks, 'churn': churn,
+                    'cycles': cycles, 'warmup': warmup, 'seed': seed
+                },
+                'results': results
+            }, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+import click
+from dotenv import load_dotenv
+
+from slither.backend import backend
+from slither.backend.cycle_metrics import CycleMetrics, STAGES
+from slither.backend.stub_server import MockSite
+from slither.util import SlitherDatabase
+
+
+def check_replay_matches(database: SlitherDatabase) -> dict[str, int]:
+    """Replay the run tables and return, per table, the number of rows that differ from the live ones."""
+    columns = {
+        'user_run': 'server_id, nick, start_time, end_time, duration_seconds, max_score, min_rank',
+        'user_rank_run': 'server_id, nick, rank, start_time, end_time, duration_seconds'
+    }
+    live = {table: set(database.query(f"SELECT {columns[table]} FROM {table}", fetch = 'all')) for table in columns}
+    database.replay_runs()
+    replayed = {table: set(database.query(f"SELECT {columns[table]} FROM {table}", fetch = 'all')) for table in columns}
+    return {table: len(live[table] ^ replayed[table]) for table in columns}
+
+
+@click.command()
+@click.option('--connection-string', default=None, help="Database to load into; its slither tables are DROPPED. Defaults to a temporary SQLite file.")
+@click.option('--run-engine', default='memory', show_default=True, type=click.Choice(['memory', 'sql']))
+@click.option('--servers', default=300, show_default=True)
+@click.option('--rows', default=10, show_default=True)
+@click.option('--churn', default=0.05, show_default=True, help="Share of ranks taken over by a new player per page refresh.")
+@click.option('--nicks', default=100_000, show_default=True)
+@click.option('--cycles', default=50, show_default=True)
+@click.option('--interval', default=0.5, show_default=True, help="Seconds between fetches, and between page refreshes of the mock site.")
+@click.option('--latency', default=0.05, show_default=True, help="Seconds the mock site waits before every response.")
+@click.option('--jitter', default=0.05, show_default=True, help="Up to this many seconds added to the latency at random.")
+@click.option('--check-replay', is_flag=True, help="Afterwards replay the run tables from the stored history and compare them with the live ones.")
+def main(connection_string, run_engine, servers, rows, churn, nicks, cycles, interval, latency, jitter, check_replay):
+    """Run the backend end to end against a local mock ntl-slither site and report throughput and latency.
+
+    Exercises fetch, parse, insert and run computation exactly as in production,
+    without touching the real site. With --check-replay the replay must reproduce the
+    runs the 'memory' run engine wrote live, row for row; the exit code is 1 if not.
+    """
+    if check_replay and run_engine != 'memory':
+        raise click.BadParameter("the replay reproduces the 'memory' run engine", param_hint='--run-engine')
+    if check_replay and interval < 1:
+        # server_time has one-second resolution: a table changed twice within a second keeps its
+        # primary key (server_id, server_time, rank, nick) and the changed rows are not stored
+        raise click.BadParameter("must be at least 1 second to store every refresh", param_hint='--interval')
+    load_dotenv()
+    logging.basicConfig(level=logging.WARNING)
+    logger = logging.getLogger('load_test')
+    metrics = CycleMetrics(logger, summary_interval=float('inf'), flg_keep_samples=True)
+    with tempfile.TemporaryDirectory() as tmp, MockSite(
+        logger,
+        n_servers=servers,
+        n_rows=rows,
+        churn=churn,
+        n_nicks=nicks,
+        refresh_interval=interval,
+        latency=latency,
+        latency_jitter=jitter
+    ) as site:
+        database = SlitherDatabase(
+            connection_string=connection_string or f"sqlite:///{os.path.join(tmp, 'load_test.db')}",
+            logger=logger,
+            run_engine=run_engine
+        )
+        database.validate_storage(flg_drop_table = True)
+        start = time.perf_counter()
+        backend(logger, database = database, url = site.url, interval = interval, max_cycles = cycles, metrics = metrics)
+        elapsed = time.perf_counter() - start
+        size_mb = database.fetch_table_size_in_mb()
+        mismatches = check_replay_matches(database) if check_replay else None
+        database.close()
+        n_pages = site.n_pages
+
+    print(f"{cycles} cycles in {elapsed:.1f}s: {cycles / elapsed:.2f} cycles/sec, {n_pages} pages rendered, {size_mb:.2f} MB stored")
+    print(f"{'stage':>12} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for stage in STAGES:
+        samples = sorted(metrics.samples.get(stage, []))
+        if samples:
+            p99 = samples[min(len(samples) - 1, int(0.99 * len(samples)))]
+            print(f"{stage:>12} {statistics.median(samples) * 1000:9.1f} {p99 * 1000:9.1f} {samples[-1] * 1000:9.1f}")
+    print(metrics.summary())
+    if mismatches is not None:
+        print("replay: " + ', '.join(f"{table} {'matches' if not n else f'{n} rows differ'}" for table, n in mismatches.items()))
+        if any(mismatches.values()):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
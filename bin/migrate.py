@@ -0,0 +1,31 @@
+import logging
+import os
+
+import click
+from dotenv import load_dotenv
+
+from slither.util import SlitherDatabase
+
+
+@click.command()
+@click.option('--connection-string', default=None, help="Defaults to $CONN_STRING_POSTGRES.")
+@click.option('--target-version', default=None, type=int, help="Stop after this schema version.")
+@click.option('--explain/--no-explain', default=True, show_default=True, help="Print the plans of the indexed queries.")
+def main(connection_string, target_version, explain):
+    """Bring the schema up to date and show whether the indexed queries use their indexes."""
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    logger = logging.getLogger('migrate')
+    database = SlitherDatabase(
+        connection_string=connection_string or os.environ['CONN_STRING_POSTGRES'],
+        logger=logger
+    )
+    database.validate_storage()
+    database.migrate(target_version = target_version)
+    if explain:
+        database.explain_indexes()
+    database.close()
+
+
+if __name__ == "__main__":
+    main()
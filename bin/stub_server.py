@@ -0,0 +1,49 @@
+import logging
+import time
+
+import click
+
+from slither.backend.stub_server import StubServer, MockSite
+
+
+@click.command()
+@click.argument('page', required=False, type=click.Path(exists=True, dir_okay=False))
+@click.option('--port', default=8000, show_default=True)
+@click.option('--latency', default=0.0, show_default=True, help="Seconds to wait before every response.")
+@click.option('--jitter', default=0.0, show_default=True, help="Up to this many seconds added to the latency at random.")
+@click.option('--servers', default=300, show_default=True, help="Synthetic mode: server tables per page.")
+@click.option('--rows', default=10, show_default=True, help="Synthetic mode: ranks per server table.")
+@click.option('--churn', default=0.05, show_default=True, help="Synthetic mode: share of ranks taken over by a new player per refresh.")
+@click.option('--nicks', default=100_000, show_default=True, help="Synthetic mode: distinct nicks players are drawn from.")
+@click.option('--refresh', default=3.0, show_default=True, help="Synthetic mode: seconds between page changes.")
+def main(page, port, latency, jitter, servers, rows, churn, nicks, refresh):
+    """Serve a recorded ntl-slither PAGE (e.g. ntl_page_dump.html) locally, or synthetic leaderboards without one.
+
+    Point the backend at it with SLITHER_URL=http://127.0.0.1:<port>/ss/?lowts=0.
+    """
+    logging.basicConfig(level=logging.DEBUG)
+    logger = logging.getLogger('stub')
+    if page:
+        server = StubServer.from_file(page, logger, port=port, latency=latency, latency_jitter=jitter)
+        source = page
+    else:
+        server = MockSite(
+            logger,
+            n_servers=servers,
+            n_rows=rows,
+            churn=churn,
+            n_nicks=nicks,
+            refresh_interval=refresh,
+            port=port,
+            latency=latency,
+            latency_jitter=jitter
+        )
+        source = f"{servers} synthetic servers"
+    with server:
+        print(f"serving {source} on {server.url}")
+        while True:
+            time.sleep(3600)
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1 @@
-from .backend import backend
\ No newline at end of file
+from .backend import backend
@@ -10,10 +10,15 @@ from pathlib import Path
 from dotenv import load_dotenv
 
 from slither.util import SlitherDatabase, setup_logging
+from .fetcher import PageFetcher, FetchStage, FetchResult
+from .parser import parse_leaderboard
+from .fingerprint import FingerprintCache
+from .cycle_metrics import CycleMetrics
+from .scheduler import CycleScheduler
 
-def fetch_webpage(url, logger:logging.Logger, flg_dump_content = False):
+def fetch_webpage(url, logger:logging.Logger, flg_dump_content = False, timeout = 10.0):
     logger.info("Fetching webpage...")
-    response = requests.get(url)
+    response = requests.get(url, timeout=timeout)
     if flg_dump_content:
         logger.info("└─ Dumping content...")
         with open('ntl_page_dump.html', 'w', encoding='utf-8') as file:
@@ -83,43 +88,126 @@ def process_table(table, logger:logging.Logger):
 
 
 
+DEFAULT_URL = "https://ntl-slither.com/ss/?lowts=0"
+
+def parse_page(result: FetchResult, logger: logging.Logger) -> list[dict]:
+    logger.info("Extracting tables...")
+    batch = parse_leaderboard(result.text)
+    logger.info(f"│    └─ {len(batch)} server tables found.")
+    return batch
+
 def backend(
     logger: logging.Logger,
-    database: SlitherDatabase
+    database: SlitherDatabase,
+    url: str = DEFAULT_URL,
+    interval: float = 3.0,
+    fetch_timeout: float = 10.0,
+    flg_skip_unchanged: bool = True,
+    max_size_mb: float = 5000,
+    summary_interval: float = 60.0,
+    max_cycles: int | None = None,
+    metrics: CycleMetrics | None = None,
+    min_interval: float | None = None,
+    max_interval: float | None = None
     ):
-
-    while True:
-        logger.info("Starting load...")
-        time_now = dt.datetime.now(dt.timezone.utc) # later used to timestamp every record created in one iteration of this while loop.
-        logger.info(f"└─ {time_now.isoformat()}")
-
-        database.validate_storage(
-            flg_drop_table = False
-        )
-
-        url = "https://ntl-slither.com/ss/?lowts=0"
-
-        content = fetch_webpage(url, logger, flg_dump_content = False)
-        tables = extract_tables(content, logger)
-        logger.info(f"│    └─ {len(tables)} tables found.")
-
-        for idx, table in enumerate(tables):
-            data = process_table(table, logger)
-            if data:
-                database.server_user_rank_insert(data,created_at = time_now)
-        logger.info("└─ sleeping for 2 minutes...")
-        size_rows = database.fetch_table_size_in_rows()
-        size_mb = database.fetch_table_size_in_mb()
-
-        database.compute_rank_runs(
-            timestamp = time_now
-        )
-
-        if size_mb > 5000:
-            logger.critical("└─ table size > 5000 MB, exiting...")
-            exit()
-
-        time.sleep(3)
+    """
+    Scrape `url` every `interval` seconds and store the leaderboards in `database`.
+
+    Args:
+        interval: seconds between fetch deadlines. Fetches start on a fixed cadence,
+            however long a cycle takes; missed deadlines are skipped.
+        min_interval, max_interval: let the interval adapt within these bounds to how
+            often the page actually changes. Both default to `interval` (fixed cadence).
+        max_cycles: return after this many cycles instead of running forever (load tests).
+        metrics: collects the stage timings; a new CycleMetrics logging a summary every
+            `summary_interval` seconds if not given.
+    """
+
+    if flg_skip_unchanged and database.run_engine != 'memory':
+        # the SQL run engine reads the full snapshot back from server_user_rank
+        logger.warning("Skipping unchanged server tables requires the 'memory' run engine, disabling it.")
+        flg_skip_unchanged = False
+    fingerprints = FingerprintCache(logger)
+    # stage latencies and counts, exported through slither.util.metrics.REGISTRY and summarized in the log
+    if metrics is None:
+        metrics = CycleMetrics(logger, summary_interval = summary_interval)
+
+    # the schema is verified once here instead of on every cycle
+    database.ensure_schema()
+
+    # fetching and parsing the next page runs on a background thread while this one writes the current one
+    fetch_stage = FetchStage(
+        PageFetcher(url, logger, timeout = fetch_timeout, flg_dump_content = False),
+        process = lambda result: parse_page(result, logger),
+        logger = logger,
+        metrics = metrics,
+        scheduler = CycleScheduler(interval, min_interval = min_interval, max_interval = max_interval)
+    ).start()
+
+    n_cycles = 0
+    try:
+        while max_cycles is None or n_cycles < max_cycles:
+            n_cycles += 1
+            with metrics.stage('wait'):
+                time_now, batch = fetch_stage.get() # time_now timestamps every record created in this cycle.
+            with metrics.cycle():
+                logger.info("Starting load...")
+                logger.info(f"└─ {time_now.isoformat()}")
+
+                # a no-op after the first check unless a connection was lost in between
+                database.ensure_schema()
+
+                with metrics.stage('fingerprint'):
+                    if flg_skip_unchanged:
+                        # with nothing to compare against every table is stored, the snapshot is complete
+                        # and the runs of servers that vanished in the meantime (e.g. while stopped) close
+                        flg_complete = len(fingerprints) == 0
+                        changed, unchanged_ids, vanished_ids = fingerprints.split(batch)
+                        logger.info(
+                            f"└─ {len(changed)} servers changed, {len(unchanged_ids)} skipped (unchanged), "
+                            f"{len(vanished_ids)} gone."
+                        )
+                        server_ids = None if flg_complete else {data['server_id'] for data in changed} | vanished_ids
+                    else:
+                        changed, unchanged_ids, server_ids = batch, None, None
+
+                # inserts and run changes of this cycle become visible together, with one commit
+                try:
+                    with database.cycle(time_now):
+                        with metrics.stage('insert'):
+                            metrics.record_insert(database.server_user_rank_insert_batch(changed, created_at = time_now))
+                        with metrics.stage('runs'):
+                            metrics.record_delta(database.compute_rank_runs(
+                                timestamp = time_now,
+                                batch = changed,
+                                server_ids = server_ids,
+                                unchanged_server_ids = unchanged_ids
+                            ))
+                except BaseException:
+                    # the rollback reset the run tracker, the next cycle stores every table again
+                    fingerprints.clear()
+                    raise
+                fingerprints.commit()
+                metrics.observe('commit', database.commit_gauge.get())
+                metrics.record_lag(time_now)
+
+                with metrics.stage('size_check'):
+                    # exact sizes are only sampled every few minutes, in between they are extrapolated from the inserts
+                    flg_sampled = database.storage_stats.refresh()
+                    size_mb = database.storage_stats.size_in_mb
+
+                    if database.partitions is not None:
+                        # roll over instead of dying: drop the oldest finalized partitions
+                        # partition sizes are as expensive as the sample, only check them along with it;
+                        # otherwise the partition count can only grow when a new partition starts
+                        flg_crossed = database.partitions.crossed_boundary(time_now)
+                        if flg_sampled or flg_crossed:
+                            database.partitions.enforce_retention(time_now, max_size_mb = max_size_mb if flg_sampled else None)
+                    elif size_mb > max_size_mb:
+                        logger.critical(f"└─ table size > {max_size_mb} MB, exiting...")
+                        exit()
+    finally:
+        fetch_stage.stop()
 
 
 
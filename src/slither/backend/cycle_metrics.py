@@ -0,0 +1,117 @@
+from contextlib import contextmanager
+import datetime as dt
+import logging
+import threading
+import time
+
+from slither.util.metrics import MetricsRegistry, REGISTRY
+from slither.util.connection_pool import ROUND_TRIPS
+from slither.util.run_tracker import RunDelta
+
+# order of the stages in the summary line
+STAGES = ('fetch', 'parse', 'wait', 'fingerprint', 'insert', 'runs', 'commit', 'size_check', 'cycle', 'lag')
+
+
+class CycleMetrics():
+    """Per-stage timing and counts of the backend loop.
+
+    Stage latencies go into the `slither_stage_seconds` histogram, runs and database
+    round trips into counters; inserted rows are already counted by StorageStats. Fetch
+    and parse run on the fetch thread, one cycle ahead. Every `summary_interval` seconds the window since the last summary is
+    logged as one line: average / max latency per stage and totals. 'lag' is the time
+    from fetching a page to committing its cycle.
+
+    With `flg_keep_samples` every observation is also kept, for percentiles in load tests.
+    """
+    def __init__(
+        self,
+        logger: logging.Logger,
+        registry: MetricsRegistry = REGISTRY,
+        summary_interval: float = 60.0,
+        flg_keep_samples: bool = False
+    ):
+        self.logger = logger
+        self.summary_interval = summary_interval
+        self.samples: dict[str, list[float]] | None = {} if flg_keep_samples else None
+        self.stage_histogram = registry.histogram('slither_stage_seconds', "Latency of the backend loop stages", labelnames = ('stage',))
+        self.runs_counter = registry.counter('slither_runs_total', "Runs opened and closed", labelnames = ('table', 'event'))
+        self.round_trips_gauge = registry.gauge('slither_cycle_db_round_trips', "Database round trips of the last cycle")
+        self.lock = threading.Lock()
+        self.reset_window()
+
+    def reset_window(self):
+        self.window_started = time.monotonic()
+        self.window_stages: dict[str, list[float]] = {}  # stage -> [sum, max, count]
+        self.window_cycles = 0
+        self.window_rows = 0
+        self.window_runs = [0, 0]  # opened, closed
+        self.window_round_trips = 0.0
+
+    def observe(self, stage: str, seconds: float):
+        self.stage_histogram.observe(seconds, stage = stage)
+        with self.lock:
+            if self.samples is not None:
+                self.samples.setdefault(stage, []).append(seconds)
+            window = self.window_stages.setdefault(stage, [0.0, 0.0, 0])
+            window[0] += seconds
+            window[1] = max(window[1], seconds)
+            window[2] += 1
+
+    @contextmanager
+    def stage(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    @contextmanager
+    def cycle(self):
+        """Times a whole cycle and the database round trips made in it."""
+        round_trips = ROUND_TRIPS.get()
+        with self.stage('cycle'):
+            yield
+        round_trips = ROUND_TRIPS.get() - round_trips
+        self.round_trips_gauge.set(round_trips)
+        with self.lock:
+            self.window_cycles += 1
+            self.window_round_trips += round_trips
+        if time.monotonic() - self.window_started >= self.summary_interval:
+            self.log_summary()
+
+    def record_lag(self, fetched_at: dt.datetime):
+        self.observe('lag', (dt.datetime.now(dt.timezone.utc) - fetched_at).total_seconds())
+
+    def record_insert(self, n_rows: int):
+        with self.lock:
+            self.window_rows += n_rows
+
+    def record_delta(self, delta: RunDelta):
+        for table, event, runs in (
+            ('user_run', 'opened', delta.opened_runs),
+            ('user_run', 'closed', delta.closed_runs),
+            ('user_rank_run', 'opened', delta.opened_rank_runs),
+            ('user_rank_run', 'closed', delta.closed_rank_runs)
+        ):
+            self.runs_counter.inc(len(runs), table = table, event = event)
+        with self.lock:
+            self.window_runs[0] += len(delta.opened_runs)
+            self.window_runs[1] += len(delta.closed_runs)
+
+    def summary(self) -> str:
+        with self.lock:
+            stages = ' │ '.join(
+                f"{stage} {self.window_stages[stage][0] / self.window_stages[stage][2] * 1000:.0f}/{self.window_stages[stage][1] * 1000:.0f} ms"
+                for stage in STAGES if stage in self.window_stages
+            )
+            n_cycles = max(self.window_cycles, 1)
+            return (
+                f"{self.window_cycles} cycles in {time.monotonic() - self.window_started:.0f}s (avg/max): {stages} │ "
+                f"rows {self.window_rows} │ runs +{self.window_runs[0]}/-{self.window_runs[1]} │ "
+                f"{self.window_round_trips / n_cycles:.1f} round trips/cycle"
+            )
+
+    def log_summary(self):
+        self.logger.info(f"└─ {self.summary()}")
+        with self.lock:
+            self.reset_window()
@@ -0,0 +1,212 @@
+from dataclasses import dataclass
+import datetime as dt
+import logging
+import queue
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .scheduler import CycleScheduler
+
+
+@dataclass
+class FetchResult:
+    text: str
+    status_code: int
+    fetched_at: dt.datetime
+    flg_not_modified: bool = False
+
+
+class PageFetcher():
+    """Fetches the leaderboard page over one persistent keep-alive session.
+
+    Sends If-None-Match / If-Modified-Since once the server handed out an ETag or
+    Last-Modified header and serves the cached body on 304. Connection errors and
+    429/5xx responses are retried with exponential backoff.
+    """
+    def __init__(
+        self,
+        url: str,
+        logger: logging.Logger,
+        timeout: float = 10.0,
+        retries: int = 3,
+        backoff_factor: float = 0.5,
+        flg_dump_content: bool = False
+    ):
+        self.url = url
+        self.logger = logger
+        self.timeout = timeout
+        self.flg_dump_content = flg_dump_content
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=backoff_factor,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=('GET',),
+                raise_on_status=False
+            )
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.etag = None
+        self.last_modified = None
+        self.cached_text = None
+
+    def conditional_headers(self) -> dict:
+        headers = {}
+        if self.cached_text is None:
+            return headers
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def fetch(self) -> FetchResult:
+        self.logger.info("Fetching webpage...")
+        fetched_at = dt.datetime.now(dt.timezone.utc)
+        response = self.session.get(self.url, headers=self.conditional_headers(), timeout=self.timeout)
+        if response.status_code == 304:
+            self.logger.info("└─ not modified, reusing cached page.")
+            return FetchResult(self.cached_text, response.status_code, fetched_at, flg_not_modified=True)
+        if response.status_code != 200:
+            self.logger.warning(f"Bad response: {response.status_code}")
+        else:
+            self.etag = response.headers.get('ETag')
+            self.last_modified = response.headers.get('Last-Modified')
+            self.cached_text = response.text
+        if self.flg_dump_content:
+            self.logger.info("└─ Dumping content...")
+            with open('ntl_page_dump.html', 'w', encoding='utf-8') as file:
+                file.write(response.text)
+        self.logger.info("└─done.")
+        return FetchResult(response.text, response.status_code, fetched_at)
+
+    def close(self):
+        self.session.close()
+
+
+class FetchStage():
+    """Runs fetch (and parse) on a background thread, one cycle ahead of the database writes.
+
+    `process` turns a FetchResult into whatever the consumer needs, so parsing the next
+    page overlaps with writing the current one. Fetches start on the deadlines of
+    `scheduler` (a fixed `interval` cadence if not given), which is told whether each
+    page changed. At most `max_pending` processed cycles wait in the queue; when the
+    consumer falls behind, the oldest waiting snapshot is replaced by the newer one,
+    which supersedes it, instead of piling up. Fetch and process latencies are reported
+    to `metrics`, if given.
+    """
+    def __init__(
+        self,
+        fetcher: PageFetcher,
+        process,
+        logger: logging.Logger,
+        interval: float = 3.0,
+        max_pending: int = 1,
+        metrics = None,
+        scheduler: CycleScheduler | None = None
+    ):
+        self.fetcher = fetcher
+        self.process = process
+        self.logger = logger
+        self.scheduler = scheduler or CycleScheduler(interval)
+        self.metrics = metrics
+        self.results = queue.Queue(maxsize=max_pending)
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='slither-fetch', daemon=True)
+        self.last_page_hash = None
+        # set if the fetch thread died, re-raised by get()
+        self.error: BaseException | None = None
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        try:
+            self.loop()
+        except BaseException as error:
+            # logged here and re-raised to the consumer by get()
+            self.logger.exception(f"└─ fetch thread died: {error}")
+            self.error = error
+
+    def loop(self):
+        self.scheduler.start()
+        while not self.stop_event.is_set():
+            started = time.monotonic()
+            lateness = self.scheduler.begin(started)
+            if lateness > self.scheduler.interval / 2:
+                self.logger.warning(f"└─ fetch started {lateness:.2f}s after its deadline")
+            # a failed fetch backs off like an error page, instead of speeding up against a failing host
+            flg_changed = False
+            try:
+                flg_changed = self.fetch_cycle(started)
+            except requests.RequestException as e:
+                self.logger.error(f"└─ fetch failed: {e}")
+            except Exception as e:
+                # a page the parser chokes on costs one cycle, not the collector
+                self.logger.exception(f"└─ processing the page failed, skipping cycle: {e}")
+            self.scheduler.next_deadline(flg_changed)
+            self.stop_event.wait(self.scheduler.wait_seconds())
+
+    def fetch_cycle(self, started: float) -> bool:
+        """Fetch and process one page and queue it; returns whether the page changed."""
+        result = self.fetcher.fetch()
+        fetched = time.monotonic()
+        if result.status_code not in (200, 304):
+            # an error page is not a leaderboard, parsing it would mark every server as gone
+            self.logger.warning(f"└─ skipping cycle, got HTTP {result.status_code}")
+            return False
+        page_hash = hash(result.text)
+        flg_changed = not result.flg_not_modified and page_hash != self.last_page_hash
+        # fetched_at, taken when the request went out, timestamps the cycle and the run durations
+        item = (result.fetched_at, self.process(result))
+        self.last_page_hash = page_hash
+        if self.metrics is not None:
+            self.metrics.observe('fetch', fetched - started)
+            self.metrics.observe('parse', time.monotonic() - fetched)
+        self.put_latest(item)
+        return flg_changed
+
+    def put_latest(self, item):
+        """Queue `item`, replacing the oldest waiting snapshot if the consumer is behind."""
+        while True:
+            try:
+                self.results.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.results.get_nowait()
+                except queue.Empty:
+                    continue  # taken by the consumer in between
+                self.scheduler.skipped_counter.inc(reason = 'superseded')
+                self.logger.warning("└─ database writes fell behind, replaced the waiting snapshot with a newer one")
+
+    def get(self, timeout: float | None = None, poll_interval: float = 0.5):
+        """
+        Block until the next processed cycle is available and return (fetched_at, processed).
+
+        Raises:
+            RuntimeError: the fetch thread died; no cycle will ever arrive.
+            queue.Empty: nothing arrived within `timeout` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = poll_interval if deadline is None else min(poll_interval, max(0.0, deadline - time.monotonic()))
+            try:
+                return self.results.get(timeout=wait)
+            except queue.Empty:
+                if self.error is not None or not self.thread.is_alive():
+                    raise RuntimeError("The fetch thread stopped") from self.error
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join(timeout=self.fetcher.timeout + 1)
+        self.fetcher.close()
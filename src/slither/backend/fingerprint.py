@@ -0,0 +1,57 @@
+import hashlib
+import logging
+
+
+def table_fingerprint(data: dict) -> bytes:
+    """Hash of a server table's server_time and rank/nick/score triplets."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(data['server_time']).encode('utf-8'))
+    for record in data['records']:
+        digest.update(f"\x1f{record['rank']}\x1e{record['nick']}\x1e{record['score']}".encode('utf-8'))
+    return digest.digest()
+
+
+class FingerprintCache():
+    """Remembers the last fingerprint per server to tell changed tables from unchanged ones.
+
+    `split` only stages the fingerprints of a cycle; they replace the cached ones on `commit`,
+    once the cycle is stored, so a cycle that fails is compared against the last stored one again.
+    """
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+        self.fingerprints: dict[str, bytes] = {}
+        self.pending: dict[str, bytes] | None = None
+
+    def split(self, batch: list[dict]) -> tuple[list[dict], set[str], set[str]]:
+        """
+        Sort the tables of one cycle by whether they changed since the previous cycle.
+
+        Returns:
+            (changed tables, ids of unchanged servers, ids of servers that disappeared from the page)
+        """
+        changed = []
+        unchanged_ids = set()
+        pending = {}
+        for data in batch:
+            server_id = data['server_id']
+            fingerprint = table_fingerprint(data)
+            pending[server_id] = fingerprint
+            if self.fingerprints.get(server_id) == fingerprint:
+                unchanged_ids.add(server_id)
+            else:
+                changed.append(data)
+        vanished_ids = set(self.fingerprints) - set(pending)
+        self.pending = pending
+        return changed, unchanged_ids, vanished_ids
+
+    def commit(self):
+        """Keep the fingerprints of the last split, call once its cycle is stored."""
+        if self.pending is not None:
+            self.fingerprints, self.pending = self.pending, None
+
+    def clear(self):
+        self.fingerprints.clear()
+        self.pending = None
+
+    def __len__(self):
+        return len(self.fingerprints)
@@ -0,0 +1,165 @@
+from html.parser import HTMLParser
+
+# elements without an end tag, they never enclose anything
+VOID_ELEMENTS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+    'link', 'meta', 'param', 'source', 'track', 'wbr'
+}
+CELL_CLASSES = ('tdrank', 'tdnick', 'tdscore')
+SERVER_IP_STYLE = 'user-select: all'
+
+
+class TextCapture():
+    """Collects the text below the element opened at `depth`."""
+    def __init__(self, depth: int):
+        self.depth = depth
+        self.parts = []
+
+    def text(self) -> str:
+        return ' '.join(part.strip() for part in self.parts if part.strip())
+
+
+class TableState():
+    def __init__(self, order: int):
+        self.order = order
+        self.tr_count = 0
+        self.flg_th_seen = False
+        self.server_id = None
+        self.server_ip = None
+        self.server_time = None
+        self.cells = []
+        self.server_id_capture = None
+        self.server_ip_capture = None
+        self.server_time_capture = None
+        self.cell_capture = None
+        self.th_depth = None
+
+    def captures(self):
+        return [
+            capture for capture in (
+                self.server_id_capture,
+                self.server_ip_capture,
+                self.server_time_capture,
+                self.cell_capture
+            ) if capture is not None
+        ]
+
+    def result(self) -> dict | None:
+        if not self.server_id:
+            return None
+        records = []
+        for i in range(0, len(self.cells) - len(self.cells) % 3, 3):
+            records.append({
+                "rank": i // 3 + 1,
+                "nick": self.cells[i + 1],
+                "score": self.cells[i + 2]
+            })
+        return {
+            'server_id': self.server_id,
+            'server_ip': self.server_ip,
+            'server_time': self.server_time,
+            'records': records
+        }
+
+
+class LeaderboardParser(HTMLParser):
+    """Single-pass tokenizer extracting every server table of an ntl-slither page.
+
+    Produces the same dicts as extract_tables + process_table without building a tree,
+    prettifying each table and parsing it again:
+        - server_id: text of the first span in the th of the table's first row
+        - server_ip: text of the span styled 'user-select: all' in that th
+        - server_time: text of the third row after 'Server time: '
+        - records: rank/nick/score triplets of the tdrank, tdnick and tdscore cells
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = []
+        self.tables = []
+        self.finished = []
+        self.table_count = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_ELEMENTS:
+            return
+        self.stack.append(tag)
+        depth = len(self.stack)
+        if tag == 'table':
+            self.tables.append((depth, TableState(order = self.table_count)))
+            self.table_count += 1
+            return
+        attributes = dict(attrs)
+        for _, table in self.tables:
+            if tag == 'tr':
+                table.tr_count += 1
+                if table.tr_count == 3:
+                    table.server_time_capture = TextCapture(depth)
+            elif tag == 'th' and table.tr_count == 1 and not table.flg_th_seen:
+                table.flg_th_seen = True
+                table.th_depth = depth
+            elif tag == 'span' and table.th_depth is not None:
+                if table.server_id is None and table.server_id_capture is None:
+                    table.server_id_capture = TextCapture(depth)
+                if table.server_ip is None and table.server_ip_capture is None and attributes.get('style') == SERVER_IP_STYLE:
+                    table.server_ip_capture = TextCapture(depth)
+            elif tag == 'td' and table.cell_capture is None:
+                classes = (attributes.get('class') or '').split()
+                if len(classes) == 1 and classes[0] in CELL_CLASSES:
+                    table.cell_capture = TextCapture(depth)
+
+    def handle_startendtag(self, tag, attrs):
+        if tag not in VOID_ELEMENTS:
+            self.handle_starttag(tag, attrs)
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag not in self.stack:
+            return  # stray end tag
+        while self.stack:
+            closed = self.stack.pop()
+            self.close_element(len(self.stack) + 1)
+            if closed == tag:
+                break
+
+    def close_element(self, depth: int):
+        for _, table in self.tables:
+            if table.th_depth == depth:
+                table.th_depth = None
+            if table.server_id_capture and table.server_id_capture.depth == depth:
+                table.server_id = table.server_id_capture.text()
+                table.server_id_capture = None
+            if table.server_ip_capture and table.server_ip_capture.depth == depth:
+                table.server_ip = table.server_ip_capture.text()
+                table.server_ip_capture = None
+            if table.server_time_capture and table.server_time_capture.depth == depth:
+                table.server_time = table.server_time_capture.text().split('Server time: ')[-1]
+                table.server_time_capture = None
+            if table.cell_capture and table.cell_capture.depth == depth:
+                table.cells.append(table.cell_capture.text())
+                table.cell_capture = None
+        if self.tables and self.tables[-1][0] == depth:
+            self.finished.append(self.tables.pop()[1])
+
+    def handle_data(self, data):
+        for _, table in self.tables:
+            for capture in table.captures():
+                capture.parts.append(data)
+
+    def close(self):
+        super().close()
+        while self.stack:
+            self.handle_endtag(self.stack[-1])
+
+
+def parse_leaderboard(html: str) -> list[dict]:
+    """Parse an ntl-slither page into process_table shaped dicts, one per server table."""
+    parser = LeaderboardParser()
+    parser.feed(html)
+    parser.close()
+    batch = []
+    # nested tables finish before the table around them, restore document order
+    for table in sorted(parser.finished, key=lambda table: table.order):
+        data = table.result()
+        if data:
+            batch.append(data)
+    return batch
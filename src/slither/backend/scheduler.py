@@ -0,0 +1,72 @@
+import math
+import time
+
+from slither.util.metrics import MetricsRegistry, REGISTRY
+
+
+class CycleScheduler():
+    """Fixed-cadence deadlines for the fetch loop, with an interval adapted to how often the page changes.
+
+    Deadlines lie on a grid `interval` apart, so the period does not drift with the cost
+    of a cycle. A cycle that overran skips the ticks it missed instead of firing them
+    back to back. After every fetch the interval adapts, within [min_interval, max_interval]:
+    unchanged pages stretch it by `backoff`, changed pages shrink it by `speedup`,
+    keeping the fetch rate near the rate the leaderboard actually changes.
+    min_interval == max_interval gives a plain fixed cadence.
+    """
+    def __init__(
+        self,
+        interval: float = 3.0,
+        min_interval: float | None = None,
+        max_interval: float | None = None,
+        backoff: float = 1.25,
+        speedup: float = 0.8,
+        registry: MetricsRegistry = REGISTRY
+    ):
+        self.min_interval = min_interval if min_interval is not None else interval
+        self.max_interval = max_interval if max_interval is not None else interval
+        if not 0 < self.min_interval <= interval <= self.max_interval:
+            raise ValueError(f"Invalid intervals: {self.min_interval} <= {interval} <= {self.max_interval} does not hold")
+        self.interval = interval
+        self.backoff = backoff
+        self.speedup = speedup
+        self.anchor = None
+        self.deadline = None
+        self.interval_gauge = registry.gauge('slither_fetch_interval_seconds', "Current interval between fetches")
+        self.lateness_gauge = registry.gauge('slither_fetch_lateness_seconds', "How late the last fetch started after its deadline")
+        self.skipped_counter = registry.counter('slither_cycles_skipped_total', "Cycles not run", labelnames = ('reason',))
+        self.interval_gauge.set(interval)
+
+    def start(self, now: float | None = None) -> float:
+        """Anchor the grid; the first deadline is now."""
+        self.anchor = self.deadline = time.monotonic() if now is None else now
+        return self.deadline
+
+    def begin(self, now: float | None = None) -> float:
+        """Call when a cycle starts; records how late it is against its deadline."""
+        now = time.monotonic() if now is None else now
+        lateness = max(0.0, now - self.deadline)
+        self.lateness_gauge.set(lateness)
+        return lateness
+
+    def next_deadline(self, flg_changed: bool, now: float | None = None) -> float:
+        """Adapt the interval to whether the last fetch saw a change and return the next deadline (monotonic clock)."""
+        now = time.monotonic() if now is None else now
+        interval = self.interval * (self.speedup if flg_changed else self.backoff)
+        interval = min(self.max_interval, max(self.min_interval, interval))
+        if interval != self.interval:
+            # a new cadence starts from the current deadline
+            self.anchor, self.interval = self.deadline, interval
+            self.interval_gauge.set(interval)
+        # the first grid point after the current deadline that is not already past
+        ticks = max(1, math.floor((now - self.anchor) / self.interval) + 1)
+        deadline = self.anchor + ticks * self.interval
+        n_missed = math.floor((deadline - self.deadline) / self.interval + 1e-9) - 1
+        if n_missed > 0:
+            self.skipped_counter.inc(n_missed, reason = 'missed_deadline')
+        self.deadline = deadline
+        return deadline
+
+    def wait_seconds(self, now: float | None = None) -> float:
+        now = time.monotonic() if now is None else now
+        return max(0.0, self.deadline - now)
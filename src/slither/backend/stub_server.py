@@ -0,0 +1,170 @@
+import datetime as dt
+from email.utils import formatdate
+import hashlib
+import html
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import logging
+from pathlib import Path
+import random
+import threading
+import time
+
+from slither.util.synthetic import synthetic_cycles
+
+
+class RecordedPageHandler(BaseHTTPRequestHandler):
+    """Serves `server.current_page()` for every GET, honouring If-None-Match / If-Modified-Since."""
+
+    def do_GET(self):
+        page = self.server.current_page()
+        latency = self.server.latency + random.uniform(0.0, self.server.latency_jitter)
+        if latency:
+            time.sleep(latency)
+        if_none_match = self.headers.get('If-None-Match')
+        # RFC 7232 3.3: If-Modified-Since is ignored when If-None-Match is present;
+        # Last-Modified has one-second resolution and would hide changes within a second
+        if if_none_match is not None:
+            flg_not_modified = if_none_match == page.etag
+        else:
+            flg_not_modified = self.headers.get('If-Modified-Since') == page.last_modified
+        if flg_not_modified:
+            self.send_response(304)
+            self.send_header('ETag', page.etag)
+            self.send_header('Last-Modified', page.last_modified)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(page.body)))
+        self.send_header('ETag', page.etag)
+        self.send_header('Last-Modified', page.last_modified)
+        self.end_headers()
+        self.wfile.write(page.body)
+
+    def log_message(self, format, *args):
+        self.server.logger.debug(f"stub server: {format % args}")
+
+
+class Page():
+    def __init__(self, html: str):
+        self.body = html.encode('utf-8')
+        self.etag = f'"{hashlib.sha1(self.body).hexdigest()}"'
+        self.last_modified = formatdate(usegmt=True)
+
+
+def render_page(batch: list[dict], server_time: str | None = None) -> str:
+    """Render server tables in the ntl-slither markup that parse_leaderboard and process_table read.
+
+    Each table: a th with the server id span and the 'user-select: all' IP span, a filler
+    row, the 'Server time: ' row, then one tdrank / tdnick / tdscore row per record.
+    """
+    parts = ['<html><body>']
+    for i, data in enumerate(batch):
+        server_ip = data.get('server_ip') or f"10.0.{i // 256}.{i % 256}:444"
+        parts.append(
+            f'<table><tr><th>Server <span>{html.escape(str(data["server_id"]))}</span> '
+            f'<span style="user-select: all">{html.escape(server_ip)}</span></th></tr>'
+            f'<tr><td>Top {len(data["records"])}</td></tr>'
+            f'<tr><td>Server time: {html.escape(server_time or data["server_time"])}</td></tr>'
+        )
+        for record in data['records']:
+            parts.append(
+                f'<tr><td class="tdrank">#{record["rank"]}</td>'
+                f'<td class="tdnick">{html.escape(str(record["nick"]))}</td>'
+                f'<td class="tdscore">{record["score"]}</td></tr>'
+            )
+        parts.append('</table>')
+    parts.append('</body></html>')
+    return ''.join(parts)
+
+
+class StubServer(ThreadingHTTPServer):
+    """Local stand-in for ntl-slither.com serving a recorded page (e.g. the flg_dump_content dump).
+
+    Usable as a context manager; `url` points at the running server. Every response is
+    delayed by `latency` plus up to `latency_jitter` seconds.
+    """
+    daemon_threads = True
+
+    def __init__(
+        self,
+        html: str,
+        logger: logging.Logger,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        latency: float = 0.0,
+        latency_jitter: float = 0.0
+    ):
+        super().__init__((host, port), RecordedPageHandler)
+        self.logger = logger
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.page = Page(html)
+        self.thread = None
+
+    @classmethod
+    def from_file(cls, path: Path, logger: logging.Logger, **kwargs):
+        return cls(Path(path).read_text(encoding='utf-8'), logger, **kwargs)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/ss/?lowts=0"
+
+    def set_page(self, html: str):
+        self.page = Page(html)
+
+    def current_page(self) -> Page:
+        return self.page
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, name='slither-stub-server', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class MockSite(StubServer):
+    """ntl-slither stand-in serving synthetic leaderboards that change every `refresh_interval` seconds.
+
+    The page is regenerated lazily on the first request after the interval, with
+    `churn` of the ranks taken over by new players; see slither.util.synthetic.
+    """
+    def __init__(
+        self,
+        logger: logging.Logger,
+        n_servers: int = 300,
+        n_rows: int = 10,
+        churn: float = 0.05,
+        n_nicks: int = 100_000,
+        refresh_interval: float = 3.0,
+        seed: int = 0,
+        **kwargs
+    ):
+        self.cycles = synthetic_cycles(n_servers, n_rows, None, churn, seed = seed, n_nicks = n_nicks, interval = refresh_interval)
+        self.refresh_interval = refresh_interval
+        self.refresh_lock = threading.Lock()
+        self.n_pages = 0
+        super().__init__(self.next_page(), logger, **kwargs)
+        self.refreshed_at = time.monotonic()
+
+    def next_page(self) -> str:
+        _, batch = next(self.cycles)
+        self.n_pages += 1
+        return render_page(batch, server_time = dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
+    def current_page(self) -> Page:
+        with self.refresh_lock:
+            if time.monotonic() - self.refreshed_at >= self.refresh_interval:
+                self.set_page(self.next_page())
+                self.refreshed_at = time.monotonic()
+            return self.page
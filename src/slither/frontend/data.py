@@ -0,0 +1,100 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import sqlite3
+from typing import AsyncIterator
+
+from psycopg_pool import AsyncConnectionPool
+
+from slither.util import SlitherDatabaseMinimal
+from slither.util.query_cache import cache_key
+
+
+class AsyncDatabase():
+    """Non-blocking reads for the Textual frontend.
+
+    Postgres queries run on psycopg's async connections from a small pool, through a
+    server-side cursor. SQLite queries run on a private connection in a worker thread.
+    Either way the event loop only awaits, so a slow query never freezes the UI. Rows
+    arrive in chunks of `chunk_rows`, which lets widgets render large results as they
+    stream in. Cancelling the awaiting task (e.g. a cancelled Textual worker) cancels
+    the statement on the server or interrupts SQLite.
+
+    Complete results are shared with the synchronous SlitherDatabaseMinimal cache.
+    """
+    def __init__(self, database: SlitherDatabaseMinimal, logger: logging.Logger, max_connections: int = 4, chunk_rows: int = 200):
+        self.database = database
+        self.logger = logger
+        self.database_type = database.database.database_type
+        self.conn_string = database.database.conn_string
+        self.chunk_rows = chunk_rows
+        self.max_connections = max_connections
+        self.pool = None
+
+    async def get_pool(self) -> AsyncConnectionPool:
+        if self.pool is None:
+            self.pool = AsyncConnectionPool(self.conn_string, min_size=1, max_size=self.max_connections, open=False)
+            await self.pool.open()
+        return self.pool
+
+    async def stream(self, query: str, params = None, chunk_rows: int | None = None) -> AsyncIterator[list[tuple]]:
+        """Yield the rows of `query` in chunks; a cached result comes as a single chunk."""
+        key = cache_key(query, 'all', params)
+        # polls the cycle version when no pushed one is recent; the poll is a query, so off the loop
+        version = await asyncio.to_thread(self.database.current_version)
+        flg_hit, result = self.database.cache.get(key, version)
+        if flg_hit:
+            yield result
+            return
+        rows = []
+        source = self.stream_postgres if self.database_type == 'postgres' else self.stream_sqlite
+        async for chunk in source(query, params, chunk_rows or self.chunk_rows):
+            rows.extend(chunk)
+            yield chunk
+        # only complete results are cached
+        self.database.cache.put(key, version, rows)
+
+    async def fetch(self, query: str, params = None) -> list[tuple]:
+        rows = []
+        async for chunk in self.stream(query, params):
+            rows.extend(chunk)
+        return rows
+
+    async def stream_postgres(self, query: str, params, chunk_rows: int) -> AsyncIterator[list[tuple]]:
+        pool = await self.get_pool()
+        async with pool.connection() as conn:
+            try:
+                async with conn.cursor(name='slither_frontend') as cursor:
+                    await cursor.execute(query, params)
+                    while chunk := await cursor.fetchmany(chunk_rows):
+                        yield chunk
+            except asyncio.CancelledError:
+                # stop the statement on the server, the pool rolls the connection back
+                await conn.cancel_safe()
+                raise
+
+    async def stream_sqlite(self, query: str, params, chunk_rows: int) -> AsyncIterator[list[tuple]]:
+        loop = asyncio.get_running_loop()
+        # one thread per query keeps the connection on a single thread and its steps in order
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='slither-frontend-query')
+        conn = sqlite3.connect(self.conn_string, check_same_thread=False)
+        try:
+            if params is None:
+                cursor = await loop.run_in_executor(executor, conn.execute, query)
+            else:
+                cursor = await loop.run_in_executor(executor, conn.execute, self.database.database.parameterize(query), params)
+            while chunk := await loop.run_in_executor(executor, cursor.fetchmany, chunk_rows):
+                yield chunk
+        except asyncio.CancelledError:
+            # aborts the statement running in the worker thread
+            conn.interrupt()
+            raise
+        finally:
+            # queued behind a running step, so the connection is never closed under it
+            executor.submit(conn.close)
+            executor.shutdown(wait=False)
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
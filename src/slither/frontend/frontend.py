@@ -1,13 +1,15 @@
 from textual.app import (
     App,
 )
+from textual import work
 
 import logging
 from textual.screen import Screen
 from pathlib import Path
 import os
 from slither.util import SlitherDatabaseMinimal
-import pandas as pd
+from slither.util.events import CycleEvent, subscribe
+from .data import AsyncDatabase
 
 from .screens import *
 
@@ -30,23 +32,30 @@ class Frontend(App):
             connection_string=connection_string,
             logger=self.logger
         )
+        # widgets read through this on the event loop, never through the blocking query()
+        self.data = AsyncDatabase(self.database, self.logger)
 
 
     def on_mount(self) -> None:
         self.push_screen("main")
-        self.set_interval(interval=2, callback=self.fetch_data, repeat=4)
+        # the backend pushes an event per committed cycle instead of us polling on a timer
+        self.listen_for_cycles()
 
-    def fetch_data(self):
-        self.notify("Fetching data...", timeout=1)
-        result = self.database.query(
-            query="SELECT * FROM public.server_user_rank LIMIT 3;",
-            fetch='all'
-        )
-        df = pd.DataFrame(result)
-        self.query_one()
-        print(result)
+    @work(exclusive=True, group="cycle_events")
+    async def listen_for_cycles(self):
+        database = self.database.database
+        async for event in subscribe(database.database_type, database.conn_string, self.logger):
+            self.on_cycle_committed(event)
+
+    def on_cycle_committed(self, event: CycleEvent):
+        self.database.observe_version(event.version)
+        widgets = [widget for widget in self.screen.query(LiveWidget) if widget.affected_by(event)]
+        for widget in widgets:
+            widget.reload()
+        self.logger.debug(f"cycle {event.version}: reloaded {len(widgets)} widgets")
 
-        self.notify("Data updated!", timeout=1)
+    async def on_unmount(self) -> None:
+        await self.data.close()
 
     def action_quit(self):
         self.exit()
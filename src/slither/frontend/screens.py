@@ -59,6 +59,16 @@ class MainScreen(Screen):
     def on_mount(self) -> None:
         self.stylesheet = "styles.css"
 
+    def on_screen_suspend(self) -> None:
+        # stop the queries of widgets that are no longer visible
+        for widget in self.query(LiveWidget):
+            self.app.workers.cancel_node(widget)
+
+    def on_screen_resume(self) -> None:
+        # cycles committed while suspended were not shown
+        for widget in self.query(LiveWidget):
+            widget.reload()
+
 
     def compose(self) -> ComposeResult:
         # yield Sidebar(classes="-hidden")
@@ -68,13 +78,8 @@ class MainScreen(Screen):
                 classes="main-title"
             ),
             Container(
-                Label("Consummation Amount", classes="content-title"),
-                SampleDataTable(),
-                classes="content"
-            ),
-            Container(
-                Label("Consummation Amount", classes="content-title"),
-                SampleDataTable(),
+                Label("Longest Runs", classes="content-title"),
+                DurationRankingTable(),
                 classes="content"
             ),
             Container(
@@ -76,38 +76,60 @@ Otherwise, all receipts have been processed.
         yield Label("[underline][bold]Receipt Processor[/bold][/underline]", classes='sidebar-title')
         yield Label(text, classes='sidebar-text')
 
-class DurationRankingTable(DataTable):
+class LiveWidget():
+    """Mixin for widgets showing stored data, reloaded when a committed cycle changed it."""
+    def affected_by(self, event) -> bool:
+        return True
+
+    def reload(self):
+        self.refresh()
+
+
+class DurationRankingTable(LiveWidget, DataTable):
+    QUERY = """
+        SELECT
+            position
+            ,nick
+            ,value
+            ,start_time
+        FROM top_run
+        WHERE metric = 'duration'
+        AND server_id = '*'
+        AND position <= 3
+        ORDER BY position;
+        """
+
     def __init__(self) -> None:
         super().__init__()
         self.data = []
-        self.refresh()
 
-    def compose(self) -> ComposeResult:
-        self.add_columns('Rank', width=10)
-        self.add_columns('User', width=20)
-        self.add_columns('Duration (sec)', width=10)
-        self.add_columns('Date', width=20)
-        self.refresh()
-        yield self.table
-
-    def refresh(self):
-        self.clear()
-        self.data = self.app.database.query(
-            query="""
-            SELECT
-                min_rank
-                ,nick
-                ,duration_seconds
-                ,start_time
-            FROM public.user_run
-            WHERE duration_seconds IS NOT NULL
-            ORDER BY duration_seconds DESC
-            LIMIT 3;
-            """,
-            fetch='all'
-        )
-        for row in self.data:
-            self.add_row(row[0], row[1], row[2], row[3])
+    def on_mount(self) -> None:
+        self.add_column('Rank', width=10)
+        self.add_column('User', width=20)
+        self.add_column('Duration (sec)', width=10)
+        self.add_column('Date', width=20)
+        self.reload()
+
+    def affected_by(self, event) -> bool:
+        # top_run only changes when runs finish
+        return event.flg_runs_closed
+
+    def reload(self):
+        self.load_rows()
+
+    @work(exclusive=True, group="reload")
+    async def load_rows(self):
+        # a newer reload cancels this one, rows are added as they arrive
+        data = []
+        async for rows in self.app.data.stream(self.QUERY):
+            if not data:
+                self.clear()
+            data.extend(rows)
+            for row in rows:
+                self.add_row(row[0], row[1], row[2], row[3])
+        if not data:
+            self.clear()
+        self.data = data
 
 
 
@@ -0,0 +1,149 @@
+from .run_tracker import RunDelta
+
+# server_id of the rows aggregating all servers
+ALL_SERVERS = '*'
+METRICS = ('longest_run_seconds', 'n_runs', 'total_seconds', 'max_score')
+
+
+def greatest(a, b):
+    return b if a is None else a if b is None else max(a, b)
+
+
+def least(a, b):
+    return b if a is None else a if b is None else min(a, b)
+
+
+class Analytics():
+    """Dashboard aggregates over finished top 10 runs, kept in nick_run_stats.
+
+    One row per (server_id, nick) plus one per nick with server_id '*' across all servers:
+    number of runs in the top 10, time spent there, the longest run and best score and
+    rank. The rows are upserted from the runs each cycle closes, inside the cycle's
+    transaction, so a leaderboard is an index range scan of k rows; the SQL run engine
+    passes the runs its UPDATE returned. After a replay `rebuild` recomputes the table.
+    """
+    def __init__(self, database):
+        self.database = database
+        self.logger = database.logger
+
+    def upsert_statement(self) -> str:
+        greatest_sql, least_sql = ('GREATEST', 'LEAST') if self.database.database_type == 'postgres' else ('MAX', 'MIN')
+
+        def combine(function: str, column: str) -> str:
+            # SQLite's scalar MAX / MIN return NULL if any argument is NULL
+            return f"{function}(COALESCE(nick_run_stats.{column}, excluded.{column}), COALESCE(excluded.{column}, nick_run_stats.{column}))"
+
+        return self.database.parameterize(f'''
+            INSERT INTO nick_run_stats
+            (server_id, nick, n_runs, total_seconds, longest_run_seconds, longest_run_start, max_score, best_rank, last_seen)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (server_id, nick) DO UPDATE SET
+                n_runs = nick_run_stats.n_runs + excluded.n_runs,
+                total_seconds = nick_run_stats.total_seconds + excluded.total_seconds,
+                longest_run_start = CASE
+                    WHEN nick_run_stats.longest_run_seconds IS NULL OR excluded.longest_run_seconds > nick_run_stats.longest_run_seconds
+                    THEN excluded.longest_run_start
+                    ELSE nick_run_stats.longest_run_start
+                END,
+                longest_run_seconds = {combine(greatest_sql, 'longest_run_seconds')},
+                max_score = {combine(greatest_sql, 'max_score')},
+                best_rank = {combine(least_sql, 'best_rank')},
+                last_seen = {combine(greatest_sql, 'last_seen')}
+        ''')
+
+    def apply(self, delta: RunDelta):
+        """Fold the runs closed by one cycle into nick_run_stats, on the caller's connection."""
+        if not delta.closed_runs:
+            return
+        stats: dict[tuple[str, str], list] = {}
+        for server_id, nick, start_time, end_time, duration, max_score, min_rank in delta.closed_runs:
+            if duration is None:
+                continue  # no end time, still open as far as `rebuild` is concerned
+            for scope in (server_id, ALL_SERVERS):
+                entry = stats.get((scope, nick))
+                if entry is None:
+                    stats[(scope, nick)] = [1, duration, duration, start_time, max_score, min_rank, end_time]
+                    continue
+                entry[0] += 1
+                entry[1] += duration
+                if duration > entry[2]:
+                    entry[2], entry[3] = duration, start_time
+                entry[4] = greatest(entry[4], max_score)
+                entry[5] = least(entry[5], min_rank)
+                entry[6] = max(entry[6], end_time)
+        if not stats:
+            return
+        ts = self.database.to_db_timestamp
+        with self.database.get_conn() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.executemany(self.upsert_statement(), [
+                    (scope, nick, n_runs, total_seconds, longest, ts(longest_start), max_score, best_rank, ts(last_seen))
+                    for (scope, nick), (n_runs, total_seconds, longest, longest_start, max_score, best_rank, last_seen) in stats.items()
+                ])
+            finally:
+                cursor.close()
+
+    def rebuild(self):
+        """Recompute nick_run_stats from all finished runs in user_run."""
+        self.logger.info("Rebuilding nick_run_stats...")
+        with self.database.get_conn() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("DELETE FROM nick_run_stats")
+                cursor.execute(f'''
+                    WITH finished AS (
+                        SELECT server_id, nick, start_time, end_time, duration_seconds, max_score, min_rank
+                        FROM user_run
+                        WHERE end_time IS NOT NULL
+                    ),
+                    scoped AS (
+                        SELECT * FROM finished
+                        UNION ALL
+                        SELECT '{ALL_SERVERS}' AS server_id, nick, start_time, end_time, duration_seconds, max_score, min_rank FROM finished
+                    ),
+                    ranked AS (
+                        SELECT
+                            scoped.*,
+                            ROW_NUMBER() OVER (PARTITION BY server_id, nick ORDER BY duration_seconds DESC, start_time) AS position
+                        FROM scoped
+                    )
+                    INSERT INTO nick_run_stats
+                    (server_id, nick, n_runs, total_seconds, longest_run_seconds, longest_run_start, max_score, best_rank, last_seen)
+                    SELECT
+                        server_id,
+                        nick,
+                        COUNT(*),
+                        SUM(duration_seconds),
+                        MAX(duration_seconds),
+                        MAX(CASE WHEN position = 1 THEN start_time END),
+                        MAX(max_score),
+                        MIN(min_rank),
+                        MAX(end_time)
+                    FROM ranked
+                    GROUP BY server_id, nick
+                ''')
+            finally:
+                cursor.close()
+        self.logger.info("└─ done.")
+
+    def top(self, metric: str, server_id: str = ALL_SERVERS, k: int = 10) -> list[tuple]:
+        """
+        Leaderboard of one server (default: all servers) by `metric`.
+
+        Returns:
+            (nick, n_runs, total_seconds, longest_run_seconds, longest_run_start, max_score, best_rank) of the top `k` nicks.
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Invalid metric: {metric}")
+        return self.database.query(
+            f'''
+            SELECT nick, n_runs, total_seconds, longest_run_seconds, longest_run_start, max_score, best_rank
+            FROM nick_run_stats
+            WHERE server_id = %s AND {metric} IS NOT NULL
+            ORDER BY {metric} DESC
+            LIMIT %s
+            ''',
+            fetch = 'all',
+            params = (server_id, k)
+        )
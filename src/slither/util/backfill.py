@@ -0,0 +1,544 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+import datetime as dt
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+
+from .run_tracker import RunDelta
+
+RUN_TABLES = ('user_run', 'user_rank_run')
+RUN_COLUMNS = {
+    'user_run': ['server_id', 'nick', 'start_time', 'end_time', 'duration_seconds', 'max_score', 'min_rank'],
+    'user_rank_run': ['server_id', 'nick', 'rank', 'start_time', 'end_time', 'duration_seconds'],
+}
+FAR_PAST = dt.datetime.min.replace(tzinfo=dt.timezone.utc)
+EPOCH = dt.datetime(1970, 1, 1, tzinfo=dt.timezone.utc)
+MICROSECOND = dt.timedelta(microseconds=1)
+
+# kinds of the rows in the replay stream, applied in this order within a cycle
+CYCLE, PRESENCE, RECORD = 0, 1, 2
+STREAM_COLUMNS = ['created_at', 'kind', 'flg', 'server_id', 'rank', 'nick', 'score']
+
+
+def to_microseconds(timestamp: dt.datetime) -> int:
+    return (timestamp - EPOCH) // MICROSECOND
+
+
+def server_events(tables: pd.DataFrame, vanished: pd.DataFrame, complete: np.ndarray, carried: list[str]) -> pd.DataFrame:
+    """
+    The cycles of a chunk in which the runs of a server can change, numbered per server.
+
+    Those are the cycles with a table of the server, and the first cycle after each of them
+    in which the server was no longer observed: logged as vanished, or missing from a
+    complete cycle. In the cycles in between it was observed with an unchanged table.
+
+    Args:
+        tables: server_id, c (cycle ordinal in the chunk) of every table.
+        vanished: server_id, c of the logged vanish events.
+        complete: per cycle of the chunk, whether everything missing from it vanished.
+        carried: servers with runs open before the chunk, whose table is placed at c = -1.
+
+    Returns:
+        server_id, c and event, the ordinal of the event among those of its server.
+    """
+    tables = pd.concat([pd.DataFrame({'server_id': carried, 'c': -1}).astype({'c': 'int64'}), tables], ignore_index=True)
+    tables = tables.sort_values(['server_id', 'c'], ignore_index=True)
+    next_table = tables.groupby('server_id')['c'].shift(-1).fillna(np.inf).to_numpy()
+    first_vanished = pd.merge_asof(
+        tables.reset_index().sort_values('c'),
+        vanished.rename(columns={'c': 'c_vanished'}).sort_values('c_vanished'),
+        left_on='c', right_on='c_vanished', by='server_id', direction='forward', allow_exact_matches=False
+    ).set_index('index')['c_vanished'].reindex(tables.index).fillna(np.inf).to_numpy()
+    complete_cycles = np.append(np.flatnonzero(complete).astype('float64'), np.inf)
+    first_complete = complete_cycles[np.searchsorted(complete_cycles[:-1], tables['c'].to_numpy(), side='right')]
+    gone = np.fmin(first_vanished, first_complete)
+    flg_gone = gone < next_table
+    events = pd.concat([
+        tables,
+        pd.DataFrame({'server_id': tables['server_id'][flg_gone].to_numpy(), 'c': gone[flg_gone].astype('int64')})
+    ], ignore_index=True).sort_values(['server_id', 'c'], ignore_index=True)
+    events['event'] = events.groupby('server_id').cumcount()
+    return events
+
+
+def runs_from_events(rows: pd.DataFrame, keys: list[str], events: pd.DataFrame, aggregates: dict[str, str]) -> pd.DataFrame:
+    """
+    Runs of `keys`, computed without iterating cycles: maximal sequences of consecutive
+    events of a server whose table holds the key.
+
+    Args:
+        rows: `keys`, c and the columns of `aggregates` of every table of the chunk,
+            plus the runs open before it at c = -1.
+        events: as returned by `server_events`.
+        aggregates: column -> pandas aggregation over the rows of a run.
+
+    Returns:
+        `keys`, c of the first row of the run, the `aggregates` and c_end, the event that
+        closed it, or NaN if the run is still open.
+    """
+    rows = rows.merge(events, on=['server_id', 'c']).sort_values([*keys, 'event'], ignore_index=True)
+    # a run starts wherever the server's previous event did not hold the key
+    flg_start = rows.groupby(keys, sort=False)['event'].diff().ne(1)
+    runs = rows.groupby(flg_start.cumsum().rename('run'), sort=False).agg(
+        **{key: (key, 'first') for key in keys},
+        c = ('c', 'first'),
+        event = ('event', 'last'),
+        **{column: (column, aggregation) for column, aggregation in aggregates.items()}
+    )
+    closing = events.rename(columns={'c': 'c_end'})
+    closing['event'] -= 1
+    return runs.merge(closing, on=['server_id', 'event'], how='left').drop(columns='event')
+
+
+@dataclass
+class ReplayState:
+    """What the replay of a shard carries from one chunk to the next."""
+    last_cycle: dt.datetime | None = None
+    # (server_id, nick) -> (start_time, max_score, min_rank)
+    runs: dict[tuple[str, str], tuple[dt.datetime, int | None, int | None]] = field(default_factory=dict)
+    # (server_id, nick, rank) -> start_time
+    rank_runs: dict[tuple[str, str, int], dt.datetime] = field(default_factory=dict)
+
+
+class RunBuffer():
+    """Net changes to the run tables from the cycles replayed since the last write.
+
+    A run that opened since then is inserted once, with its latest state; runs written
+    earlier are updated in place.
+    """
+    def __init__(self):
+        # key -> [end_time, duration_seconds, max_score, min_rank, flg_new]
+        self.runs: dict[tuple, list] = {}
+        # key -> [end_time, duration_seconds, flg_new]
+        self.rank_runs: dict[tuple, list] = {}
+
+    def add(self, delta: RunDelta):
+        for server_id, nick, start_time, max_score, min_rank in delta.opened_runs:
+            self.runs[(server_id, nick, start_time)] = [None, None, max_score, min_rank, True]
+        for server_id, nick, start_time, max_score, min_rank in delta.updated_runs:
+            run = self.runs.setdefault((server_id, nick, start_time), [None, None, None, None, False])
+            run[2:4] = max_score, min_rank
+        for server_id, nick, start_time, end_time, duration, max_score, min_rank in delta.closed_runs:
+            run = self.runs.setdefault((server_id, nick, start_time), [None, None, None, None, False])
+            run[0:4] = end_time, duration, max_score, min_rank
+        for server_id, nick, rank, start_time in delta.opened_rank_runs:
+            self.rank_runs[(server_id, nick, rank, start_time)] = [None, None, True]
+        for server_id, nick, rank, start_time, end_time, duration in delta.closed_rank_runs:
+            run = self.rank_runs.setdefault((server_id, nick, rank, start_time), [None, None, False])
+            run[0:2] = end_time, duration
+
+    def rows(self, table: str) -> tuple[list[tuple], list[tuple]]:
+        """(new runs, changes to runs written before) of `table`, both in RUN_COLUMNS order."""
+        runs = self.runs if table == 'user_run' else self.rank_runs
+        new, changed = [], []
+        for key, (*values, flg_new) in runs.items():
+            (new if flg_new else changed).append((*key, *values))
+        return new, changed
+
+    def clear(self):
+        self.runs.clear()
+        self.rank_runs.clear()
+
+
+class RunReplay():
+    """Recompute user_run / user_rank_run from server_user_rank in one pass.
+
+    The history is streamed in cycle order, through a server-side cursor on Postgres,
+    merged with cycle_log and server_presence, and cut into chunks of about `chunk_rows`
+    rows at cycle boundaries. Each chunk is diffed in one vectorized pass (`server_events`,
+    `runs_from_events`) to the runs the 'memory' run engine produced live: servers missing from a cycle's
+    stored snapshot were observed unchanged and keep their runs open, servers logged as
+    vanished close theirs, at the last cycle they were observed in, and servers back on
+    the page with an unchanged table get their last stored table again. Complete cycles of
+    the 'sql' run engine, and history from before cycle_log existed, close everything
+    missing from the snapshot.
+
+    Only the open runs and the last cycle are carried across chunks, so memory is
+    bounded by the open runs plus one chunk. After every chunk the changed runs
+    are written together with a checkpoint in one transaction; an interrupted replay
+    resumes from the open runs as of its last checkpoint.
+    """
+    def __init__(self, database, name: str = 'replay', tables: tuple[str, ...] = RUN_TABLES, chunk_rows: int = 100_000):
+        if database.storage_mode == 'compact':
+            raise ValueError("The replay reads server_user_rank, which the 'compact' storage mode does not write")
+        unknown = set(tables) - set(RUN_TABLES)
+        if unknown:
+            raise ValueError(f"Invalid run tables: {sorted(unknown)}")
+        self.database = database
+        self.logger = database.logger
+        self.name = name
+        self.tables = tuple(tables)
+        self.chunk_rows = chunk_rows
+
+    def server_ids(self) -> list[str]:
+        return [row[0] for row in self.database.query("SELECT DISTINCT server_id FROM server_user_rank ORDER BY server_id", fetch = 'all')]
+
+    def shards(self, n_shards: int) -> list[tuple[str, str]]:
+        """Contiguous (first, last) server_id ranges of about the same number of servers."""
+        server_ids = self.server_ids()
+        size = -(-len(server_ids) // max(n_shards, 1)) if server_ids else 1
+        return [(server_ids[i], server_ids[min(i + size, len(server_ids)) - 1]) for i in range(0, len(server_ids), size)]
+
+    def checkpoint_name(self, first: str) -> str:
+        return f"{self.name}:{first}"
+
+    def load_checkpoint(self, first: str) -> tuple[dt.datetime, int] | None:
+        """(created_at of the last written cycle, rows replayed) of an interrupted replay of the shard."""
+        result = self.database.query(
+            "SELECT created_at, n_rows FROM replay_checkpoint WHERE name = %s",
+            fetch = 'one',
+            params = (self.checkpoint_name(first),)
+        )
+        return (self.database.from_db_timestamp(result[0]), result[1]) if result else None
+
+    def clear_checkpoints(self):
+        self.database.query(
+            "DELETE FROM replay_checkpoint WHERE name LIKE %s",
+            fetch = 'none',
+            flg_commit = True,
+            params = (f"{self.name}:%",)
+        )
+
+    def load_state(self, first: str, last: str, checkpoint: dt.datetime) -> ReplayState:
+        """Open runs of the shard as of its checkpoint, as the replay wrote them so far."""
+        database = self.database
+        state = ReplayState(last_cycle = checkpoint)
+        if 'user_run' in self.tables:
+            open_runs = database.query(
+                "SELECT server_id, nick, start_time, max_score, min_rank FROM user_run "
+                "WHERE end_time IS NULL AND server_id >= %s AND server_id <= %s",
+                fetch = 'all',
+                params = (first, last)
+            )
+            state.runs = {
+                (server_id, nick): (database.from_db_timestamp(start_time), max_score, min_rank)
+                for server_id, nick, start_time, max_score, min_rank in open_runs
+            }
+        if 'user_rank_run' in self.tables:
+            open_rank_runs = database.query(
+                "SELECT server_id, nick, rank, start_time FROM user_rank_run "
+                "WHERE end_time IS NULL AND server_id >= %s AND server_id <= %s",
+                fetch = 'all',
+                params = (first, last)
+            )
+            state.rank_runs = {
+                (server_id, nick, rank): database.from_db_timestamp(start_time)
+                for server_id, nick, rank, start_time in open_rank_runs
+            }
+        return state
+
+    def write(self, conn, buffer: RunBuffer, first: str, last: str, created_at: dt.datetime, n_rows: int, flg_clear: bool) -> dict[str, int]:
+        """Write the buffered runs and advance the checkpoint, in the caller's transaction.
+
+        Args:
+            flg_clear: first write of the shard, delete its previous runs first.
+
+        Returns:
+            Number of runs inserted per table.
+        """
+        database = self.database
+        ts = database.to_db_timestamp
+        now = ts(dt.datetime.now(dt.timezone.utc))
+        counts = {}
+        cursor = conn.cursor()
+        try:
+            for table in self.tables:
+                columns = RUN_COLUMNS[table]
+                if flg_clear:
+                    cursor.execute(database.parameterize(f"DELETE FROM {table} WHERE server_id >= %s AND server_id <= %s"), (first, last))
+                new, changed = buffer.rows(table)
+                if table == 'user_run':
+                    new = [(server_id, nick, ts(start_time), ts(end_time), duration, max_score, min_rank, now)
+                           for server_id, nick, start_time, end_time, duration, max_score, min_rank in new]
+                    update = "UPDATE user_run SET end_time = %s, duration_seconds = %s, max_score = %s, min_rank = %s WHERE server_id = %s AND nick = %s AND start_time = %s"
+                    changed = [(ts(end_time), duration, max_score, min_rank, server_id, nick, ts(start_time))
+                               for server_id, nick, start_time, end_time, duration, max_score, min_rank in changed]
+                else:
+                    new = [(server_id, nick, rank, ts(start_time), ts(end_time), duration, now)
+                           for server_id, nick, rank, start_time, end_time, duration in new]
+                    update = "UPDATE user_rank_run SET end_time = %s, duration_seconds = %s WHERE server_id = %s AND nick = %s AND rank = %s AND start_time = %s"
+                    changed = [(ts(end_time), duration, server_id, nick, rank, ts(start_time))
+                               for server_id, nick, rank, start_time, end_time, duration in changed]
+                column_list = ', '.join([*columns, 'created_at'])
+                if database.database_type == 'postgres':
+                    with cursor.copy(f"COPY {table} ({column_list}) FROM STDIN") as copy:
+                        for row in new:
+                            copy.write_row(row)
+                else:
+                    cursor.executemany(f"INSERT INTO {table} ({column_list}) VALUES ({', '.join(['?'] * (len(columns) + 1))})", new)
+                if changed:
+                    cursor.executemany(database.parameterize(update), changed)
+                counts[table] = len(new)
+            cursor.execute(
+                database.parameterize(
+                    "INSERT INTO replay_checkpoint (name, created_at, n_rows, updated_at) VALUES (%s, %s, %s, %s) "
+                    "ON CONFLICT (name) DO UPDATE SET created_at = excluded.created_at, n_rows = excluded.n_rows, updated_at = excluded.updated_at"
+                ),
+                (self.checkpoint_name(first), ts(created_at), n_rows, now)
+            )
+        finally:
+            cursor.close()
+        buffer.clear()
+        return counts
+
+    def fetch_table(self, server_id: str, before: dt.datetime) -> list[tuple]:
+        """(rank, nick, score) of the last table of `server_id` stored before `before`."""
+        return self.database.query(
+            "SELECT rank, nick, score FROM server_user_rank WHERE server_id = %s AND created_at = "
+            "(SELECT MAX(created_at) FROM server_user_rank WHERE server_id = %s AND created_at < %s)",
+            fetch = 'all',
+            params = (server_id, server_id, self.database.to_db_timestamp(before))
+        )
+
+    def apply_chunk(self, state: ReplayState, rows: list[tuple]) -> tuple[RunDelta, int]:
+        """
+        Apply whole cycles of the replay stream at once, the way compute_rank_runs_in_memory applied them live.
+
+        Args:
+            state: open runs before the chunk, advanced to its end.
+            rows: the stream rows of the chunk, see `run_shard`.
+
+        Returns:
+            (run changes of the chunk, number of stored rows in it)
+        """
+        database = self.database
+        frame = pd.DataFrame.from_records(rows, columns = STREAM_COLUMNS)
+        flg_first = frame['created_at'].ne(frame['created_at'].shift()).to_numpy()
+        frame['c'] = np.cumsum(flg_first) - 1
+        times = [database.from_db_timestamp(rows[i][0]) for i in np.flatnonzero(flg_first)]
+        # microseconds of the cycle before cycle c at c; a run closed at event c ends then
+        bounds = [state.last_cycle, *times]
+        bounds_us = np.array([0 if bound is None else to_microseconds(bound) for bound in bounds], dtype='int64')
+
+        # cycles missing from cycle_log predate it, they were complete like those of the 'sql' run engine
+        complete = np.ones(len(times), dtype=bool)
+        logged = frame[frame['kind'] == CYCLE]
+        complete[logged['c'].to_numpy()] = logged['flg'].astype(bool).to_numpy()
+        presence = frame[frame['kind'] == PRESENCE]
+        presence = presence[~complete[presence['c'].to_numpy()]]
+        flg_present = presence['flg'].astype(bool)
+        records = frame.loc[frame['kind'] == RECORD, ['server_id', 'c', 'rank', 'nick', 'score']]
+        n_records = len(records)
+
+        # a server back on the page with an unchanged table left no rows, it returns with the table it left with
+        tables = records[['server_id', 'c']].drop_duplicates()
+        appeared = presence.loc[flg_present, ['server_id', 'c']].merge(tables, how='left', indicator=True)
+        returned = [
+            (server_id, c, rank, nick, score)
+            for server_id, c in appeared.loc[appeared['_merge'] == 'left_only', ['server_id', 'c']].itertuples(index=False)
+            for rank, nick, score in self.fetch_table(server_id, times[c])
+        ]
+        if returned:
+            records = pd.concat([records, pd.DataFrame(returned, columns = records.columns)], ignore_index=True)
+            tables = records[['server_id', 'c']].drop_duplicates()
+        records = records.astype({'c': 'int64', 'rank': 'int64', 'score': 'int64'})
+        tables = tables.astype({'c': 'int64'})
+
+        carried = sorted({key[0] for key in state.runs} | {key[0] for key in state.rank_runs})
+        vanished = presence.loc[~flg_present, ['server_id', 'c']].astype({'c': 'int64'})
+        events = server_events(tables, vanished, complete, carried)
+
+        delta = RunDelta()
+        if 'user_run' in self.tables:
+            rows = records.groupby(['server_id', 'nick', 'c'], as_index=False, sort=False).agg(
+                max_score = ('score', 'max'),
+                min_rank = ('rank', 'min')
+            )
+            rows['start_us'] = bounds_us[rows['c'].to_numpy() + 1]
+            open_rows = pd.DataFrame(
+                [(server_id, nick, -1, max_score, min_rank, to_microseconds(start_time))
+                 for (server_id, nick), (start_time, max_score, min_rank) in state.runs.items()],
+                columns = ['server_id', 'nick', 'c', 'max_score', 'min_rank', 'start_us']
+            ).astype({'c': 'int64', 'max_score': 'float64', 'min_rank': 'float64', 'start_us': 'int64'})
+            runs = runs_from_events(
+                pd.concat([open_rows, rows], ignore_index=True), ['server_id', 'nick'], events,
+                {'max_score': 'max', 'min_rank': 'min', 'start_us': 'first'}
+            )
+            state.runs = self.collect_runs(runs, state.runs, times, bounds, bounds_us, delta)
+        if 'user_rank_run' in self.tables:
+            rows = records[['server_id', 'nick', 'rank', 'c']].drop_duplicates()
+            rows['start_us'] = bounds_us[rows['c'].to_numpy() + 1]
+            open_rows = pd.DataFrame(
+                [(server_id, nick, rank, -1, to_microseconds(start_time)) for (server_id, nick, rank), start_time in state.rank_runs.items()],
+                columns = ['server_id', 'nick', 'rank', 'c', 'start_us']
+            ).astype({'rank': 'int64', 'c': 'int64', 'start_us': 'int64'})
+            rank_runs = runs_from_events(
+                pd.concat([open_rows, rows], ignore_index=True), ['server_id', 'nick', 'rank'], events,
+                {'start_us': 'first'}
+            )
+            state.rank_runs = self.collect_rank_runs(rank_runs, state.rank_runs, times, bounds, bounds_us, delta)
+        state.last_cycle = times[-1]
+        return delta, n_records
+
+    @staticmethod
+    def durations(runs: pd.DataFrame, bounds_us: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """(whether each run is still open, its duration in seconds as RunTracker computes it)."""
+        flg_open = runs['c_end'].isna().to_numpy()
+        c_end = runs['c_end'].fillna(0).to_numpy(dtype='int64')
+        return flg_open, (bounds_us[c_end] - runs['start_us'].to_numpy()) // 1_000_000
+
+    def collect_runs(self, runs: pd.DataFrame, before: dict, times: list, bounds: list, bounds_us: np.ndarray, delta: RunDelta) -> dict:
+        """Add the user_run changes of a chunk to `delta` and return the runs still open."""
+        flg_open, durations = self.durations(runs, bounds_us)
+        open_runs = {}
+        columns = ['server_id', 'nick', 'c', 'max_score', 'min_rank', 'c_end']
+        for (server_id, nick, c, max_score, min_rank, c_end), flg, duration in zip(runs[columns].itertuples(index=False), flg_open, durations):
+            key = (server_id, nick)
+            previous = before.get(key) if c < 0 else None
+            start_time = previous[0] if previous else times[c]
+            max_score = None if pd.isna(max_score) else int(max_score)
+            min_rank = None if pd.isna(min_rank) else int(min_rank)
+            if previous is None:
+                delta.opened_runs.append((server_id, nick, start_time, max_score, min_rank))
+            if flg:
+                open_runs[key] = (start_time, max_score, min_rank)
+                if previous is not None and (max_score, min_rank) != previous[1:]:
+                    delta.updated_runs.append((server_id, nick, start_time, max_score, min_rank))
+            else:
+                delta.closed_runs.append((server_id, nick, start_time, bounds[int(c_end)], int(duration), max_score, min_rank))
+        return open_runs
+
+    def collect_rank_runs(self, runs: pd.DataFrame, before: dict, times: list, bounds: list, bounds_us: np.ndarray, delta: RunDelta) -> dict:
+        """Add the user_rank_run changes of a chunk to `delta` and return the rank runs still open."""
+        flg_open, durations = self.durations(runs, bounds_us)
+        open_rank_runs = {}
+        columns = ['server_id', 'nick', 'rank', 'c', 'c_end']
+        for (server_id, nick, rank, c, c_end), flg, duration in zip(runs[columns].itertuples(index=False), flg_open, durations):
+            key = (server_id, nick, int(rank))
+            previous = before.get(key) if c < 0 else None
+            start_time = previous if previous else times[c]
+            if previous is None:
+                delta.opened_rank_runs.append((*key, start_time))
+            if flg:
+                open_rank_runs[key] = start_time
+            else:
+                delta.closed_rank_runs.append((*key, start_time, bounds[int(c_end)], int(duration)))
+        return open_rank_runs
+
+    def run_shard(self, first: str, last: str) -> dict[str, int]:
+        """Replay the servers first <= server_id <= last, resuming after the shard's checkpoint."""
+        database = self.database
+        checkpoint = self.load_checkpoint(first)
+        if checkpoint is not None:
+            resume_after, n_rows = checkpoint
+            self.logger.info(f"└─ [{first} .. {last}] resuming after {resume_after.isoformat()}")
+            state = self.load_state(first, last, resume_after)
+        else:
+            resume_after, n_rows = FAR_PAST, 0
+            state = ReplayState()
+        after = database.to_db_timestamp(resume_after)
+        query = database.parameterize(f'''
+            SELECT created_at, {CYCLE} AS kind, flg_complete AS flg, NULL AS server_id, NULL AS rank, NULL AS nick, NULL AS score
+            FROM cycle_log WHERE created_at > %s
+            UNION ALL
+            SELECT created_at, {PRESENCE}, flg_present, server_id, NULL, NULL, NULL
+            FROM server_presence WHERE created_at > %s AND server_id >= %s AND server_id <= %s
+            UNION ALL
+            SELECT created_at, {RECORD}, NULL, server_id, rank, nick, score
+            FROM server_user_rank WHERE created_at > %s AND server_id >= %s AND server_id <= %s
+            ORDER BY created_at, kind
+        ''')
+        params = (after, after, first, last, after, first, last)
+        counts = {table: 0 for table in self.tables}
+        buffer = RunBuffer()
+        flg_clear = checkpoint is None
+        start = time.perf_counter()
+
+        def flush(conn, rows: list[tuple]):
+            nonlocal flg_clear, n_rows
+            delta, n_records = self.apply_chunk(state, rows)
+            buffer.add(delta)
+            n_rows += n_records
+            created_at = state.last_cycle
+            if database.database_type == 'postgres':
+                # the read cursor lives in its own transaction, write on a second connection
+                with database.get_conn() as write_conn:
+                    written = self.write(write_conn, buffer, first, last, created_at, n_rows, flg_clear)
+            else:
+                # SQLite commits fine while a read statement is pending on the same connection
+                written = self.write(conn, buffer, first, last, created_at, n_rows, flg_clear)
+                conn.commit()
+            flg_clear = False
+            for table, count in written.items():
+                counts[table] += count
+            elapsed = time.perf_counter() - start
+            self.logger.info(
+                f"└─ [{first} .. {last}] up to {created_at.isoformat()}: {n_rows:,} rows in {elapsed:.1f}s "
+                f"({n_rows / max(elapsed, 1e-9):,.0f} rows/s), {len(state.runs):,} runs open, "
+                + ', '.join(f"{table}: {count:,}" for table, count in counts.items())
+            )
+
+        with database.get_conn() as conn:
+            if database.database_type == 'postgres':
+                cursor = conn.cursor(name = 'slither_replay')
+                cursor.itersize = self.chunk_rows
+            else:
+                cursor = conn.cursor()
+            try:
+                cursor.execute(query, params)
+                pending = []
+                while rows := cursor.fetchmany(self.chunk_rows):
+                    pending.extend(rows)
+                    # the last cycle fetched may go on in the next rows, it waits for the next chunk
+                    cut = len(pending)
+                    while cut and pending[cut - 1][0] == pending[-1][0]:
+                        cut -= 1
+                    if cut:
+                        flush(conn, pending[:cut])
+                        del pending[:cut]
+                if pending:
+                    flush(conn, pending)
+            finally:
+                cursor.close()
+        return counts
+
+    def run(self, n_shards: int = 1, flg_restart: bool = False) -> dict[str, int]:
+        """
+        Replay all servers, optionally split into `n_shards` server_id ranges replayed by a process pool.
+
+        Returns:
+            Number of runs written per table.
+        """
+        if flg_restart:
+            self.clear_checkpoints()
+        shards = self.shards(n_shards)
+        self.logger.info(f"Replaying {', '.join(self.tables)} over {len(shards)} shard(s)...")
+        counts = {table: 0 for table in self.tables}
+        if n_shards > 1 and self.database.database_type == 'sqlite':
+            # SQLite has a single writer, and every shard's open read blocks the others' commits
+            self.logger.warning("└─ SQLite replays the shards one after another.")
+            n_shards = 1
+        if n_shards <= 1 or len(shards) <= 1:
+            results = [self.run_shard(first, last) for first, last in shards]
+        else:
+            with ProcessPoolExecutor(max_workers = len(shards)) as executor:
+                futures = [
+                    executor.submit(replay_shard, self.database.connection_string, self.name, self.tables, self.chunk_rows, first, last)
+                    for first, last in shards
+                ]
+                results = [future.result() for future in futures]
+        for result in results:
+            for table, count in result.items():
+                counts[table] += count
+        # every shard finished, the next replay starts from scratch
+        self.clear_checkpoints()
+        if 'user_run' in self.tables:
+            self.database.analytics.rebuild()
+            self.database.top_runs.rebuild()
+        # the in-memory run state was built from the replaced rows
+        self.database.run_tracker.reset()
+        self.logger.info("└─ " + ', '.join(f"{table}: {count:,} runs" for table, count in counts.items()))
+        return counts
+
+
+def replay_shard(connection_string: str, name: str, tables: tuple[str, ...], chunk_rows: int, first: str, last: str) -> dict[str, int]:
+    """Process pool entry point: replay one shard on a connection of its own."""
+    from .database import SlitherDatabase
+    database = SlitherDatabase(connection_string, logging.getLogger('slither.replay'), pool_min_size = 0, pool_max_size = 2)
+    try:
+        return RunReplay(database, name = name, tables = tables, chunk_rows = chunk_rows).run_shard(first, last)
+    finally:
+        database.close()
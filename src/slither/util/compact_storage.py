@@ -0,0 +1,233 @@
+import datetime as dt
+from typing import Iterator
+
+FAR_FUTURE = dt.datetime.max.replace(tzinfo=dt.timezone.utc)
+
+def diff_snapshot(previous: dict[int, tuple], current: dict[int, tuple]) -> list[tuple]:
+    """(rank, nick_id, score) of every rank whose entry differs from the previous snapshot."""
+    return [(rank, *entry) for rank, entry in current.items() if previous.get(rank) != entry]
+
+
+class CompactStore():
+    """Compact storage for leaderboard snapshots.
+
+    Nicks and server ids are dictionary encoded (nick_dict, server_dict). Per server and
+    cycle, server_snapshot records server_time and the number of ranks, and
+    server_user_rank_delta only the ranks whose (nick, score) changed against the
+    previous snapshot of that server. Every `keyframe_interval`-th snapshot of a server,
+    and the first one after startup, stores all ranks so reconstruction never has to
+    replay more than that many snapshots.
+    """
+    def __init__(self, database, keyframe_interval: int = 100, chunk_rows: int = 10_000):
+        self.database = database
+        self.logger = database.logger
+        self.keyframe_interval = keyframe_interval
+        self.chunk_rows = chunk_rows
+        self.nick_ids: dict[str, int] = {}
+        self.server_keys: dict[str, int] = {}
+        # last written snapshot per server: rank -> (nick_id, score)
+        self.previous: dict[str, dict[int, tuple]] = {}
+        self.since_keyframe: dict[str, int] = {}
+
+    def resolve_ids(self, cursor, table: str, key_column: str, value_column: str, values, cache: dict):
+        missing = list({value for value in values if value not in cache})
+        if not missing:
+            return
+        if self.database.database_type == 'sqlite':
+            insert = f"INSERT OR IGNORE INTO {table} ({value_column}) VALUES (?)"
+        else:
+            insert = f"INSERT INTO {table} ({value_column}) VALUES (%s) ON CONFLICT ({value_column}) DO NOTHING"
+        cursor.executemany(insert, [(value,) for value in missing])
+        for i in range(0, len(missing), 500):
+            chunk = missing[i:i + 500]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(
+                self.database.parameterize(f"SELECT {key_column}, {value_column} FROM {table} WHERE {value_column} IN ({placeholders})"),
+                chunk
+            )
+            for key, value in cursor.fetchall():
+                cache[value] = key
+
+    def reset(self):
+        """Forget all cached state; the next snapshot of every server becomes a keyframe."""
+        self.nick_ids.clear()
+        self.server_keys.clear()
+        self.previous.clear()
+        self.since_keyframe.clear()
+
+    def insert_batch(self, batch: list[dict], created_at: dt.datetime) -> int:
+        """
+        Store the server tables of one cycle.
+
+        Returns:
+            Number of delta rows inserted.
+        """
+        created_at_value = self.database.to_db_timestamp(created_at)
+        snapshot_rows = []
+        delta_rows = []
+        previous = {}
+        since_keyframe = {}
+        try:
+            with self.database.get_conn() as conn:
+                cursor = conn.cursor()
+                try:
+                    self.resolve_ids(cursor, 'server_dict', 'server_key', 'server_id',
+                                     (data['server_id'] for data in batch), self.server_keys)
+                    self.resolve_ids(cursor, 'nick_dict', 'nick_id', 'nick',
+                                     (record['nick'] for data in batch for record in data['records']), self.nick_ids)
+
+                    for data in batch:
+                        server_id = data['server_id']
+                        server_key = self.server_keys[server_id]
+                        current = {
+                            int(record['rank']): (self.nick_ids[record['nick']], int(record['score']))
+                            for record in data['records']
+                        }
+                        count = self.since_keyframe.get(server_id)
+                        flg_keyframe = count is None or count + 1 >= self.keyframe_interval
+                        if flg_keyframe:
+                            changes = [(rank, *entry) for rank, entry in current.items()]
+                            since_keyframe[server_id] = 0
+                        else:
+                            changes = diff_snapshot(self.previous.get(server_id, {}), current)
+                            since_keyframe[server_id] = count + 1
+                        previous[server_id] = current
+                        snapshot_rows.append((server_key, created_at_value, data['server_time'], len(current), flg_keyframe))
+                        delta_rows.extend((server_key, created_at_value, *change) for change in changes)
+
+                    if self.database.database_type == 'sqlite':
+                        insert_snapshot = "INSERT OR IGNORE INTO server_snapshot (server_key, created_at, server_time, row_count, flg_keyframe) VALUES (?, ?, ?, ?, ?)"
+                        insert_delta = "INSERT OR IGNORE INTO server_user_rank_delta (server_key, created_at, rank, nick_id, score) VALUES (?, ?, ?, ?, ?)"
+                    else:
+                        insert_snapshot = (
+                            "INSERT INTO server_snapshot (server_key, created_at, server_time, row_count, flg_keyframe) VALUES (%s, %s, %s, %s, %s) "
+                            "ON CONFLICT (created_at, server_key) DO NOTHING"
+                        )
+                        insert_delta = (
+                            "INSERT INTO server_user_rank_delta (server_key, created_at, rank, nick_id, score) VALUES (%s, %s, %s, %s, %s) "
+                            "ON CONFLICT (created_at, server_key, rank) DO NOTHING"
+                        )
+                    if snapshot_rows:
+                        cursor.executemany(insert_snapshot, snapshot_rows)
+                    n_inserted = 0
+                    if delta_rows:
+                        cursor.executemany(insert_delta, delta_rows)
+                        n_inserted = max(cursor.rowcount, 0)
+                finally:
+                    cursor.close()
+        except Exception:
+            # ids resolved inside the rolled back transaction may not exist
+            self.reset()
+            raise
+        self.previous.update(previous)
+        self.since_keyframe.update(since_keyframe)
+        self.logger.info(
+            f"│    └─ stored {len(snapshot_rows)} server snapshots as {n_inserted} delta rows "
+            f"(created_at: {created_at.isoformat()})"
+        )
+        return n_inserted
+
+    def stream(self, conn, name: str, query: str, params) -> Iterator[tuple]:
+        """Rows of `query`, `chunk_rows` at a time: a named server-side cursor on Postgres, fetchmany on SQLite."""
+        if self.database.database_type == 'postgres':
+            cursor = conn.cursor(name = name)
+            cursor.itersize = self.chunk_rows
+        else:
+            cursor = conn.cursor()
+        try:
+            cursor.execute(self.database.parameterize(query), params)
+            while rows := cursor.fetchmany(self.chunk_rows):
+                yield from rows
+        finally:
+            cursor.close()
+
+    def replay(self, start: dt.datetime | None, end: dt.datetime | None) -> Iterator[tuple[dt.datetime, dict]]:
+        """
+        Reconstruct server tables snapshot by snapshot, in created_at order.
+
+        Replay of each server starts at its latest keyframe at or before `start`, so
+        snapshots older than `start` are yielded too; callers filter them. Snapshots and
+        deltas are streamed side by side in the same order, only the current table of
+        every server is held in memory.
+
+        Yields:
+            (created_at, process_table shaped dict)
+        """
+        ts = self.database.to_db_timestamp
+        replay_window = '''
+            WITH replay_from AS (
+                SELECT server_key, MAX(created_at) AS created_at
+                FROM server_snapshot
+                WHERE flg_keyframe = %s AND created_at <= %s
+                GROUP BY server_key
+            )
+        '''
+        params = (True, ts(start), ts(end or FAR_FUTURE))
+        with self.database.get_conn() as conn:
+            snapshots = self.stream(conn, 'slither_compact_snapshots', replay_window + '''
+                SELECT s.server_key, d.server_id, s.created_at, s.server_time, s.row_count
+                FROM server_snapshot s
+                JOIN server_dict d ON d.server_key = s.server_key
+                LEFT JOIN replay_from r ON r.server_key = s.server_key
+                WHERE (r.created_at IS NULL OR s.created_at >= r.created_at)
+                AND s.created_at <= %s
+                ORDER BY s.created_at, s.server_key
+            ''', params)
+            changes = self.stream(conn, 'slither_compact_deltas', replay_window + '''
+                SELECT c.created_at, c.server_key, c.rank, n.nick, c.score
+                FROM server_user_rank_delta c
+                JOIN nick_dict n ON n.nick_id = c.nick_id
+                LEFT JOIN replay_from r ON r.server_key = c.server_key
+                WHERE (r.created_at IS NULL OR c.created_at >= r.created_at)
+                AND c.created_at <= %s
+                ORDER BY c.created_at, c.server_key
+            ''', params)
+            try:
+                change = next(changes, None)
+                state: dict[int, dict[int, tuple]] = {}
+                for server_key, server_id, created_at, server_time, row_count in snapshots:
+                    entries = state.setdefault(server_key, {})
+                    # deltas come in snapshot order; skip any without a snapshot of their own
+                    while change is not None and change[:2] < (created_at, server_key):
+                        change = next(changes, None)
+                    while change is not None and change[:2] == (created_at, server_key):
+                        _, _, rank, nick, score = change
+                        entries[rank] = (nick, score)
+                        change = next(changes, None)
+                    for rank in [rank for rank in entries if rank > row_count]:
+                        del entries[rank]
+                    yield self.database.from_db_timestamp(created_at), {
+                        'server_id': server_id,
+                        'server_time': server_time,
+                        'records': [
+                            {'rank': rank, 'nick': nick, 'score': score}
+                            for rank, (nick, score) in sorted(entries.items())
+                        ]
+                    }
+            finally:
+                snapshots.close()
+                changes.close()
+
+    def iter_snapshots(self, start: dt.datetime | None = None, end: dt.datetime | None = None) -> Iterator[tuple[dt.datetime, dict]]:
+        """Snapshots stored with start <= created_at <= end, reconstructed in created_at order."""
+        for created_at, data in self.replay(start, end):
+            if start is None or created_at >= start:
+                yield created_at, data
+
+    def fetch_batch(self, created_at: dt.datetime) -> list[dict]:
+        """Server tables written in the cycle at `created_at`, like `WHERE created_at = ...` on server_user_rank."""
+        return [data for _, data in self.iter_snapshots(created_at, created_at)]
+
+    def fetch_snapshot(self, timestamp: dt.datetime | None = None) -> list[dict]:
+        """Latest known table of every server as of `timestamp` (default: now)."""
+        timestamp = timestamp or FAR_FUTURE
+        latest = {}
+        for _, data in self.replay(timestamp, timestamp):
+            latest[data['server_id']] = data
+        return list(latest.values())
+
+    def fetch_rows(self, start: dt.datetime | None = None, end: dt.datetime | None = None) -> Iterator[tuple]:
+        """Snapshots between start and end as server_user_rank rows (server_id, server_time, rank, nick, score, created_at), streamed."""
+        for created_at, data in self.iter_snapshots(start, end):
+            for record in data['records']:
+                yield (data['server_id'], data['server_time'], record['rank'], record['nick'], record['score'], created_at)
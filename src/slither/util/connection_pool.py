@@ -0,0 +1,208 @@
+from contextlib import contextmanager
+import logging
+import queue
+import sqlite3
+import threading
+
+import psycopg
+from psycopg_pool import ConnectionPool as PostgresConnectionPool
+
+from .metrics import REGISTRY
+
+# execute, executemany and COPY each count once, however many rows they carry
+ROUND_TRIPS = REGISTRY.counter('slither_db_round_trips_total', "Statements sent to the database")
+
+
+class CountingCursor(psycopg.Cursor):
+    def execute(self, *args, **kwargs):
+        ROUND_TRIPS.inc()
+        return super().execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        ROUND_TRIPS.inc()
+        return super().executemany(*args, **kwargs)
+
+    def copy(self, *args, **kwargs):
+        ROUND_TRIPS.inc()
+        return super().copy(*args, **kwargs)
+
+
+class CountingSqliteCursor(sqlite3.Cursor):
+    def execute(self, *args, **kwargs):
+        ROUND_TRIPS.inc()
+        return super().execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        ROUND_TRIPS.inc()
+        return super().executemany(*args, **kwargs)
+
+
+class CountingSqliteConnection(sqlite3.Connection):
+    """sqlite3 connection whose cursors, including the execute shortcuts', count their statements."""
+    def cursor(self, factory=CountingSqliteCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args, **kwargs):
+        return self.cursor().execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        return self.cursor().executemany(*args, **kwargs)
+
+
+def configure_postgres_connection(conn: psycopg.Connection):
+    conn.cursor_factory = CountingCursor
+
+
+def check_postgres_connection(conn: psycopg.Connection):
+    """psycopg_pool's health check, on a plain cursor so that checkouts are not counted as round trips."""
+    flg_autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        with psycopg.Cursor(conn) as cursor:
+            cursor.execute("")
+    finally:
+        conn.autocommit = flg_autocommit
+
+
+class SqliteConnectionPool():
+    """Small thread-safe pool of SQLite connections.
+
+    Mirrors the parts of psycopg_pool.ConnectionPool that SlitherDatabase uses:
+    `connection()` hands out a connection that is committed on success and rolled
+    back on error, idle connections are health checked before reuse and replaced
+    when the check fails.
+    """
+    def __init__(
+        self,
+        path: str,
+        logger: logging.Logger,
+        min_size: int = 1,
+        max_size: int = 4,
+        timeout: float = 30.0
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min_size={min_size}, max_size={max_size}")
+        self.path = path
+        self.logger = logger
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._size = 0
+        self._closed = False
+        for _ in range(min_size):
+            self._idle.put(self._connect())
+
+    def _connect(self) -> sqlite3.Connection:
+        with self._lock:
+            self._size += 1
+        try:
+            return sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False, factory=CountingSqliteConnection)
+        except Exception:
+            with self._lock:
+                self._size -= 1
+            raise
+
+    def _discard(self, conn: sqlite3.Connection):
+        with self._lock:
+            self._size -= 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    @staticmethod
+    def check_connection(conn: sqlite3.Connection) -> bool:
+        try:
+            # a plain cursor, the health check is not a round trip of the caller's
+            cursor = conn.cursor(sqlite3.Cursor)
+            try:
+                cursor.execute("SELECT 1").fetchone()
+            finally:
+                cursor.close()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def getconn(self) -> sqlite3.Connection:
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_grow = self._size < self.max_size
+                if can_grow:
+                    return self._connect()
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"No connection available after {self.timeout} seconds")
+            if self.check_connection(conn):
+                return conn
+            self.logger.warning("└─ Discarding broken SQLite connection, reconnecting...")
+            self._discard(conn)
+
+    def putconn(self, conn: sqlite3.Connection):
+        if self._closed or conn.in_transaction:
+            # never hand out a connection with a half-finished transaction
+            self._discard(conn)
+        else:
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.putconn(conn)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+
+def create_pool(
+    database_type: str,
+    conn_string: str,
+    logger: logging.Logger,
+    min_size: int = 1,
+    max_size: int = 4,
+    timeout: float = 30.0
+):
+    """Create the connection pool for the given database type.
+
+    Both pool types expose `connection()` as a context manager.
+    """
+    if database_type == 'postgres':
+        return PostgresConnectionPool(
+            conn_string,
+            min_size=min_size,
+            max_size=max_size,
+            timeout=timeout,
+            check=check_postgres_connection,
+            configure=configure_postgres_connection,
+            name='slither',
+            open=True
+        )
+    elif database_type == 'sqlite':
+        return SqliteConnectionPool(
+            conn_string,
+            logger=logger,
+            min_size=min_size,
+            max_size=max_size,
+            timeout=timeout
+        )
+    else:
+        raise ValueError(f"Invalid database type: {database_type}")
@@ -1,14 +1,49 @@
 from contextlib import contextmanager
 import datetime as dt
+from pathlib import Path
+import re
 from pandas import DataFrame as dataframe
 import time
 import psycopg
 import sqlite3
 import logging
+import threading
 import click
 
+from .connection_pool import create_pool
+from .run_tracker import RunTracker, RunDelta
+from .migrations import MIGRATIONS, INDEXED_QUERIES
+from .compact_storage import CompactStore, FAR_FUTURE
+from .partitioning import PartitionManager
+from .storage_stats import StorageStats
+from .metrics import REGISTRY
+from .backfill import RunReplay, RUN_TABLES
+from .analytics import Analytics
+from .top_k import TopRuns
+from .query_cache import QueryCache, cache_key
+from .events import CycleEvent, EventPublisher
+
+NAMED_PLACEHOLDER = re.compile(r"%\((\w+)\)s")
+# plan fragments of an index lookup: our idx_ indexes, and the primary key as sqlite
+# (WITHOUT ROWID / rowid table / autoindex) and postgres (<table>_pkey) name it
+INDEX_PLAN_MARKERS = ('idx_', 'USING PRIMARY KEY', 'USING INTEGER PRIMARY KEY', 'sqlite_autoindex_', '_pkey')
+
 class SlitherDatabase():
-    def __init__(self, connection_string: str, logger: logging.Logger):
+    def __init__(
+        self,
+        connection_string: str,
+        logger: logging.Logger,
+        pool_min_size: int = 1,
+        pool_max_size: int = 4,
+        pool_timeout: float = 30.0,
+        run_engine: str = 'memory',
+        storage_mode: str = 'rows',
+        partition_interval: dt.timedelta | None = None,
+        retention_partitions: int | None = None,
+        archive_dir: Path | None = None,
+        stats_sample_interval: float = 300.0
+    ):
+        self.connection_string = connection_string
         self.conn_string = connection_string
         self.logger = logger
         if 'sqlite' in connection_string:
@@ -20,49 +55,227 @@ class SlitherDatabase():
             self.logger.info("Using Postgres database")
         else:
             raise ValueError("Invalid connection string: must contain 'sqlite' or 'postgres'")
+        if run_engine not in ('memory', 'sql'):
+            raise ValueError(f"Invalid run engine: {run_engine}")
+        self.run_engine = run_engine
+        self.run_tracker = RunTracker(self.logger)
+        if storage_mode not in ('rows', 'compact'):
+            raise ValueError(f"Invalid storage mode: {storage_mode}")
+        if storage_mode == 'compact' and run_engine != 'memory':
+            raise ValueError("The 'compact' storage mode requires the 'memory' run engine")
+        self.storage_mode = storage_mode
+        self.compact_store = CompactStore(self)
+        self.analytics = Analytics(self)
+        self.top_runs = TopRuns(self)
+        if partition_interval is not None and storage_mode != 'rows':
+            raise ValueError("Partitioning applies to server_user_rank and requires the 'rows' storage mode")
+        self.partitions = PartitionManager(
+            self,
+            interval = partition_interval,
+            retention_partitions = retention_partitions,
+            archive_dir = archive_dir
+        ) if partition_interval is not None else None
+        self.pool = create_pool(
+            self.database_type,
+            self.conn_string,
+            logger = self.logger,
+            min_size = pool_min_size,
+            max_size = pool_max_size,
+            timeout = pool_timeout
+        )
+        self.storage_stats = StorageStats(self, sample_interval = stats_sample_interval)
+        # set once validate_storage succeeded, cleared when a connection is lost
+        self.flg_schema_ready = False
+        self.schema_check_seconds = 0.0
+        self.schema_check_gauge = REGISTRY.gauge('slither_schema_check_seconds', "Duration of the last schema verification")
+        self.schema_saved_counter = REGISTRY.counter(
+            'slither_schema_check_saved_seconds_total',
+            "Time not spent verifying the schema on cycles that reused the verified state"
+        )
+        # prepare the run computation statements on the server, once per pooled connection
+        self.flg_prepare_statements = True
+        # connection of the cycle() running on the current thread, if any
+        self.unit_of_work = threading.local()
+        self.commit_gauge = REGISTRY.gauge('slither_cycle_commit_seconds', "Commit latency of the last cycle")
+        self.cycle_counter = REGISTRY.counter('slither_cycles_total', "Cycles by outcome", labelnames = ('outcome',))
+        # tells frontends which servers and runs a committed cycle changed
+        self.events = EventPublisher(self)
 
-    def query(self, query: str, fetch = 'all', flg_commit = False, flg_print_query = False):
+    def query(self, query: str, fetch = 'all', flg_commit = False, flg_print_query = False, params = None, flg_prepare = None):
+        """
+        Run one statement on a pooled connection.
+
+        Args:
+            params: values for %s / %(name)s placeholders. Without params the query is sent as is.
+            flg_prepare: Postgres only. True prepares the statement on the connection right away,
+                False never does, None leaves it to psycopg (prepared after a few executions).
+                SQLite caches compiled statements per connection by their text anyway.
+        """
         if flg_print_query:
             print(query)
-        if self.database_type == 'postgres':
-            with psycopg.connect(self.conn_string) as conn:
-                    with conn.cursor() as cursor:
-                        cursor.execute(query)
-                        if flg_commit:
-                            conn.commit()
-                        if fetch == 'all':
-                            return cursor.fetchall()
-                        elif fetch == 'one':
-                            return cursor.fetchone()
-                        elif fetch == 'none':
-                            return None
-                        else: 
-                            raise ValueError(f"Invalid fetch value: {fetch}")
-        elif self.database_type == 'sqlite':
-            with sqlite3.connect(self.conn_string) as conn:
-                cursor = conn.cursor()  # SQLite cursor doesn't support context manager
-                try:
-                    cursor.execute(query)
-                    if flg_commit:
-                        conn.commit()
-                    if fetch == 'all':
-                        return cursor.fetchall()
-                    elif fetch == 'one':
-                        return cursor.fetchone()
-                    elif fetch == 'none':
-                        return None
-                    else: 
-                        raise ValueError(f"Invalid fetch value: {fetch}")
-                finally:
-                    cursor.close()  # Explicitly close the cursor
-        else:
+        if fetch not in ('all', 'one', 'none'):
+            raise ValueError(f"Invalid fetch value: {fetch}")
+        if self.database_type not in ('postgres', 'sqlite'):
             raise ValueError(f"Invalid database type: {self.database_type}")
+        with self.get_conn() as conn:
+            cursor = conn.cursor()  # SQLite cursor doesn't support context manager
+            try:
+                if params is None:
+                    cursor.execute(query)
+                elif self.database_type == 'sqlite':
+                    cursor.execute(self.parameterize(query), params)
+                else:
+                    cursor.execute(query, params, prepare = flg_prepare)
+                if fetch == 'all':
+                    result = cursor.fetchall()
+                elif fetch == 'one':
+                    result = cursor.fetchone()
+                else:
+                    result = None
+                if flg_commit and not self.in_cycle:
+                    conn.commit()
+                return result
+            finally:
+                cursor.close()  # Explicitly close the cursor
 
+    @contextmanager
     def get_conn(self):
+        """Borrow a pooled connection; use as a context manager.
+
+        The connection is committed when the block exits cleanly, rolled back on error
+        and returned to the pool either way.
+        """
+        conn = getattr(self.unit_of_work, 'conn', None)
+        if conn is not None:
+            # inside cycle(): share its transaction, it commits once at the end
+            yield conn
+            return
+        try:
+            with self.pool.connection() as conn:
+                yield conn
+        except (psycopg.OperationalError, sqlite3.OperationalError):
+            # the server may have restarted or the schema changed underneath us
+            self.invalidate_schema()
+            raise
+
+    @property
+    def in_cycle(self) -> bool:
+        return getattr(self.unit_of_work, 'conn', None) is not None
+
+    @property
+    def cycle_event(self) -> CycleEvent | None:
+        """Event of the cycle running on the current thread, collecting what it changes."""
+        return getattr(self.unit_of_work, 'event', None)
+
+    @contextmanager
+    def cycle(self, timestamp: dt.datetime):
+        """
+        Unit of work for one scrape cycle; use as a context manager.
+
+        Every statement issued on this thread inside the block, inserts as well as run
+        opens and closes, runs on one connection and is committed once when the block
+        exits, so readers never see a half-applied cycle. On error everything is rolled
+        back and the in-memory state derived from the cycle is dropped. Committed cycles
+        are announced to the frontends with a CycleEvent.
+        """
+        if self.in_cycle:
+            raise RuntimeError("Cycles cannot be nested")
+        try:
+            with self.pool.connection() as conn:
+                self.unit_of_work.conn = conn
+                event = self.unit_of_work.event = CycleEvent(created_at = timestamp.isoformat())
+                try:
+                    yield conn
+                    event.version = self.bump_cycle_version(timestamp)
+                    self.events.before_commit(event)
+                    start = time.perf_counter()
+                    conn.commit()
+                    commit_seconds = time.perf_counter() - start
+                finally:
+                    self.unit_of_work.conn = None
+                    self.unit_of_work.event = None
+        except Exception as error:
+            self.cycle_counter.inc(outcome = 'rolled_back')
+            self.logger.error(f"└─ cycle {timestamp.isoformat()} rolled back: {error}")
+            # the run state, compact deltas and row counters assumed the cycle would be stored
+            self.run_tracker.reset()
+            self.top_runs.reset()
+            self.compact_store.reset()
+            self.storage_stats.invalidate()
+            if isinstance(error, (psycopg.OperationalError, sqlite3.OperationalError)):
+                self.invalidate_schema()
+            if self.partitions is not None:
+                try:
+                    self.partitions.reload()
+                except (psycopg.Error, sqlite3.Error) as reload_error:
+                    # verifying the schema again sets the partitions up from scratch
+                    self.logger.warning(f"└─ could not reload the partitions: {reload_error}")
+                    self.invalidate_schema()
+            raise
+        self.cycle_counter.inc(outcome = 'committed')
+        self.commit_gauge.set(commit_seconds)
+        self.logger.info(f"└─ cycle committed in {commit_seconds * 1000:.1f} ms.")
+        self.events.after_commit(event)
+
+    def bump_cycle_version(self, timestamp: dt.datetime) -> int | None:
+        """Advance the cycle version marker readers use to tell that new data was committed."""
+        result = self.query(
+            "UPDATE cycle_version SET version = version + 1, created_at = %s, committed_at = %s WHERE id = 1 RETURNING version",
+            fetch = 'one',
+            params = (self.to_db_timestamp(timestamp), self.to_db_timestamp(dt.datetime.now(dt.timezone.utc)))
+        )
+        return result[0] if result else None
+
+    def cycle_version(self) -> int | None:
+        result = self.query("SELECT version FROM cycle_version WHERE id = 1", fetch = 'one')
+        return result[0] if result else None
+
+    def close(self):
+        self.events.close()
+        self.pool.close()
+
+    @property
+    def snapshot_table(self) -> str:
+        """Table holding one row per stored server snapshot cycle, used to find the latest created_at."""
+        return 'server_snapshot' if self.storage_mode == 'compact' else 'server_user_rank'
+
+    @property
+    def storage_tables(self) -> list[str]:
+        """Tables the raw leaderboard data of the current storage mode lives in."""
+        if self.storage_mode == 'compact':
+            return ['server_dict', 'nick_dict', 'server_snapshot', 'server_user_rank_delta']
+        if self.partitions is not None:
+            return self.partitions.list_partitions()
+        return ['server_user_rank']
+
+    def recent_server_user_rank(self, timestamp_str: str | None) -> str:
+        """FROM clause the run queries read snapshots from, limited to the latest partitions if partitioned."""
+        if self.partitions is None or timestamp_str is None:
+            return 'server_user_rank'
+        return self.partitions.recent_source(dt.datetime.fromisoformat(timestamp_str))
+
+    def parameterize(self, query: str) -> str:
+        """Translate a query written with %s / %(name)s placeholders to the paramstyle of the database."""
         if self.database_type == 'sqlite':
-            return sqlite3.connect(self.conn_string)
-        elif self.database_type == 'postgres':
-            return psycopg.connect(self.conn_string)
+            return NAMED_PLACEHOLDER.sub(r':\1', query).replace('%s', '?')
+        return query
+
+    def to_db_timestamp(self, timestamp: dt.datetime):
+        # SQLite stores timestamps as ISO text, the format the run queries compare against.
+        if timestamp is not None and self.database_type == 'sqlite':
+            return timestamp.isoformat()
+        return timestamp
+
+    def timestamp_param(self, timestamp_str: str | None):
+        """Bind value for a created_at given as ISO string, typed so Postgres plans it as timestamptz."""
+        if timestamp_str is None:
+            return None
+        return self.to_db_timestamp(dt.datetime.fromisoformat(timestamp_str))
+
+    def from_db_timestamp(self, value) -> dt.datetime | None:
+        if isinstance(value, str):
+            return dt.datetime.fromisoformat(value)
+        return value
 
     def drop_server_user_rank(self):
         self.query(
@@ -85,8 +298,31 @@ class SlitherDatabase():
             fetch = 'none'
         )
 
+    def ensure_schema(self, flg_force = False):
+        """
+        Run `validate_storage` once and reuse its result on every following call.
+
+        The schema is verified again after a lost connection, `invalidate_schema` or
+        with `flg_force`.
+        """
+        if self.flg_schema_ready and not flg_force:
+            self.schema_saved_counter.inc(self.schema_check_seconds)
+            return
+        # what each skipped check saves; the first one may include migrations and run higher
+        start = time.perf_counter()
+        self.validate_storage()
+        self.schema_check_seconds = time.perf_counter() - start
+        self.schema_check_gauge.set(self.schema_check_seconds)
+        self.logger.info(f"└─ schema verified, skipping the {self.schema_check_seconds * 1000:.1f} ms check on the following cycles.")
+
+    def invalidate_schema(self):
+        if self.flg_schema_ready:
+            self.logger.warning("└─ schema state invalidated, verifying again on next use.")
+        self.flg_schema_ready = False
+
     def validate_storage(self, flg_drop_table = False):
         self.logger.info("Validating storage...")
+        self.flg_schema_ready = False
 
         if flg_drop_table:
             self.logger.warning("└─ Dropping table...")
@@ -94,17 +330,97 @@ class SlitherDatabase():
             self.logger.warning("│    └─done.")
 
         self.logger.info("└─ Connecting to database...")
-        # Check if the table exists before creating it
-        table_exists = self.server_user_rank_exists()
+        if self.partitions is not None:
+            self.partitions.setup(dt.datetime.now(dt.timezone.utc))
+            self.logger.info(f"└─ {len(self.partitions.known)} server_user_rank partitions.")
+        else:
+            # Check if the table exists before creating it
+            table_exists = self.server_user_rank_exists()
 
+            if not table_exists:
+                self.logger.info("└─ creating table...")
+                self.create_server_user_rank_table()
+                self.logger.info("│    └─done.")
+            else:
+                self.logger.info("└─ Table already exists.")
 
+        self.create_user_run_table()
+        self.create_user_rank_run_table()
+        self.migrate()
+        self.flg_schema_ready = True
 
-        if not table_exists:
-            self.logger.info("└─ creating table...")
-            self.create_server_user_rank_table()
+    def schema_version(self) -> int:
+        result = self.query("SELECT MAX(version) FROM schema_migrations", fetch = 'one')
+        return result[0] or 0
+
+    def migrate(self, target_version: int | None = None) -> int:
+        """
+        Apply all migrations newer than the recorded schema version.
+
+        Args:
+            target_version: stop after this version. Defaults to the latest migration.
+
+        Returns:
+            The schema version after migrating.
+        """
+        self.query(
+            '''
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at TIMESTAMP WITH TIME ZONE NOT NULL
+            )
+            ''',
+            fetch = 'none',
+            flg_commit = True
+        )
+        current_version = self.schema_version()
+        for migration in MIGRATIONS:
+            if migration.version <= current_version:
+                continue
+            if target_version is not None and migration.version > target_version:
+                break
+            self.logger.info(f"└─ applying migration {migration.version}: {migration.description}...")
+            with self.get_conn() as conn:
+                cursor = conn.cursor()
+                try:
+                    for statement in migration.statements(self.database_type):
+                        statements = self.partitions.adapt_statement(statement) if self.partitions else [statement]
+                        for statement in statements:
+                            cursor.execute(statement)
+                    cursor.execute(
+                        self.parameterize("INSERT INTO schema_migrations (version, description, applied_at) VALUES (%s, %s, %s)"),
+                        (migration.version, migration.description, self.to_db_timestamp(dt.datetime.now(dt.timezone.utc)))
+                    )
+                finally:
+                    cursor.close()
+            current_version = migration.version
             self.logger.info("│    └─done.")
-        else:
-            self.logger.info("└─ Table already exists.")
+        self.logger.info(f"└─ Schema at version {current_version}.")
+        return current_version
+
+    def explain_indexes(self) -> dict[str, tuple[bool, list[str]]]:
+        """
+        Show the query plans of the queries the migrations index for.
+
+        Note that on small tables Postgres prefers sequential scans regardless of indexes.
+
+        Returns:
+            Mapping of query name to (uses an idx_ index or the primary key, plan lines).
+        """
+        ts = dt.datetime.now(dt.timezone.utc).isoformat()
+        prefix = 'EXPLAIN QUERY PLAN' if self.database_type == 'sqlite' else 'EXPLAIN'
+        plans = {}
+        for name, query in INDEXED_QUERIES.items():
+            rows = self.query(f"{prefix} {query.format(ts = ts)}", fetch = 'all')
+            # sqlite returns (id, parent, notused, detail), postgres one text column
+            lines = [str(row[-1]) for row in rows]
+            uses_index = any(marker in line for line in lines for marker in INDEX_PLAN_MARKERS)
+            plans[name] = (uses_index, lines)
+            self.logger.info(f"└─ {name}: {'index' if uses_index else 'NO INDEX'}")
+            for line in lines:
+                self.logger.info(f"│    └─ {line}")
+        return plans
 
     def server_user_rank_exists(self):
         if self.database_type == 'sqlite':
@@ -139,7 +455,7 @@ class SlitherDatabase():
                 rank INTEGER,
                 nick TEXT,
                 score INTEGER,
-                created_at TIMESTAMP WITH TIME ZONE
+                created_at TIMESTAMP WITH TIME ZONE,
                 PRIMARY KEY (server_id, server_time, rank, nick)
                 )
             ''')
@@ -168,9 +484,6 @@ class SlitherDatabase():
         df['created_at'] = created_at
         df = df[['server_id', 'server_time', 'rank', 'nick', 'score', 'created_at']]
 
-        conn = self.get_conn()
-        cursor = conn.cursor()
-        
         insertion_query_sqlite = '''
             INSERT OR IGNORE INTO server_user_rank
             (
@@ -198,19 +511,18 @@ class SlitherDatabase():
         '''
 
 
-        for index, row in df.iterrows():
-            try:
-                row_data = (row['server_id'], row['server_time'], row['rank'], row['nick'], row['score'], row['created_at'])
-                if self.database_type == 'sqlite':
-                    cursor.execute(insertion_query_sqlite, row_data)
-                else:
-                    cursor.execute(insertion_query_postgres, row_data)
-            except Exception as e:
-                self.logger.error(f"Error inserting row {index}: {e}")
-        self.logger.info(f"│    └─ inserted data for server {row['server_id']} at {row['server_time']} (created_at: {row['created_at']})")
-
-        conn.commit()
-        conn.close()
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            for index, row in df.iterrows():
+                try:
+                    row_data = (row['server_id'], row['server_time'], row['rank'], row['nick'], row['score'], row['created_at'])
+                    if self.database_type == 'sqlite':
+                        cursor.execute(insertion_query_sqlite, row_data)
+                    else:
+                        cursor.execute(insertion_query_postgres, row_data)
+                except Exception as e:
+                    self.logger.error(f"Error inserting row {index}: {e}")
+            self.logger.info(f"│    └─ inserted data for server {row['server_id']} at {row['server_time']} (created_at: {row['created_at']})")
         # elif database_type == 'postgres':
         #     conn = psycopg.connect(os.environ['POSTGRESS_CONN'])
         #     cursor = conn.cursor()
@@ -241,40 +553,399 @@ class SlitherDatabase():
 
         #     conn.commit()
         #     conn.close()
-        
-    def compute_rank_runs(self, timestamp=None):
+
+    def server_user_rank_rows(self, batch: list[dict], created_at: dt.datetime) -> list[tuple]:
+        """Flatten the server tables of one scrape cycle into insertable row tuples."""
+        created_at_value = self.to_db_timestamp(created_at)
+        rows = []
+        for data in batch:
+            for record in data['records']:
+                rows.append((
+                    data['server_id'],
+                    data['server_time'],
+                    record['rank'],
+                    record['nick'],
+                    record['score'],
+                    created_at_value
+                ))
+        return rows
+
+    def server_user_rank_insert_batch(self, batch: list[dict], created_at: dt.datetime) -> int:
+        """
+        Insert the tables of all servers from one scrape cycle in a single round trip.
+
+        Postgres streams the rows into a temporary staging table via COPY and moves them
+        over with one INSERT ... ON CONFLICT DO NOTHING. SQLite uses executemany inside
+        one transaction.
+
+        Args:
+            batch: list of server dicts as returned by process_table.
+            created_at: timestamp of the scrape cycle.
+
+        Returns:
+            Number of rows inserted, rows that already existed are not counted.
+        """
+        if self.cycle_event is not None:
+            self.cycle_event.add_servers(data['server_id'] for data in batch)
+        if self.storage_mode == 'compact':
+            n_inserted = self.compact_store.insert_batch(batch, created_at)
+            self.storage_stats.record_insert(n_inserted)
+            return n_inserted
+
+        rows = self.server_user_rank_rows(batch, created_at)
+        if not rows:
+            self.logger.info("│    └─ nothing to insert.")
+            return 0
+
+        table = 'server_user_rank'
+        conflict_columns = 'server_id, server_time, rank, nick'
+        if self.partitions is not None:
+            self.partitions.ensure(created_at)
+            # partitions are keyed by created_at as well, on both backends
+            conflict_columns += ', created_at'
+            if self.database_type == 'sqlite':
+                table = self.partitions.table_for(created_at)
+
+        with self.get_conn() as conn:
+            if self.database_type == 'sqlite':
+                cursor = conn.executemany(
+                    f'''
+                    INSERT OR IGNORE INTO {table}
+                    (server_id, server_time, rank, nick, score, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ''',
+                    rows
+                )
+                n_inserted = cursor.rowcount
+                cursor.close()
+            elif self.database_type == 'postgres':
+                with conn.transaction():
+                    with conn.cursor() as cursor:
+                        cursor.execute(
+                            '''
+                            CREATE TEMPORARY TABLE IF NOT EXISTS server_user_rank_stage
+                            (LIKE public.server_user_rank INCLUDING DEFAULTS)
+                            ON COMMIT DELETE ROWS
+                            '''
+                        )
+                        with cursor.copy(
+                            '''
+                            COPY server_user_rank_stage
+                            (server_id, server_time, rank, nick, score, created_at)
+                            FROM STDIN
+                            '''
+                        ) as copy:
+                            for row in rows:
+                                copy.write_row(row)
+                        cursor.execute(
+                            f'''
+                            INSERT INTO public.server_user_rank
+                            (server_id, server_time, rank, nick, score, created_at)
+                            SELECT server_id, server_time, rank, nick, score, created_at
+                            FROM server_user_rank_stage
+                            ON CONFLICT ({conflict_columns}) DO NOTHING
+                            '''
+                        )
+                        n_inserted = cursor.rowcount
+            else:
+                raise ValueError(f"Invalid database type: {self.database_type}")
+
+        self.storage_stats.record_insert(n_inserted)
+        self.logger.info(f"│    └─ inserted {n_inserted} of {len(rows)} rows for {len(batch)} servers (created_at: {created_at.isoformat()})")
+        return n_inserted
+
+    def compute_rank_runs(
+        self,
+        timestamp=None,
+        batch: list[dict] | None = None,
+        server_ids: set[str] | None = None,
+        unchanged_server_ids: set[str] | None = None
+    ):
         """
         Compute user rank runs for records at a specific timestamp.
         
         Args:
             timestamp: datetime object for the timestamp to process records for.
                       If None, processes all records.
+            batch: server dicts inserted for this timestamp. Only used by the 'memory'
+                   run engine; read back from server_user_rank when not given.
+            server_ids: servers whose runs the batch decides on ('memory' engine only).
+                   Defaults to all servers, i.e. the batch is the complete leaderboard.
+            unchanged_server_ids: servers observed with an unchanged table this cycle
+                   ('memory' engine only); their open runs stay open.
+
+        Returns:
+            The RunDelta of the cycle. The 'sql' run engine reports the runs its statements
+            opened and closed, but not the aggregates of open runs they left unchanged.
         """
         timestamp_str = timestamp.isoformat() if timestamp else None
         self.logger.info(f"Computing rank runs for timestamp: {timestamp_str}")
         
         # First, ensure we have a table to store the runs
-        self.create_user_run_table()
-        self.create_user_rank_run_table()
+        if not self.flg_schema_ready:
+            self.ensure_schema()
+
+        if self.run_engine == 'memory':
+            delta = self.compute_rank_runs_in_memory(timestamp, batch, server_ids, unchanged_server_ids)
+            self.logger.info("Rank runs computation completed.")
+            return delta
         
         # Open new runs for users who appear for the first time
-        self.open_new_runs(timestamp_str)
-        
+        delta = RunDelta(
+            opened_runs = self.open_new_runs(timestamp_str),
+            opened_rank_runs = self.open_new_rank_runs(timestamp_str)
+        )
+
         # Close runs for users who are no longer visible
-        self.close_inactive_rank_runs(timestamp_str)
-        self.close_inactive_runs(timestamp_str)
+        delta.closed_rank_runs = self.close_inactive_rank_runs(timestamp_str)
+        delta.closed_runs = self.close_inactive_runs(timestamp_str)
+        if self.cycle_event is not None:
+            self.cycle_event.add_delta(delta)
+        # the dashboard tables are folded from the closed runs, as with the memory engine
+        self.analytics.apply(delta)
+        self.top_runs.apply(delta)
+
+        if timestamp is not None:
+            self.log_cycle(timestamp)
         
         self.logger.info("Rank runs computation completed.")
-    
-    def open_new_runs(self, timestamp_str=None):
+        return delta
+
+    def compute_rank_runs_in_memory(
+        self,
+        timestamp: dt.datetime,
+        batch: list[dict] | None = None,
+        server_ids: set[str] | None = None,
+        unchanged_server_ids: set[str] | None = None
+    ):
+        if not self.run_tracker.flg_loaded:
+            self.load_run_tracker(before = timestamp)
+        if batch is None:
+            batch = self.fetch_server_user_rank_batch(timestamp)
+        if unchanged_server_ids:
+            self.run_tracker.touch(unchanged_server_ids, timestamp)
+        # a table stored again unchanged hits the primary key and leaves no rows, so servers
+        # dropping off or (re)appearing on the page are logged rather than implied by the snapshot
+        known_server_ids = set(self.run_tracker.server_last_seen)
+        batch_server_ids = {data['server_id'] for data in batch}
+        vanished_server_ids = (known_server_ids if server_ids is None else server_ids) - batch_server_ids
+        delta = self.run_tracker.advance(timestamp, batch, server_ids)
+        if self.cycle_event is not None:
+            self.cycle_event.add_delta(delta)
+        self.log_cycle(timestamp, vanished_server_ids, appeared_server_ids = batch_server_ids - known_server_ids)
+        self.write_run_delta(delta)
+        self.analytics.apply(delta)
+        self.top_runs.apply(delta)
+        self.logger.info(
+            f"└─ runs opened: {len(delta.opened_runs)}, closed: {len(delta.closed_runs)}; "
+            f"rank runs opened: {len(delta.opened_rank_runs)}, closed: {len(delta.closed_rank_runs)}"
+        )
+        return delta
+
+    def load_run_tracker(self, before: dt.datetime | None = None):
+        """Rebuild the in-memory run state from the open rows in user_run / user_rank_run.
+
+        Args:
+            before: created_at of the cycle about to be processed. Its snapshot may already
+                be stored and must not count as the last time a server was seen.
+        """
+        self.logger.info("Loading open runs...")
+        open_runs = self.query(
+            "SELECT server_id, nick, start_time, max_score, min_rank FROM user_run WHERE end_time IS NULL",
+            fetch = 'all'
+        )
+        open_rank_runs = self.query(
+            "SELECT server_id, nick, rank, start_time FROM user_rank_run WHERE end_time IS NULL",
+            fetch = 'all'
+        )
+        self.run_tracker.load(
+            [(server_id, nick, self.from_db_timestamp(start_time), max_score, min_rank)
+             for server_id, nick, start_time, max_score, min_rank in open_runs],
+            [(server_id, nick, rank, self.from_db_timestamp(start_time))
+             for server_id, nick, rank, start_time in open_rank_runs],
+            last_seen = self.fetch_server_last_seen(before)
+        )
+
+    def fetch_server_last_seen(self, before: dt.datetime | None = None) -> dict[str, dt.datetime]:
+        """
+        Last cycle before `before` each server on the page was observed in, as RunTracker.server_last_seen.
+
+        A server is on the page unless it vanished (server_presence) or was missing from a
+        complete cycle after it was last stored or appeared. Its table was then observed,
+        unchanged, in every logged cycle since, so the last logged cycle is its last
+        observation. Without a cycle log that is the server's last stored snapshot.
+        """
+        before = self.to_db_timestamp(before or FAR_FUTURE)
+        if self.storage_mode == 'compact':
+            last_snapshot_query = (
+                "SELECT d.server_id, MAX(s.created_at) FROM server_snapshot s "
+                "JOIN server_dict d ON d.server_key = s.server_key "
+                "WHERE s.created_at < %s GROUP BY d.server_id"
+            )
+        else:
+            last_snapshot_query = "SELECT server_id, MAX(created_at) FROM server_user_rank WHERE created_at < %s GROUP BY server_id"
+        last_seen = {
+            server_id: self.from_db_timestamp(created_at)
+            for server_id, created_at in self.query(last_snapshot_query, fetch = 'all', params = (before,))
+        }
+        last_cycle, last_complete = self.query(
+            "SELECT MAX(created_at), (SELECT MAX(created_at) FROM cycle_log WHERE flg_complete AND created_at < %s) "
+            "FROM cycle_log WHERE created_at < %s",
+            fetch = 'one',
+            params = (before, before)
+        )
+        if last_cycle is None:
+            return last_seen
+        last_cycle = self.from_db_timestamp(last_cycle)
+        last_complete = self.from_db_timestamp(last_complete)
+        presence = self.query(
+            "SELECT server_id, MAX(CASE WHEN flg_present THEN created_at END), MAX(CASE WHEN NOT flg_present THEN created_at END) "
+            "FROM server_presence WHERE created_at < %s GROUP BY server_id",
+            fetch = 'all',
+            params = (before,)
+        )
+        last_vanished = {}
+        for server_id, appeared_at, vanished_at in presence:
+            appeared_at = self.from_db_timestamp(appeared_at)
+            if appeared_at is not None:
+                last_seen[server_id] = max(appeared_at, last_seen.get(server_id, appeared_at))
+            last_vanished[server_id] = self.from_db_timestamp(vanished_at)
+        on_page = {}
+        for server_id, created_at in last_seen.items():
+            vanished_at = last_vanished.get(server_id)
+            if (vanished_at is None or vanished_at < created_at) and (last_complete is None or last_complete <= created_at):
+                on_page[server_id] = max(created_at, last_cycle)
+        return on_page
+
+    def log_cycle(self, timestamp: dt.datetime, vanished_server_ids: set[str] | None = None, appeared_server_ids: set[str] = frozenset()):
+        """
+        Record a processed cycle in cycle_log and server_presence, in the cycle's transaction.
+
+        Args:
+            vanished_server_ids: servers that dropped off the page in this cycle; the others
+                missing from its stored snapshot were observed unchanged. None marks a
+                complete cycle, as the 'sql' run engine treats it: everything missing vanished.
+            appeared_server_ids: servers that are new on the page, or back on it.
+        """
+        if self.database_type == 'sqlite':
+            insert_cycle = "INSERT OR IGNORE INTO cycle_log (created_at, flg_complete) VALUES (?, ?)"
+            insert_presence = "INSERT OR IGNORE INTO server_presence (created_at, server_id, flg_present) VALUES (?, ?, ?)"
+        else:
+            insert_cycle = "INSERT INTO cycle_log (created_at, flg_complete) VALUES (%s, %s) ON CONFLICT (created_at) DO NOTHING"
+            insert_presence = (
+                "INSERT INTO server_presence (created_at, server_id, flg_present) VALUES (%s, %s, %s) "
+                "ON CONFLICT (created_at, server_id) DO NOTHING"
+            )
+        created_at = self.to_db_timestamp(timestamp)
+        presence = [(created_at, server_id, True) for server_id in sorted(appeared_server_ids)]
+        presence += [(created_at, server_id, False) for server_id in sorted(vanished_server_ids or ())]
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(insert_cycle, (created_at, vanished_server_ids is None))
+                if presence:
+                    cursor.executemany(insert_presence, presence)
+            finally:
+                cursor.close()
+
+    def fetch_server_user_rank_batch(self, timestamp: dt.datetime) -> list[dict]:
+        """Read the snapshot stored for one created_at back into process_table shaped dicts."""
+        if self.storage_mode == 'compact':
+            return self.compact_store.fetch_batch(timestamp)
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(
+                    self.parameterize(
+                        "SELECT server_id, server_time, rank, nick, score FROM server_user_rank WHERE created_at = %s"
+                    ),
+                    (self.to_db_timestamp(timestamp),)
+                )
+                records = cursor.fetchall()
+            finally:
+                cursor.close()
+        batch = {}
+        for server_id, server_time, rank, nick, score in records:
+            data = batch.setdefault(server_id, {'server_id': server_id, 'server_time': server_time, 'records': []})
+            data['records'].append({'rank': rank, 'nick': nick, 'score': score})
+        return list(batch.values())
+
+    def write_run_delta(self, delta: RunDelta):
+        """Write the opened, updated and closed runs of one cycle in a single transaction."""
+        if not delta:
+            return
+        ts = self.to_db_timestamp
+        now = ts(dt.datetime.now(dt.timezone.utc))
+        if self.database_type == 'sqlite':
+            insert_run = "INSERT OR IGNORE INTO user_run (server_id, nick, start_time, max_score, min_rank, created_at) VALUES (?, ?, ?, ?, ?, ?)"
+            insert_rank_run = "INSERT OR IGNORE INTO user_rank_run (server_id, nick, rank, start_time, created_at) VALUES (?, ?, ?, ?, ?)"
+        else:
+            insert_run = (
+                "INSERT INTO user_run (server_id, nick, start_time, max_score, min_rank, created_at) VALUES (%s, %s, %s, %s, %s, %s) "
+                "ON CONFLICT (server_id, nick, start_time) DO NOTHING"
+            )
+            insert_rank_run = (
+                "INSERT INTO user_rank_run (server_id, nick, rank, start_time, created_at) VALUES (%s, %s, %s, %s, %s) "
+                "ON CONFLICT (server_id, nick, rank, start_time) DO NOTHING"
+            )
+        close_run = self.parameterize(
+            "UPDATE user_run SET end_time = %s, duration_seconds = %s, max_score = %s, min_rank = %s "
+            "WHERE server_id = %s AND nick = %s AND start_time = %s"
+        )
+        update_run = self.parameterize(
+            "UPDATE user_run SET max_score = %s, min_rank = %s "
+            "WHERE server_id = %s AND nick = %s AND start_time = %s"
+        )
+        close_rank_run = self.parameterize(
+            "UPDATE user_rank_run SET end_time = %s, duration_seconds = %s "
+            "WHERE server_id = %s AND nick = %s AND rank = %s AND start_time = %s"
+        )
+
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            try:
+                if delta.opened_runs:
+                    cursor.executemany(insert_run, [
+                        (server_id, nick, ts(start_time), max_score, min_rank, now)
+                        for server_id, nick, start_time, max_score, min_rank in delta.opened_runs
+                    ])
+                if delta.updated_runs:
+                    cursor.executemany(update_run, [
+                        (max_score, min_rank, server_id, nick, ts(start_time))
+                        for server_id, nick, start_time, max_score, min_rank in delta.updated_runs
+                    ])
+                if delta.closed_runs:
+                    cursor.executemany(close_run, [
+                        (ts(end_time), duration, max_score, min_rank, server_id, nick, ts(start_time))
+                        for server_id, nick, start_time, end_time, duration, max_score, min_rank in delta.closed_runs
+                    ])
+                if delta.opened_rank_runs:
+                    cursor.executemany(insert_rank_run, [
+                        (server_id, nick, rank, ts(start_time), now)
+                        for server_id, nick, rank, start_time in delta.opened_rank_runs
+                    ])
+                if delta.closed_rank_runs:
+                    cursor.executemany(close_rank_run, [
+                        (ts(end_time), duration, server_id, nick, rank, ts(start_time))
+                        for server_id, nick, rank, start_time, end_time, duration in delta.closed_rank_runs
+                    ])
+            finally:
+                cursor.close()
+
+    def open_new_runs(self, timestamp_str=None) -> list[tuple]:
         """
         Open new runs for users who appear for the first time in the leaderboard.
         
         Args:
             timestamp_str: ISO format string of the timestamp to process.
                           If None, processes all records.
+
+        Returns:
+            The opened runs, as RunDelta.opened_runs.
         """
         self.logger.info(f"Opening new runs for timestamp: {timestamp_str}")
+        source = self.recent_server_user_rank(timestamp_str)
+        params = {'ts': self.timestamp_param(timestamp_str)}
         if self.database_type == 'sqlite':
             query = f'''
                 WITH current_records AS (
@@ -284,25 +955,26 @@ class SlitherDatabase():
                         created_at,
                         score,
                         rank
-                    FROM server_user_rank
-                    WHERE created_at = '{timestamp_str}'
+                    FROM {source}
+                    WHERE created_at = %(ts)s
                 ),
                 previous_timestamp AS (
                     SELECT MAX(created_at) as prev_time
-                    FROM server_user_rank
-                    WHERE created_at < '{timestamp_str}'
+                    FROM {source}
+                    WHERE created_at < %(ts)s
                 ),
                 previous_records AS (
                     SELECT 
                         server_id,
                         nick
-                    FROM server_user_rank
+                    FROM {source}
                     WHERE created_at = (SELECT prev_time FROM previous_timestamp)
                 ),
                 existing_open_runs AS (
                     SELECT 
                         server_id,
-                        nick
+                        nick,
+                        end_time
                     FROM user_run
                     WHERE end_time IS NULL
                 )
@@ -310,10 +982,10 @@ class SlitherDatabase():
                 SELECT 
                     cur.server_id,
                     cur.nick,
-                    cur.server_time,
+                    cur.created_at,
                     cur.score,
                     cur.rank,
-                    '{timestamp_str}' AS created_at
+                    %(ts)s AS created_at
                 FROM current_records cur
                 WHERE NOT EXISTS (
                     SELECT 1 FROM existing_open_runs r
@@ -326,6 +998,7 @@ class SlitherDatabase():
                     WHERE prev.server_id = cur.server_id
                     AND prev.nick = cur.nick
                 )
+                RETURNING server_id, nick, start_time, max_score, min_rank
             '''
         elif self.database_type == 'postgres':
             query = f'''
@@ -336,19 +1009,19 @@ class SlitherDatabase():
                         created_at,
                         score,
                         rank
-                    FROM server_user_rank
-                    WHERE created_at = '{timestamp_str}'
+                    FROM {source}
+                    WHERE created_at = %(ts)s
                 ),
                 previous_timestamp AS (
                     SELECT MAX(created_at) as prev_time
-                    FROM server_user_rank
-                    WHERE created_at < '{timestamp_str}'
+                    FROM {source}
+                    WHERE created_at < %(ts)s
                 ),
                 previous_records AS (
                     SELECT 
                         server_id,
                         nick
-                    FROM server_user_rank
+                    FROM {source}
                     WHERE created_at = (SELECT prev_time FROM previous_timestamp)
                 ),
                 open_runs AS (
@@ -367,7 +1040,7 @@ class SlitherDatabase():
                     cur.created_at,
                     cur.score,
                     cur.rank,
-                    '{timestamp_str}' AS created_at
+                    %(ts)s AS created_at
                 FROM current_records cur
                 WHERE NOT EXISTS (
                     SELECT 1 FROM open_runs
@@ -381,32 +1054,42 @@ class SlitherDatabase():
                     AND prev.nick = cur.nick
                 )
                 ON CONFLICT (server_id, nick, start_time) DO NOTHING
+                RETURNING server_id, nick, start_time, max_score, min_rank
             '''
         
-        self.query(query, fetch='none', flg_commit=True, flg_print_query=False)
+        opened_runs = self.query(query, fetch='all', flg_commit=True, params=params, flg_prepare=self.flg_prepare_statements)
+        return [
+            (server_id, nick, self.from_db_timestamp(start_time), max_score, min_rank)
+            for server_id, nick, start_time, max_score, min_rank in opened_runs
+        ]
     
-    def close_inactive_runs(self, timestamp_str=None):
+    def close_inactive_runs(self, timestamp_str=None) -> list[tuple]:
         """
         Close runs for users who are no longer visible in the latest data.
         
         Args:
             timestamp_str: ISO format string of the timestamp to process.
                           If None, processes all records.
+
+        Returns:
+            The closed runs, as RunDelta.closed_runs.
         """
         self.logger.info(f"Closing inactive runs for timestamp: {timestamp_str}")
+        source = self.recent_server_user_rank(timestamp_str)
+        params = {'ts': self.timestamp_param(timestamp_str)}
         if self.database_type == 'sqlite':
             query = f'''
                 WITH previous_timestamp AS (
                     SELECT MAX(created_at) as max_time
-                    FROM server_user_rank
-                    WHERE created_at < '{timestamp_str}'
+                    FROM {source}
+                    WHERE created_at < %(ts)s
                 ),
                 current_users AS (
                     SELECT DISTINCT
                         server_id,
                         nick
-                    FROM server_user_rank
-                    WHERE created_at = '{timestamp_str}'
+                    FROM {source}
+                    WHERE created_at = %(ts)s
                 ),
                 open_runs_to_close AS (
                     SELECT
@@ -425,25 +1108,29 @@ class SlitherDatabase():
                 SET 
                     end_time = (SELECT max_time FROM previous_timestamp),
                     duration_seconds = CAST(
-                        (JULIANDAY((SELECT max_time FROM previous_timestamp)) - JULIANDAY(start_time)) * 86400 AS INTEGER
+                        -- rounded first: JULIANDAY arithmetic is off by fractions of a second
+                        ROUND((JULIANDAY((SELECT max_time FROM previous_timestamp)) - JULIANDAY(start_time)) * 86400, 3) AS INTEGER
                     )
                 WHERE (server_id, nick, start_time) IN (
                     SELECT server_id, nick, start_time FROM open_runs_to_close
                 )
+                -- without the previous snapshot in reach there is no end time, the runs stay open
+                AND (SELECT max_time FROM previous_timestamp) IS NOT NULL
+                RETURNING server_id, nick, start_time, end_time, duration_seconds, max_score, min_rank
             '''
         elif self.database_type == 'postgres':
             query = f'''
                 WITH previous_timestamp AS (
                     SELECT MAX(created_at) as max_time
-                    FROM server_user_rank
-                    WHERE created_at < '{timestamp_str}'
+                    FROM {source}
+                    WHERE created_at < %(ts)s
                 ),
                 current_users AS (
                     SELECT DISTINCT
                         server_id,
                         nick
-                    FROM server_user_rank
-                    WHERE created_at = '{timestamp_str}'
+                    FROM {source}
+                    WHERE created_at = %(ts)s
                 ),
                 open_runs_to_close AS (
                     SELECT
@@ -467,63 +1154,105 @@ class SlitherDatabase():
                 WHERE (server_id, nick, start_time) IN (
                     SELECT server_id, nick, start_time FROM open_runs_to_close
                 )
+                -- without the previous snapshot in reach there is no end time, the runs stay open
+                AND (SELECT max_time FROM previous_timestamp) IS NOT NULL
+                RETURNING server_id, nick, start_time, end_time, duration_seconds, max_score, min_rank
             '''
         
-        self.query(query, fetch='none', flg_commit=True, flg_print_query=False)
+        closed_runs = self.query(query, fetch='all', flg_commit=True, params=params, flg_prepare=self.flg_prepare_statements)
+        return [
+            (server_id, nick, self.from_db_timestamp(start_time), self.from_db_timestamp(end_time), duration, max_score, min_rank)
+            for server_id, nick, start_time, end_time, duration, max_score, min_rank in closed_runs
+        ]
+
+    @property
+    def row_tables(self) -> list[str]:
+        """Tables whose rows grow with every cycle."""
+        if self.storage_mode == 'compact':
+            return ['server_user_rank_delta']
+        if self.partitions is not None and self.database_type == 'postgres':
+            return self.partitions.list_partitions()
+        return ['server_user_rank']
 
     def fetch_table_size_in_rows(self) -> int:
+        """Exact row count. Scans the whole table, see `estimate_table_size_in_rows`."""
+        # in compact mode the delta rows are what grows with every cycle
+        table = self.row_tables[0] if self.storage_mode == 'compact' else 'server_user_rank'
+        row_count = self.query(
+            f'SELECT COUNT(*) FROM {table}',
+            fetch = 'one',
+            flg_commit = False
+            )[0]
+        self.logger.debug(f"└─ Number of rows in {table}: {row_count}")
+        return row_count
+
+    def estimate_table_size_in_rows(self) -> int:
+        """
+        Row count from the planner statistics on Postgres, without touching the table.
+
+        Falls back to the exact count on SQLite and for tables that were never analyzed.
+        """
         if self.database_type == 'sqlite':
-            row_count = self.query(
-                'SELECT COUNT(*) FROM server_user_rank',
-                fetch = 'one',
-                flg_commit = False
-                )
-            self.logger.info(f"└─ Number of rows in server_user_rank: {row_count}")
-        elif self.database_type == 'postgres':
-            row_count = self.query(
-                'SELECT COUNT(*) FROM server_user_rank',
-                fetch = 'one',
-                flg_commit = False
-                )
-            self.logger.info(f"└─ Number of rows in server_user_rank: {row_count}")
+            return self.fetch_table_size_in_rows()
+        table_list = ', '.join(f"'{table}'" for table in self.row_tables)
+        result = self.query(
+            f'''
+            SELECT
+                SUM(reltuples),
+                BOOL_OR(reltuples < 0)
+            FROM pg_class
+            WHERE relname IN ({table_list})
+            AND relnamespace = 'public'::regnamespace
+            ''',
+            fetch = 'one',
+            flg_commit = False
+        )
+        if result is None or result[0] is None or result[1]:
+            # reltuples is -1 until the first VACUUM / ANALYZE
+            return self.fetch_table_size_in_rows()
+        row_count = int(result[0])
+        self.logger.debug(f"└─ Estimated number of rows: {row_count}")
         return row_count
 
     def fetch_table_size_in_mb(self) -> int:
+        table_list = ', '.join(f"'{table}'" for table in self.storage_tables)
         if self.database_type == 'sqlite':
+            # tables and their indexes
             result = self.query(
-                '''
+                f'''
                 SELECT
                     SUM(pgsize)/(1024.0*1024.0)
                 FROM
                 dbstat
             WHERE
-                name = "server_user_rank";
+                name IN (SELECT name FROM sqlite_master WHERE tbl_name IN ({table_list}));
                 ''',
                 fetch = 'one',
                 flg_commit = False
             )
-            size_in_mb = result[0] if result else 0
-            self.logger.info(f"└─ Table size in MB: {size_in_mb}")
+            size_in_mb = result[0] if result and result[0] else 0
+            self.logger.debug(f"└─ Table size in MB: {size_in_mb}")
             return size_in_mb
         elif self.database_type == 'postgres':
             result = self.query(
-                '''
+                f'''
                 SELECT
-                    pg_total_relation_size('server_user_rank')/(1024.0*1024.0) as size_mb
+                    SUM(pg_total_relation_size(table_name::regclass))/(1024.0*1024.0) as size_mb
+                FROM UNNEST(ARRAY[{table_list}]) AS table_name
                 ''',
                 fetch = 'one',
                 flg_commit = False
             )
-            size_in_mb = result[0] if result else 0
-            self.logger.info(f"└─ Table size in MB: {size_in_mb}")
+            size_in_mb = result[0] if result and result[0] else 0
+            self.logger.debug(f"└─ Table size in MB: {size_in_mb}")
             return size_in_mb
 
     def inspect_server_user_rank(self, timestamp: dt.datetime):
-        query = f'''
+        query = '''
             SELECT * FROM server_user_rank
-            WHERE created_at = '{timestamp}';
+            WHERE created_at = %s;
         '''
-        records = self.query(query, fetch='all', flg_commit=False)
+        records = self.query(query, fetch='all', flg_commit=False, params=(self.to_db_timestamp(timestamp),))
         print("\n\n server_user_rank: ================================")
         print(dataframe(records))
         print("====================================================\n\n")
@@ -538,9 +1267,12 @@ class SlitherDatabase():
         print("====================================================\n\n")
             
 
-    def insert_test_cases(self):
+    def insert_test_cases(self, flg_confirm: bool = True):
+        """Truncate the tables and insert a few hand-written snapshots; asks first unless `flg_confirm` is False.
 
-        if click.confirm("Do you want to truncate the server_user_rank table and continue to insert test cases?", default=False):
+        For load and regression numbers use bin/benchmark_suite.py instead.
+        """
+        if not flg_confirm or click.confirm("Do you want to truncate the server_user_rank table and continue to insert test cases?", default=False):
             self.truncate_server_user_rank()
             self.truncate_user_run()
         else:
@@ -603,7 +1335,7 @@ class SlitherDatabase():
         
         self.inspect_server_user_rank(datetime1)
         self.inspect_user_run(datetime1)
-        if click.confirm("Do you want to continue to insert test cases?", default=False):
+        if not flg_confirm or click.confirm("Do you want to continue to insert test cases?", default=False):
             pass
         else:
             return
@@ -616,7 +1348,7 @@ class SlitherDatabase():
         
         self.inspect_server_user_rank(datetime2)
         self.inspect_user_run(datetime2)
-        if click.confirm("Do you want to continue to insert test cases?", default=False):
+        if not flg_confirm or click.confirm("Do you want to continue to insert test cases?", default=False):
             pass
         else:
             return
@@ -629,7 +1361,7 @@ class SlitherDatabase():
         
         self.inspect_server_user_rank(datetime3)
         self.inspect_user_run(datetime3)
-        if click.confirm("Do you want to continue to insert test cases?", default=False):
+        if not flg_confirm or click.confirm("Do you want to continue to insert test cases?", default=False):
             pass
         else:
             return
@@ -718,15 +1450,20 @@ class SlitherDatabase():
             '''
         self.query(query, fetch='none', flg_commit=True)
 
-    def close_inactive_rank_runs(self, timestamp_str=None):
+    def open_new_rank_runs(self, timestamp_str=None) -> list[tuple]:
         """
-        Close inactive rank runs for users in the user_rank_run table.
+        Open rank runs for users who appear on a rank they did not hold in the previous snapshot.
         
         Args:
             timestamp_str: ISO format string of the timestamp to process.
                           If None, processes all records.
+
+        Returns:
+            The opened rank runs, as RunDelta.opened_rank_runs.
         """
-        self.logger.info(f"Closing inactive rank runs for timestamp: {timestamp_str}")
+        self.logger.info(f"Opening new rank runs for timestamp: {timestamp_str}")
+        source = self.recent_server_user_rank(timestamp_str)
+        params = {'ts': self.timestamp_param(timestamp_str)}
         if self.database_type == 'sqlite':
             query = f'''
                 WITH current_records AS (
@@ -735,20 +1472,20 @@ class SlitherDatabase():
                         nick,
                         rank,
                         created_at
-                    FROM server_user_rank
-                    WHERE created_at = '{timestamp_str}'
+                    FROM {source}
+                    WHERE created_at = %(ts)s
                 ),
                 previous_timestamp AS (
                     SELECT MAX(created_at) as prev_time
-                    FROM server_user_rank
-                    WHERE created_at < '{timestamp_str}'
+                    FROM {source}
+                    WHERE created_at < %(ts)s
                 ),
                 previous_records AS (
                     SELECT 
                         server_id,
                         nick,
                         rank
-                    FROM server_user_rank
+                    FROM {source}
                     WHERE created_at = (SELECT prev_time FROM previous_timestamp)
                 ),
                 open_rank_runs AS (
@@ -756,7 +1493,8 @@ class SlitherDatabase():
                         server_id,
                         nick,
                         rank,
-                        start_time
+                        start_time,
+                        end_time
                     FROM user_rank_run
                     WHERE end_time IS NULL
                 )
@@ -766,7 +1504,7 @@ class SlitherDatabase():
                     cur.nick,
                     cur.rank,
                     cur.created_at,
-                    '{timestamp_str}' AS created_at
+                    %(ts)s AS created_at
                 FROM current_records cur
                 WHERE NOT EXISTS (
                     SELECT 1 FROM open_rank_runs r
@@ -781,6 +1519,7 @@ class SlitherDatabase():
                     AND prev.nick = cur.nick
                     AND prev.rank = cur.rank
                 )
+                RETURNING server_id, nick, rank, start_time
             '''
         elif self.database_type == 'postgres':
             query = f'''
@@ -790,20 +1529,20 @@ class SlitherDatabase():
                         nick,
                         rank,
                         created_at
-                    FROM server_user_rank
-                    WHERE created_at = '{timestamp_str}'
+                    FROM {source}
+                    WHERE created_at = %(ts)s
                 ),
                 previous_timestamp AS (
                     SELECT MAX(created_at) as prev_time
-                    FROM server_user_rank
-                    WHERE created_at < '{timestamp_str}'
+                    FROM {source}
+                    WHERE created_at < %(ts)s
                 ),
                 previous_records AS (
                     SELECT 
                         server_id,
                         nick,
                         rank
-                    FROM server_user_rank
+                    FROM {source}
                     WHERE created_at = (SELECT prev_time FROM previous_timestamp)
                 ),
                 open_rank_runs AS (
@@ -811,7 +1550,8 @@ class SlitherDatabase():
                         server_id,
                         nick,
                         rank,
-                        start_time
+                        start_time,
+                        end_time
                     FROM user_rank_run
                     WHERE end_time IS NULL
                 )
@@ -821,7 +1561,7 @@ class SlitherDatabase():
                     cur.nick,
                     cur.rank,
                     cur.created_at,
-                    '{timestamp_str}' AS created_at
+                    %(ts)s AS created_at
                 FROM current_records cur
                 WHERE NOT EXISTS (
                     SELECT 1 FROM user_rank_run r
@@ -837,16 +1577,150 @@ class SlitherDatabase():
                     AND prev.rank = cur.rank
                 )
                 ON CONFLICT (server_id, nick, rank, start_time) DO NOTHING
+                RETURNING server_id, nick, rank, start_time
             '''
         
-        self.query(query, fetch='none', flg_commit=True, flg_print_query=False)
+        opened_rank_runs = self.query(query, fetch='all', flg_commit=True, params=params, flg_prepare=self.flg_prepare_statements)
+        return [
+            (server_id, nick, rank, self.from_db_timestamp(start_time))
+            for server_id, nick, rank, start_time in opened_rank_runs
+        ]
+
+    def close_inactive_rank_runs(self, timestamp_str=None) -> list[tuple]:
+        """
+        Close rank runs whose user no longer holds the rank, at the previous snapshot.
+        
+        Args:
+            timestamp_str: ISO format string of the timestamp to process.
+                          If None, processes all records.
+
+        Returns:
+            The closed rank runs, as RunDelta.closed_rank_runs.
+        """
+        self.logger.info(f"Closing inactive rank runs for timestamp: {timestamp_str}")
+        source = self.recent_server_user_rank(timestamp_str)
+        params = {'ts': self.timestamp_param(timestamp_str)}
+        if self.database_type == 'sqlite':
+            duration = "CAST(ROUND((JULIANDAY((SELECT max_time FROM previous_timestamp)) - JULIANDAY(start_time)) * 86400, 3) AS INTEGER)"
+        elif self.database_type == 'postgres':
+            duration = "EXTRACT(EPOCH FROM ((SELECT max_time FROM previous_timestamp) - start_time))::INTEGER"
+        query = f'''
+            WITH previous_timestamp AS (
+                SELECT MAX(created_at) as max_time
+                FROM {source}
+                WHERE created_at < %(ts)s
+            ),
+            current_ranks AS (
+                SELECT
+                    server_id,
+                    nick,
+                    rank
+                FROM {source}
+                WHERE created_at = %(ts)s
+            ),
+            open_rank_runs_to_close AS (
+                SELECT
+                    r.server_id,
+                    r.nick,
+                    r.rank,
+                    r.start_time
+                FROM user_rank_run r
+                WHERE r.end_time IS NULL
+                AND NOT EXISTS (
+                    SELECT 1 FROM current_ranks cr
+                    WHERE cr.server_id = r.server_id
+                    AND cr.nick = r.nick
+                    AND cr.rank = r.rank
+                )
+            )
+            UPDATE user_rank_run
+            SET
+                end_time = (SELECT max_time FROM previous_timestamp),
+                duration_seconds = {duration}
+            WHERE end_time IS NULL
+            AND (server_id, nick, rank, start_time) IN (
+                SELECT server_id, nick, rank, start_time FROM open_rank_runs_to_close
+            )
+            -- without the previous snapshot in reach there is no end time, the rank runs stay open
+            AND (SELECT max_time FROM previous_timestamp) IS NOT NULL
+            RETURNING server_id, nick, rank, start_time, end_time, duration_seconds
+        '''
+
+        closed_rank_runs = self.query(query, fetch='all', flg_commit=True, params=params, flg_prepare=self.flg_prepare_statements)
+        return [
+            (server_id, nick, rank, self.from_db_timestamp(start_time), self.from_db_timestamp(end_time), duration)
+            for server_id, nick, rank, start_time, end_time, duration in closed_rank_runs
+        ]
+
+    def replay_runs(
+        self,
+        tables: tuple[str, ...] = RUN_TABLES,
+        chunk_rows: int = 100_000,
+        n_shards: int = 1,
+        name: str = 'replay',
+        flg_restart: bool = False
+    ) -> dict[str, int]:
+        """Recompute the run tables from the history in server_user_rank, see `slither.util.backfill.RunReplay`."""
+        replay = RunReplay(self, name = name, tables = tables, chunk_rows = chunk_rows)
+        return replay.run(n_shards = n_shards, flg_restart = flg_restart)
 
 class SlitherDatabaseMinimal(SlitherDatabase):
     """Minimal database class that only supports the query method.
+
+    Reads are served from a shared QueryCache until the backend commits a new cycle,
+    which is detected by polling the cycle version at most every `version_check_interval`
+    seconds.
     """
-    def __init__(self, connection_string: str, logger: logging.Logger):
+    def __init__(
+        self,
+        connection_string: str,
+        logger: logging.Logger,
+        cache_size: int = 256,
+        cache_ttl: float = 30.0,
+        version_check_interval: float = 1.0
+    ):
         self.database = SlitherDatabase(connection_string, logger)
-    
-    def query(self, query: str, fetch = 'all', flg_commit = False, flg_print_query = False):
-        return self.database.query(query, fetch, flg_commit, flg_print_query)
+        self.logger = logger
+        self.cache = QueryCache(max_entries = cache_size, ttl = cache_ttl)
+        self.version_check_interval = version_check_interval
+        self.version = None
+        self.version_checked_at = None
+
+    def current_version(self) -> int | None:
+        now = time.monotonic()
+        if self.version_checked_at is None or now - self.version_checked_at >= self.version_check_interval:
+            try:
+                version = self.database.cycle_version()
+            except (psycopg.Error, sqlite3.Error) as error:
+                # no marker before the backend migrated; the TTL alone bounds staleness
+                self.logger.debug(f"cycle version unavailable: {error}")
+                version = None
+            if version != self.version:
+                self.cache.clear()
+            self.version = version
+            self.version_checked_at = now
+        return self.version
+
+    def observe_version(self, version: int | None):
+        """Take a cycle version pushed by the backend, sparing the next poll."""
+        if version is None or version != self.version:
+            self.cache.clear()
+        self.version = version
+        self.version_checked_at = time.monotonic() if version is not None else None
+
+    def query(self, query: str, fetch = 'all', flg_commit = False, flg_print_query = False, params = None):
+        if fetch == 'none' or flg_commit:
+            self.cache.clear()
+            return self.database.query(query, fetch, flg_commit, flg_print_query, params = params)
+        key = cache_key(query, fetch, params)
+        version = self.current_version()
+        flg_hit, result = self.cache.get(key, version)
+        if flg_hit:
+            return result
+        result = self.database.query(query, fetch, flg_commit, flg_print_query, params = params)
+        self.cache.put(key, version, result)
+        return result
+
+    def close(self):
+        self.database.close()
 
@@ -0,0 +1,256 @@
+import asyncio
+from dataclasses import dataclass, field, fields
+import json
+import logging
+import os
+import socket
+import threading
+from typing import AsyncIterator
+
+import psycopg
+
+from .run_tracker import RunDelta
+
+# Postgres NOTIFY channel the backend publishes committed cycles on
+CHANNEL = 'slither_cycle'
+# NOTIFY payloads must stay below 8000 bytes; past that the server list is dropped
+MAX_PAYLOAD_BYTES = 7900
+
+
+@dataclass
+class CycleEvent:
+    """What one committed cycle changed.
+
+    `servers` is None and the run counters are None when unknown, e.g. for the SQL run
+    engine or after a subscriber reconnected and may have missed events; consumers
+    should then assume everything changed.
+    """
+    version: int | None = None
+    created_at: str | None = None
+    servers: set[str] | None = field(default_factory=set)
+    runs_opened: int | None = 0
+    runs_closed: int | None = 0
+    rank_runs_opened: int | None = 0
+    rank_runs_closed: int | None = 0
+
+    @classmethod
+    def unknown(cls) -> 'CycleEvent':
+        return cls(servers=None, runs_opened=None, runs_closed=None, rank_runs_opened=None, rank_runs_closed=None)
+
+    def add_servers(self, server_ids):
+        if self.servers is not None:
+            self.servers.update(server_ids)
+
+    def add_delta(self, delta: RunDelta):
+        for attr, runs in (
+            ('runs_opened', delta.opened_runs),
+            ('runs_closed', delta.closed_runs),
+            ('rank_runs_opened', delta.opened_rank_runs),
+            ('rank_runs_closed', delta.closed_rank_runs)
+        ):
+            if getattr(self, attr) is not None:
+                setattr(self, attr, getattr(self, attr) + len(runs))
+            self.add_servers(run[0] for run in runs)
+
+    def affects_server(self, server_id: str) -> bool:
+        return self.servers is None or server_id in self.servers
+
+    @property
+    def flg_runs_closed(self) -> bool:
+        """True if finished runs, and with them the leaderboards, may have changed."""
+        return self.runs_closed is None or self.runs_closed > 0
+
+    def to_json(self) -> str:
+        data = {
+            'version': self.version,
+            'created_at': self.created_at,
+            'servers': sorted(self.servers) if self.servers is not None else None,
+            'runs_opened': self.runs_opened,
+            'runs_closed': self.runs_closed,
+            'rank_runs_opened': self.rank_runs_opened,
+            'rank_runs_closed': self.rank_runs_closed
+        }
+        payload = json.dumps(data, separators=(',', ':'))
+        if len(payload.encode()) > MAX_PAYLOAD_BYTES:
+            data['servers'] = None
+            payload = json.dumps(data, separators=(',', ':'))
+        return payload
+
+    @classmethod
+    def from_json(cls, payload: str) -> 'CycleEvent':
+        """Keys this version does not know, e.g. from a newer publisher, are ignored; missing ones keep their defaults."""
+        data = json.loads(payload)
+        if not isinstance(data, dict):
+            raise ValueError(f"expected a JSON object, got {type(data).__name__}")
+        data = {f.name: data[f.name] for f in fields(cls) if f.name in data}
+        servers = data.pop('servers', None)
+        return cls(servers=set(servers) if servers is not None else None, **data)
+
+    @classmethod
+    def parse(cls, payload: str, logger: logging.Logger) -> 'CycleEvent':
+        """from_json, falling back to CycleEvent.unknown() for a payload that cannot be read."""
+        try:
+            return cls.from_json(payload)
+        except (TypeError, ValueError) as error:
+            logger.warning(f"└─ unreadable cycle event ({error}), assuming everything changed")
+            return cls.unknown()
+
+
+def socket_path(database_path: str) -> str:
+    """Unix socket the backend of a SQLite database publishes its cycles on."""
+    return f"{database_path}.events.sock"
+
+
+class SocketBroadcaster():
+    """Newline-delimited JSON events to every client connected to a Unix socket.
+
+    SQLite has no LISTEN/NOTIFY, so the backend listens next to the database file and
+    writes each event to the connected frontends. Clients that are gone or do not keep
+    up are dropped; they resynchronize when they reconnect.
+    """
+    def __init__(self, path: str, logger: logging.Logger, send_timeout: float = 0.5):
+        self.path = path
+        self.logger = logger
+        self.send_timeout = send_timeout
+        self.clients: list[socket.socket] = []
+        self.lock = threading.Lock()
+        self.server = None
+
+    def start(self) -> 'SocketBroadcaster':
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except FileNotFoundError:
+            pass
+        except ConnectionRefusedError:
+            # left behind by a backend that did not shut down cleanly
+            os.unlink(self.path)
+        else:
+            raise RuntimeError(f"Another backend already publishes events on {self.path}")
+        finally:
+            probe.close()
+        server.bind(self.path)
+        server.listen()
+        self.server = server
+        threading.Thread(target=self.accept, name='slither-events', daemon=True).start()
+        self.logger.info(f"└─ publishing cycle events on {self.path}")
+        return self
+
+    def accept(self):
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                return  # closed
+            client.settimeout(self.send_timeout)
+            with self.lock:
+                self.clients.append(client)
+
+    def broadcast(self, payload: str):
+        line = payload.encode() + b'\n'
+        with self.lock:
+            alive = []
+            for client in self.clients:
+                try:
+                    client.sendall(line)
+                    alive.append(client)
+                except OSError:
+                    client.close()
+            self.clients = alive
+
+    def close(self):
+        if self.server is None:
+            return
+        self.server.close()
+        with self.lock:
+            for client in self.clients:
+                client.close()
+            self.clients = []
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        self.server = None
+
+
+class EventPublisher():
+    """Publishes a CycleEvent for every committed cycle.
+
+    On Postgres the NOTIFY is issued inside the cycle's transaction, so it is delivered
+    exactly when, and only if, the cycle commits. On SQLite the event is written to the
+    Unix socket after the commit.
+    """
+    def __init__(self, database):
+        self.database = database
+        self.logger = database.logger
+        self.broadcaster = None
+
+    def before_commit(self, event: CycleEvent):
+        if self.database.database_type == 'postgres':
+            self.database.query("SELECT pg_notify(%s, %s)", fetch = 'none', params = (CHANNEL, event.to_json()))
+
+    def after_commit(self, event: CycleEvent):
+        if self.database.database_type != 'sqlite':
+            return
+        if self.broadcaster is None:
+            try:
+                self.broadcaster = SocketBroadcaster(socket_path(self.database.conn_string), self.logger).start()
+            except (OSError, RuntimeError) as error:
+                self.logger.warning(f"└─ cycle events disabled: {error}")
+                self.broadcaster = False
+        if self.broadcaster:
+            self.broadcaster.broadcast(event.to_json())
+
+    def close(self):
+        if self.broadcaster:
+            self.broadcaster.close()
+        self.broadcaster = None
+
+
+async def subscribe(
+    database_type: str,
+    conn_string: str,
+    logger: logging.Logger,
+    retry_seconds: float = 5.0
+) -> AsyncIterator[CycleEvent]:
+    """
+    Yield the events of committed cycles as the backend publishes them.
+
+    Reconnects forever. After a reconnect a CycleEvent.unknown() is yielded first,
+    since events published while disconnected are lost.
+
+    Args:
+        database_type: 'postgres' or 'sqlite'.
+        conn_string: Postgres conninfo, or the path of the SQLite database file.
+    """
+    flg_connected_before = False
+    while True:
+        try:
+            if database_type == 'postgres':
+                conn = await psycopg.AsyncConnection.connect(conn_string, autocommit=True)
+                async with conn:
+                    await conn.execute(f"LISTEN {CHANNEL}")
+                    logger.info(f"Listening for cycle events on channel {CHANNEL}")
+                    if flg_connected_before:
+                        yield CycleEvent.unknown()
+                    flg_connected_before = True
+                    async for notify in conn.notifies():
+                        yield CycleEvent.parse(notify.payload, logger)
+            else:
+                reader, writer = await asyncio.open_unix_connection(socket_path(conn_string))
+                try:
+                    logger.info(f"Listening for cycle events on {socket_path(conn_string)}")
+                    if flg_connected_before:
+                        yield CycleEvent.unknown()
+                    flg_connected_before = True
+                    while line := await reader.readline():
+                        yield CycleEvent.parse(line.decode(errors='replace'), logger)
+                finally:
+                    writer.close()
+        except (OSError, psycopg.Error, ValueError) as error:
+            logger.warning(f"└─ cycle events unavailable ({error}), retrying in {retry_seconds:.0f}s")
+        else:
+            # the backend closed the socket, e.g. on shutdown
+            logger.warning(f"└─ cycle event stream ended, retrying in {retry_seconds:.0f}s")
+        await asyncio.sleep(retry_seconds)
@@ -0,0 +1,173 @@
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+
+# Prometheus client defaults, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric():
+    type_name = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: dict[tuple, float] = {}
+        self.lock = threading.Lock()
+
+    def key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def get(self, **labels) -> float:
+        return self.values.get(self.key(labels), 0.0)
+
+    def samples(self) -> list[tuple[str, dict, float]]:
+        with self.lock:
+            return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in self.values.items()]
+
+
+class Counter(Metric):
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    type_name = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+
+class Histogram(Metric):
+    """Observations counted into cumulative buckets, plus their sum and count."""
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        if 'le' in labelnames:
+            raise ValueError("'le' is reserved for histogram buckets")
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # labels -> [count per bucket..., sum, count]
+        self.values: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self.key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def get(self, **labels) -> float:
+        """Number of observations."""
+        state = self.values.get(self.key(labels))
+        return state[-1] if state else 0.0
+
+    def get_sum(self, **labels) -> float:
+        state = self.values.get(self.key(labels))
+        return state[-2] if state else 0.0
+
+    def samples(self) -> list[tuple[str, dict, float]]:
+        samples = []
+        with self.lock:
+            for key, state in self.values.items():
+                labels = dict(zip(self.labelnames, key))
+                cumulative = 0.0
+                for bound, count in zip(self.buckets, state):
+                    cumulative += count
+                    samples.append((f"{self.name}_bucket", {**labels, 'le': '+Inf' if bound == float('inf') else str(bound)}, cumulative))
+                samples.append((f"{self.name}_sum", labels, state[-2]))
+                samples.append((f"{self.name}_count", labels, state[-1]))
+        return samples
+
+
+class MetricsRegistry():
+    """Process-wide collection of metrics, rendered in the Prometheus text format."""
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+        self.lock = threading.Lock()
+
+    def register(self, cls, name: str, documentation: str, labelnames: tuple[str, ...] = (), **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} already registered with a different type or labels")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram, name, documentation, labelnames, buckets = buckets)
+
+    def render(self) -> str:
+        lines = []
+        with self.lock:
+            metrics = list(self.metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for name, labels, value in metric.samples():
+                label_text = ','.join(f'{key}="{value}"' for key, value in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+
+def start_http_server(port: int, addr: str = '127.0.0.1', registry: MetricsRegistry = REGISTRY) -> ThreadingHTTPServer:
+    """Serve `registry` at http://addr:port/metrics from a daemon thread; call shutdown() on the result to stop."""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # scrapes every few seconds would drown the backend log
+
+    server = ThreadingHTTPServer((addr, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='slither-metrics', daemon=True).start()
+    return server
@@ -0,0 +1,298 @@
+from dataclasses import dataclass, field
+
+
+@dataclass(frozen=True)
+class Migration:
+    """One schema version. Statements are run in order inside a single transaction."""
+    version: int
+    description: str
+    postgres: list[str] = field(default_factory=list)
+    sqlite: list[str] = field(default_factory=list)
+
+    def statements(self, database_type: str) -> list[str]:
+        if database_type == 'postgres':
+            return self.postgres
+        elif database_type == 'sqlite':
+            return self.sqlite
+        else:
+            raise ValueError(f"Invalid database type: {database_type}")
+
+
+# Append only: never edit a migration that has been released, add a new version instead.
+MIGRATIONS = [
+    Migration(
+        version = 1,
+        description = "index snapshot timestamps and open runs",
+        postgres = [
+            "CREATE INDEX IF NOT EXISTS idx_server_user_rank_created_at ON server_user_rank (created_at)",
+            "CREATE INDEX IF NOT EXISTS idx_user_run_open ON user_run (server_id, nick) WHERE end_time IS NULL",
+            "CREATE INDEX IF NOT EXISTS idx_user_rank_run_open ON user_rank_run (server_id, nick, rank) WHERE end_time IS NULL",
+        ],
+        # SQLite supports partial indexes as well, the statements are the same
+        sqlite = [
+            "CREATE INDEX IF NOT EXISTS idx_server_user_rank_created_at ON server_user_rank (created_at)",
+            "CREATE INDEX IF NOT EXISTS idx_user_run_open ON user_run (server_id, nick) WHERE end_time IS NULL",
+            "CREATE INDEX IF NOT EXISTS idx_user_rank_run_open ON user_rank_run (server_id, nick, rank) WHERE end_time IS NULL",
+        ]
+    ),
+    Migration(
+        version = 2,
+        description = "index finished runs by duration for the dashboard rankings",
+        postgres = [
+            "CREATE INDEX IF NOT EXISTS idx_user_run_duration ON user_run (duration_seconds DESC) WHERE duration_seconds IS NOT NULL",
+        ],
+        sqlite = [
+            "CREATE INDEX IF NOT EXISTS idx_user_run_duration ON user_run (duration_seconds DESC) WHERE duration_seconds IS NOT NULL",
+        ]
+    ),
+    Migration(
+        version = 3,
+        description = "compact storage: dictionary-encoded ids and per-server snapshot deltas",
+        postgres = [
+            "CREATE TABLE IF NOT EXISTS server_dict (server_key SERIAL PRIMARY KEY, server_id TEXT NOT NULL UNIQUE)",
+            "CREATE TABLE IF NOT EXISTS nick_dict (nick_id SERIAL PRIMARY KEY, nick TEXT NOT NULL UNIQUE)",
+            '''
+            CREATE TABLE IF NOT EXISTS server_snapshot (
+                server_key INTEGER NOT NULL,
+                created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                server_time TIMESTAMP WITH TIME ZONE,
+                row_count SMALLINT NOT NULL,
+                flg_keyframe BOOLEAN NOT NULL,
+                PRIMARY KEY (created_at, server_key)
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS server_user_rank_delta (
+                server_key INTEGER NOT NULL,
+                created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                rank SMALLINT NOT NULL,
+                nick_id INTEGER NOT NULL,
+                score INTEGER,
+                PRIMARY KEY (created_at, server_key, rank)
+            )
+            ''',
+            "CREATE INDEX IF NOT EXISTS idx_server_snapshot_keyframe ON server_snapshot (server_key, created_at) WHERE flg_keyframe",
+        ],
+        sqlite = [
+            "CREATE TABLE IF NOT EXISTS server_dict (server_key INTEGER PRIMARY KEY, server_id TEXT NOT NULL UNIQUE)",
+            "CREATE TABLE IF NOT EXISTS nick_dict (nick_id INTEGER PRIMARY KEY, nick TEXT NOT NULL UNIQUE)",
+            '''
+            CREATE TABLE IF NOT EXISTS server_snapshot (
+                server_key INTEGER NOT NULL,
+                created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                server_time TIMESTAMP WITH TIME ZONE,
+                row_count INTEGER NOT NULL,
+                flg_keyframe INTEGER NOT NULL,
+                PRIMARY KEY (created_at, server_key)
+            ) WITHOUT ROWID
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS server_user_rank_delta (
+                server_key INTEGER NOT NULL,
+                created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                rank INTEGER NOT NULL,
+                nick_id INTEGER NOT NULL,
+                score INTEGER,
+                PRIMARY KEY (created_at, server_key, rank)
+            ) WITHOUT ROWID
+            ''',
+            "CREATE INDEX IF NOT EXISTS idx_server_snapshot_keyframe ON server_snapshot (server_key, created_at) WHERE flg_keyframe",
+        ]
+    ),
+    Migration(
+        version = 4,
+        description = "checkpoints of the run replay, one row per replay shard",
+        postgres = [
+            '''
+            CREATE TABLE IF NOT EXISTS replay_checkpoint (
+                name TEXT PRIMARY KEY,
+                server_id TEXT NOT NULL,
+                n_rows BIGINT NOT NULL,
+                updated_at TIMESTAMP WITH TIME ZONE NOT NULL
+            )
+            ''',
+        ],
+        sqlite = [
+            '''
+            CREATE TABLE IF NOT EXISTS replay_checkpoint (
+                name TEXT PRIMARY KEY,
+                server_id TEXT NOT NULL,
+                n_rows INTEGER NOT NULL,
+                updated_at TIMESTAMP WITH TIME ZONE NOT NULL
+            )
+            ''',
+        ]
+    ),
+    Migration(
+        version = 5,
+        description = "analytics: finished top 10 runs aggregated per server and nick",
+        postgres = [
+            '''
+            CREATE TABLE IF NOT EXISTS nick_run_stats (
+                server_id TEXT NOT NULL,
+                nick TEXT NOT NULL,
+                n_runs INTEGER NOT NULL,
+                total_seconds BIGINT NOT NULL,
+                longest_run_seconds INTEGER,
+                longest_run_start TIMESTAMP WITH TIME ZONE,
+                max_score INTEGER,
+                best_rank INTEGER,
+                last_seen TIMESTAMP WITH TIME ZONE,
+                PRIMARY KEY (server_id, nick)
+            )
+            ''',
+            "CREATE INDEX IF NOT EXISTS idx_nick_run_stats_longest_run ON nick_run_stats (server_id, longest_run_seconds DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_nick_run_stats_n_runs ON nick_run_stats (server_id, n_runs DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_nick_run_stats_total_seconds ON nick_run_stats (server_id, total_seconds DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_nick_run_stats_max_score ON nick_run_stats (server_id, max_score DESC)",
+        ],
+        sqlite = [
+            '''
+            CREATE TABLE IF NOT EXISTS nick_run_stats (
+                server_id TEXT NOT NULL,
+                nick TEXT NOT NULL,
+                n_runs INTEGER NOT NULL,
+                total_seconds INTEGER NOT NULL,
+                longest_run_seconds INTEGER,
+                longest_run_start TIMESTAMP WITH TIME ZONE,
+                max_score INTEGER,
+                best_rank INTEGER,
+                last_seen TIMESTAMP WITH TIME ZONE,
+                PRIMARY KEY (server_id, nick)
+            )
+            ''',
+            "CREATE INDEX IF NOT EXISTS idx_nick_run_stats_longest_run ON nick_run_stats (server_id, longest_run_seconds DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_nick_run_stats_n_runs ON nick_run_stats (server_id, n_runs DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_nick_run_stats_total_seconds ON nick_run_stats (server_id, total_seconds DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_nick_run_stats_max_score ON nick_run_stats (server_id, max_score DESC)",
+        ]
+    ),
+    Migration(
+        version = 6,
+        description = "top k finished runs by duration and score, per server and overall",
+        postgres = [
+            '''
+            CREATE TABLE IF NOT EXISTS top_run (
+                metric TEXT NOT NULL,
+                server_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                nick TEXT NOT NULL,
+                value INTEGER NOT NULL,
+                start_time TIMESTAMP WITH TIME ZONE NOT NULL,
+                end_time TIMESTAMP WITH TIME ZONE NOT NULL,
+                PRIMARY KEY (metric, server_id, position)
+            )
+            ''',
+        ],
+        sqlite = [
+            '''
+            CREATE TABLE IF NOT EXISTS top_run (
+                metric TEXT NOT NULL,
+                server_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                nick TEXT NOT NULL,
+                value INTEGER NOT NULL,
+                start_time TIMESTAMP WITH TIME ZONE NOT NULL,
+                end_time TIMESTAMP WITH TIME ZONE NOT NULL,
+                PRIMARY KEY (metric, server_id, position)
+            ) WITHOUT ROWID
+            ''',
+        ]
+    ),
+    Migration(
+        version = 7,
+        description = "cycle version marker, bumped by every committed backend cycle",
+        postgres = [
+            '''
+            CREATE TABLE IF NOT EXISTS cycle_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version BIGINT NOT NULL,
+                created_at TIMESTAMP WITH TIME ZONE,
+                committed_at TIMESTAMP WITH TIME ZONE
+            )
+            ''',
+            "INSERT INTO cycle_version (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING",
+        ],
+        sqlite = [
+            '''
+            CREATE TABLE IF NOT EXISTS cycle_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL,
+                created_at TIMESTAMP WITH TIME ZONE,
+                committed_at TIMESTAMP WITH TIME ZONE
+            )
+            ''',
+            "INSERT OR IGNORE INTO cycle_version (id, version) VALUES (1, 0)",
+        ]
+    ),
+    Migration(
+        version = 8,
+        description = "log of committed cycles and of the servers that vanished from or appeared on the page, replay checkpoints by cycle",
+        postgres = [
+            '''
+            CREATE TABLE IF NOT EXISTS cycle_log (
+                created_at TIMESTAMP WITH TIME ZONE PRIMARY KEY,
+                flg_complete BOOLEAN NOT NULL
+            )
+            ''',
+            "CREATE INDEX IF NOT EXISTS idx_cycle_log_complete ON cycle_log (created_at) WHERE flg_complete",
+            '''
+            CREATE TABLE IF NOT EXISTS server_presence (
+                created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                server_id TEXT NOT NULL,
+                flg_present BOOLEAN NOT NULL,
+                PRIMARY KEY (created_at, server_id)
+            )
+            ''',
+            # checkpoints of the previous replay engine cannot be resumed by this one
+            "DROP TABLE IF EXISTS replay_checkpoint",
+            '''
+            CREATE TABLE replay_checkpoint (
+                name TEXT PRIMARY KEY,
+                created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                n_rows BIGINT NOT NULL,
+                updated_at TIMESTAMP WITH TIME ZONE NOT NULL
+            )
+            ''',
+        ],
+        sqlite = [
+            '''
+            CREATE TABLE IF NOT EXISTS cycle_log (
+                created_at TIMESTAMP WITH TIME ZONE PRIMARY KEY,
+                flg_complete INTEGER NOT NULL
+            ) WITHOUT ROWID
+            ''',
+            "CREATE INDEX IF NOT EXISTS idx_cycle_log_complete ON cycle_log (created_at) WHERE flg_complete",
+            '''
+            CREATE TABLE IF NOT EXISTS server_presence (
+                created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                server_id TEXT NOT NULL,
+                flg_present INTEGER NOT NULL,
+                PRIMARY KEY (created_at, server_id)
+            ) WITHOUT ROWID
+            ''',
+            "DROP TABLE IF EXISTS replay_checkpoint",
+            '''
+            CREATE TABLE replay_checkpoint (
+                name TEXT PRIMARY KEY,
+                created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                n_rows INTEGER NOT NULL,
+                updated_at TIMESTAMP WITH TIME ZONE NOT NULL
+            )
+            ''',
+        ]
+    ),
+]
+
+
+# Queries the indexes above exist for, used by SlitherDatabase.explain_indexes.
+# {ts} is replaced by a timestamp literal.
+INDEXED_QUERIES = {
+    'snapshot': "SELECT server_id, nick, rank FROM server_user_rank WHERE created_at = '{ts}'",
+    'previous_snapshot': "SELECT MAX(created_at) FROM server_user_rank WHERE created_at < '{ts}'",
+    'open_runs': "SELECT server_id, nick FROM user_run WHERE end_time IS NULL",
+    'open_rank_runs': "SELECT server_id, nick, rank FROM user_rank_run WHERE end_time IS NULL",
+    'longest_runs': "SELECT nick, duration_seconds FROM user_run WHERE duration_seconds IS NOT NULL ORDER BY duration_seconds DESC LIMIT 10",
+    'leaderboard': "SELECT nick, longest_run_seconds FROM nick_run_stats WHERE server_id = '*' ORDER BY longest_run_seconds DESC LIMIT 10",
+    'top_runs': "SELECT nick, value FROM top_run WHERE metric = 'duration' AND server_id = '*' ORDER BY position",
+}
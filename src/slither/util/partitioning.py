@@ -0,0 +1,289 @@
+import csv
+import datetime as dt
+import gzip
+from pathlib import Path
+import re
+
+from .migrations import MIGRATIONS
+
+PARTITION_PREFIX = 'server_user_rank_p'
+EPOCH = dt.datetime(1970, 1, 1, tzinfo=dt.timezone.utc)
+SERVER_USER_RANK_INDEX = re.compile(r"CREATE INDEX IF NOT EXISTS (\w+) ON server_user_rank \(")
+
+
+class PartitionManager():
+    """Time partitioning of server_user_rank by created_at.
+
+    On Postgres server_user_rank is a native range partitioned table with one partition
+    per `interval`. SQLite has no partitioning, there every period gets its own table
+    and server_user_rank is a UNION ALL view over them.
+
+    Partitions whose data no open run depends on can be dropped (optionally archived to
+    gzipped CSV first) by `enforce_retention`, which keeps the collector at a bounded size.
+    """
+    def __init__(
+        self,
+        database,
+        interval: dt.timedelta = dt.timedelta(days=1),
+        retention_partitions: int | None = None,
+        archive_dir: Path | None = None
+    ):
+        if interval.total_seconds() < 60:
+            raise ValueError(f"Partition interval too small: {interval}")
+        self.database = database
+        self.logger = database.logger
+        self.interval = interval
+        self.retention_partitions = retention_partitions
+        self.archive_dir = Path(archive_dir) if archive_dir else None
+        self.known: set[str] = set()
+        self.current_start: dt.datetime | None = None
+
+    def bounds(self, timestamp: dt.datetime) -> tuple[dt.datetime, dt.datetime]:
+        n_intervals = (timestamp - EPOCH) // self.interval
+        start = EPOCH + n_intervals * self.interval
+        return start, start + self.interval
+
+    def name(self, start: dt.datetime) -> str:
+        return f"{PARTITION_PREFIX}{start:%Y%m%d_%H%M}"
+
+    def start_of(self, name: str) -> dt.datetime:
+        return dt.datetime.strptime(name[len(PARTITION_PREFIX):], '%Y%m%d_%H%M').replace(tzinfo=dt.timezone.utc)
+
+    def table_for(self, timestamp: dt.datetime) -> str:
+        return self.name(self.bounds(timestamp)[0])
+
+    def list_partitions(self) -> list[str]:
+        """Names of all partitions, oldest first."""
+        if self.database.database_type == 'postgres':
+            rows = self.database.query(
+                '''
+                SELECT c.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                JOIN pg_class p ON p.oid = i.inhparent
+                WHERE p.relname = 'server_user_rank'
+                ''',
+                fetch = 'all'
+            )
+        else:
+            rows = self.database.query(
+                f"SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE '{PARTITION_PREFIX}%'",
+                fetch = 'all'
+            )
+        return sorted(row[0] for row in rows)
+
+    def setup(self, timestamp: dt.datetime):
+        """Create the partitioned server_user_rank and the partitions around `timestamp`."""
+        if self.database.database_type == 'postgres':
+            relkind = self.database.query(
+                "SELECT relkind FROM pg_class WHERE relname = 'server_user_rank' AND relnamespace = 'public'::regnamespace",
+                fetch = 'one'
+            )
+            if relkind and relkind[0] != 'p':
+                raise ValueError("server_user_rank exists and is not partitioned; migrate its data into a partitioned table first")
+            self.database.query(
+                '''
+                CREATE TABLE IF NOT EXISTS server_user_rank (
+                    server_id TEXT,
+                    server_time TIMESTAMP WITH TIME ZONE NOT NULL,
+                    rank INTEGER,
+                    nick TEXT,
+                    score INTEGER,
+                    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (server_id, server_time, rank, nick, created_at)
+                ) PARTITION BY RANGE (created_at)
+                ''',
+                fetch = 'none',
+                flg_commit = True
+            )
+        else:
+            table = self.database.query(
+                "SELECT type FROM sqlite_master WHERE name = 'server_user_rank'",
+                fetch = 'one'
+            )
+            if table and table[0] == 'table':
+                raise ValueError("server_user_rank exists as a plain table; move its data into partitions first")
+        self.known = set(self.list_partitions())
+        self.ensure(timestamp)
+        if self.database.database_type == 'sqlite':
+            self.create_view()
+
+    def reload(self):
+        """Re-read the partitions; a rolled back cycle also undid the ones `ensure` created in it."""
+        self.known = set(self.list_partitions())
+
+    def ensure(self, timestamp: dt.datetime):
+        """Make sure the partition for `timestamp` and the one after it exist."""
+        start, end = self.bounds(timestamp)
+        flg_created = False
+        for partition_start in (start, end):
+            name = self.name(partition_start)
+            if name in self.known:
+                continue
+            self.create_partition(name, partition_start)
+            self.known.add(name)
+            flg_created = True
+        if flg_created and self.database.database_type == 'sqlite':
+            self.create_view()
+
+    def create_partition(self, name: str, start: dt.datetime):
+        self.logger.info(f"└─ creating partition {name}...")
+        if self.database.database_type == 'postgres':
+            self.database.query(
+                f'''
+                CREATE TABLE IF NOT EXISTS {name} PARTITION OF server_user_rank
+                FOR VALUES FROM ('{start.isoformat()}') TO ('{(start + self.interval).isoformat()}')
+                ''',
+                fetch = 'none',
+                flg_commit = True
+            )
+            return
+        self.database.query(
+            f'''
+            CREATE TABLE IF NOT EXISTS {name} (
+                server_id TEXT,
+                server_time TIMESTAMP WITH TIME ZONE NOT NULL,
+                rank INTEGER,
+                nick TEXT,
+                score INTEGER,
+                created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                -- the key of the Postgres partitions, which must contain the partition column
+                PRIMARY KEY (server_id, server_time, rank, nick, created_at)
+            )
+            ''',
+            fetch = 'none',
+            flg_commit = True
+        )
+        # indexes the migrations put on server_user_rank
+        for migration in MIGRATIONS:
+            for statement in migration.sqlite:
+                partition_statement = self.partition_statement(statement, name)
+                if partition_statement:
+                    self.database.query(partition_statement, fetch = 'none', flg_commit = True)
+
+    def partition_statement(self, statement: str, name: str) -> str | None:
+        """Rewrite a migration's `CREATE INDEX ... ON server_user_rank` for one SQLite partition table."""
+        match = SERVER_USER_RANK_INDEX.search(statement)
+        if not match:
+            return None
+        return statement.replace(
+            f"{match[1]} ON server_user_rank (",
+            f"{match[1]}_{name[len(PARTITION_PREFIX):]} ON {name} ("
+        )
+
+    def adapt_statement(self, statement: str) -> list[str]:
+        """Statements to run for a migration statement, fanned out to the partitions where needed."""
+        if self.database.database_type != 'sqlite' or not SERVER_USER_RANK_INDEX.search(statement):
+            return [statement]
+        return [self.partition_statement(statement, name) for name in self.list_partitions()]
+
+    def create_view(self):
+        partitions = self.list_partitions()
+        self.database.query("DROP VIEW IF EXISTS server_user_rank", fetch = 'none', flg_commit = True)
+        self.database.query(
+            "CREATE VIEW server_user_rank AS " + " UNION ALL ".join(f"SELECT * FROM {name}" for name in partitions),
+            fetch = 'none',
+            flg_commit = True
+        )
+
+    def recent_source(self, timestamp: dt.datetime | None) -> str:
+        """FROM clause restricted to the partition of `timestamp` and the one before it."""
+        if timestamp is None:
+            return 'server_user_rank'
+        start, _ = self.bounds(timestamp)
+        previous_start = start - self.interval
+        if self.database.database_type == 'postgres':
+            # the lower bound lets the planner prune all older partitions
+            return f"(SELECT * FROM server_user_rank WHERE created_at >= '{previous_start.isoformat()}') AS server_user_rank"
+        names = [name for name in (self.name(previous_start), self.name(start)) if name in self.known]
+        return "(" + " UNION ALL ".join(f"SELECT * FROM {name}" for name in names) + ") AS server_user_rank"
+
+    def finalized_before(self) -> dt.datetime | None:
+        """Start of the oldest open run; raw data before it is no longer needed by any run."""
+        starts = [
+            self.database.from_db_timestamp(
+                self.database.query(f"SELECT MIN(start_time) FROM {table} WHERE end_time IS NULL", fetch = 'one')[0]
+            )
+            for table in ('user_run', 'user_rank_run')
+        ]
+        starts = [start for start in starts if start is not None]
+        return min(starts) if starts else None
+
+    def archive(self, name: str):
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        path = self.archive_dir / f"{name}.csv.gz"
+        self.logger.info(f"│    └─ archiving {name} to {path}...")
+        with self.database.get_conn() as conn, gzip.open(path, 'wt', encoding='utf-8', newline='') as file:
+            if self.database.database_type == 'postgres':
+                with conn.cursor() as cursor:
+                    with cursor.copy(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)") as copy:
+                        for block in copy:
+                            file.write(bytes(block).decode('utf-8'))
+            else:
+                cursor = conn.execute(f"SELECT * FROM {name}")
+                writer = csv.writer(file)
+                writer.writerow(column[0] for column in cursor.description)
+                writer.writerows(cursor)
+                cursor.close()
+
+    def drop(self, name: str):
+        if self.archive_dir:
+            self.archive(name)
+        self.logger.warning(f"│    └─ dropping partition {name}.")
+        self.database.query(f"DROP TABLE IF EXISTS {name}", fetch = 'none', flg_commit = True)
+        self.known.discard(name)
+        if self.database.database_type == 'sqlite':
+            self.create_view()
+        self.database.storage_stats.invalidate()
+
+    def partition_size_in_mb(self, name: str) -> float:
+        if self.database.database_type == 'postgres':
+            result = self.database.query(f"SELECT pg_total_relation_size('{name}')/(1024.0*1024.0)", fetch = 'one')
+        else:
+            result = self.database.query(
+                f"SELECT SUM(pgsize)/(1024.0*1024.0) FROM dbstat WHERE name IN (SELECT name FROM sqlite_master WHERE tbl_name = '{name}')",
+                fetch = 'one'
+            )
+        return float(result[0] or 0)
+
+    def crossed_boundary(self, timestamp: dt.datetime) -> bool:
+        """True on the first call and whenever `timestamp` lies in a later partition than on the previous call."""
+        start, _ = self.bounds(timestamp)
+        flg_crossed = self.current_start is None or start > self.current_start
+        self.current_start = start if self.current_start is None else max(start, self.current_start)
+        return flg_crossed
+
+    def enforce_retention(self, timestamp: dt.datetime, max_size_mb: float | None = None) -> list[str]:
+        """
+        Drop the oldest finalized partitions until at most `retention_partitions` remain
+        and the partitions fit into `max_size_mb`.
+
+        The partitions of `timestamp` and the one before it are always kept, and so is
+        every partition an open run started in or after.
+
+        Returns:
+            Names of the dropped partitions.
+        """
+        current_start, _ = self.bounds(timestamp)
+        finalized_before = self.finalized_before()
+        partitions = self.list_partitions()
+        sizes = {name: self.partition_size_in_mb(name) for name in partitions} if max_size_mb is not None else {}
+        candidates = [
+            name for name in partitions
+            if self.start_of(name) + self.interval <= current_start - self.interval
+            and (finalized_before is None or self.start_of(name) + self.interval <= finalized_before)
+        ]
+        dropped = []
+        for name in candidates:
+            remaining = [partition for partition in partitions if partition not in dropped]
+            over_count = self.retention_partitions is not None and len(remaining) > self.retention_partitions
+            over_size = max_size_mb is not None and sum(sizes[partition] for partition in remaining) > max_size_mb
+            if not (over_count or over_size):
+                break
+            self.drop(name)
+            dropped.append(name)
+        if max_size_mb is not None:
+            remaining_mb = sum(sizes[partition] for partition in partitions if partition not in dropped)
+            if remaining_mb > max_size_mb:
+                self.logger.critical(f"└─ partitions use {remaining_mb:.1f} MB > {max_size_mb} MB and none can be dropped yet.")
+        return dropped
@@ -0,0 +1,53 @@
+from collections import OrderedDict
+import threading
+import time
+
+from .metrics import REGISTRY
+
+
+def cache_key(query: str, fetch: str, params) -> tuple:
+    if isinstance(params, dict):
+        params = tuple(sorted(params.items()))
+    elif params is not None:
+        params = tuple(params)
+    return (query, fetch, params)
+
+
+class QueryCache():
+    """LRU cache of query results, each tagged with the cycle version it was read at.
+
+    An entry is served while the cycle version is unchanged and it is younger than
+    `ttl` seconds; the least recently used entry is evicted beyond `max_entries`.
+    Results are shared between callers and must not be modified.
+    """
+    def __init__(self, max_entries: int = 256, ttl: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: OrderedDict[tuple, tuple] = OrderedDict()
+        self.lock = threading.Lock()
+        self.request_counter = REGISTRY.counter('slither_query_cache_requests_total', "Query cache lookups by result", labelnames = ('result',))
+
+    def get(self, key: tuple, version) -> tuple[bool, object]:
+        """(True, result) for a fresh entry read at `version`, else (False, None)."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry_version, stored_at, result = entry
+                if entry_version == version and time.monotonic() - stored_at < self.ttl:
+                    self.entries.move_to_end(key)
+                    self.request_counter.inc(result = 'hit')
+                    return True, result
+                del self.entries[key]
+        self.request_counter.inc(result = 'miss')
+        return False, None
+
+    def put(self, key: tuple, version, result):
+        with self.lock:
+            self.entries[key] = (version, time.monotonic(), result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
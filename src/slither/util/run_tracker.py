@@ -0,0 +1,175 @@
+from dataclasses import dataclass, field
+import datetime as dt
+import logging
+
+
+@dataclass
+class OpenRun:
+    start_time: dt.datetime
+    last_seen: dt.datetime
+    max_score: int | None = None
+    min_rank: int | None = None
+
+
+@dataclass
+class RunDelta:
+    """Changes to user_run / user_rank_run produced by one cycle.
+
+    Runs are (server_id, nick, start_time, max_score, min_rank) on open and on update of
+    a still open run whose max_score or min_rank changed, and
+    (server_id, nick, start_time, end_time, duration_seconds, max_score, min_rank) on close.
+    Rank runs are (server_id, nick, rank, start_time) on open and
+    (server_id, nick, rank, start_time, end_time, duration_seconds) on close.
+    """
+    opened_runs: list[tuple] = field(default_factory=list)
+    closed_runs: list[tuple] = field(default_factory=list)
+    updated_runs: list[tuple] = field(default_factory=list)
+    opened_rank_runs: list[tuple] = field(default_factory=list)
+    closed_rank_runs: list[tuple] = field(default_factory=list)
+
+    def __bool__(self):
+        return bool(
+            self.opened_runs or self.closed_runs or self.updated_runs
+            or self.opened_rank_runs or self.closed_rank_runs
+        )
+
+
+def duration_seconds(start_time: dt.datetime, end_time: dt.datetime) -> int:
+    return int((end_time - start_time).total_seconds())
+
+
+class RunTracker():
+    """In-process run state, keyed by (server_id, nick) for runs and (server_id, nick, rank) for rank runs.
+
+    Holds every open run together with the last cycle it was seen in. Each call to
+    `advance` diffs the new snapshot against that state in O(rows in snapshot + open runs)
+    and returns only the runs that opened, closed or changed their aggregates. A run that disappears is closed
+    at the last timestamp its server was observed, like the SQL implementation closes
+    it at the previous snapshot.
+    """
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+        self.runs: dict[tuple[str, str], OpenRun] = {}
+        self.rank_runs: dict[tuple[str, str, int], OpenRun] = {}
+        # last cycle each server's table was observed in, changed or not
+        self.server_last_seen: dict[str, dt.datetime] = {}
+        self.flg_loaded = False
+
+    def load(self, open_runs: list[tuple], open_rank_runs: list[tuple], last_seen: dict[str, dt.datetime]):
+        """Rebuild the state from the open rows in user_run / user_rank_run.
+
+        Args:
+            open_runs: (server_id, nick, start_time, max_score, min_rank) of every open run.
+            open_rank_runs: (server_id, nick, rank, start_time) of every open rank run.
+            last_seen: server_id -> timestamp of the server's last stored snapshot. Its open
+                runs were, by definition, visible in it. Falls back to the run's start time
+                if unknown.
+        """
+        self.runs = {
+            (server_id, nick): OpenRun(start_time, last_seen.get(server_id, start_time), max_score, min_rank)
+            for server_id, nick, start_time, max_score, min_rank in open_runs
+        }
+        self.rank_runs = {
+            (server_id, nick, rank): OpenRun(start_time, last_seen.get(server_id, start_time))
+            for server_id, nick, rank, start_time in open_rank_runs
+        }
+        self.server_last_seen = dict(last_seen)
+        self.flg_loaded = True
+        self.logger.info(f"└─ Loaded {len(self.runs)} open runs and {len(self.rank_runs)} open rank runs.")
+
+    def reset(self):
+        """Forget all state; the next cycle reloads it from the database."""
+        self.runs.clear()
+        self.rank_runs.clear()
+        self.server_last_seen.clear()
+        self.flg_loaded = False
+
+    def end_time(self, server_id: str, run: OpenRun) -> dt.datetime:
+        return self.server_last_seen.get(server_id, run.last_seen)
+
+    def touch(self, server_ids: set[str], timestamp: dt.datetime):
+        """Record that the tables of `server_ids` were observed at `timestamp`.
+
+        Their open runs were still visible then and will be closed no earlier than this.
+        """
+        for server_id in server_ids:
+            self.server_last_seen[server_id] = timestamp
+
+    def advance(self, timestamp: dt.datetime, batch: list[dict], server_ids: set[str] | None = None) -> RunDelta:
+        """Apply the snapshot of one cycle and return the resulting run changes.
+
+        Args:
+            timestamp: created_at of the snapshot.
+            batch: server dicts as returned by process_table.
+            server_ids: servers covered by the snapshot. Open runs on servers outside this
+                set are left untouched. Defaults to all servers, i.e. the snapshot is the
+                complete leaderboard and everything not in it closes.
+        """
+        delta = RunDelta()
+        current_runs: dict[tuple[str, str], tuple[int, int]] = {}
+        current_rank_runs: set[tuple[str, str, int]] = set()
+        for data in batch:
+            server_id = data['server_id']
+            for record in data['records']:
+                rank = int(record['rank'])
+                score = int(record['score'])
+                key = (server_id, record['nick'])
+                if key in current_runs:
+                    # the same nick can hold several ranks (e.g. unnamed players)
+                    prev_score, prev_rank = current_runs[key]
+                    current_runs[key] = (max(score, prev_score), min(rank, prev_rank))
+                else:
+                    current_runs[key] = (score, rank)
+                current_rank_runs.add((server_id, record['nick'], rank))
+
+        for key in [key for key in self.runs if key not in current_runs]:
+            if server_ids is not None and key[0] not in server_ids:
+                continue
+            run = self.runs.pop(key)
+            end_time = self.end_time(key[0], run)
+            delta.closed_runs.append((
+                *key,
+                run.start_time,
+                end_time,
+                duration_seconds(run.start_time, end_time),
+                run.max_score,
+                run.min_rank
+            ))
+        for key, (score, rank) in current_runs.items():
+            run = self.runs.get(key)
+            if run is None:
+                self.runs[key] = OpenRun(timestamp, timestamp, score, rank)
+                delta.opened_runs.append((*key, timestamp, score, rank))
+            else:
+                run.last_seen = timestamp
+                max_score = score if run.max_score is None else max(run.max_score, score)
+                min_rank = rank if run.min_rank is None else min(run.min_rank, rank)
+                if (max_score, min_rank) != (run.max_score, run.min_rank):
+                    run.max_score, run.min_rank = max_score, min_rank
+                    delta.updated_runs.append((*key, run.start_time, max_score, min_rank))
+
+        for key in [key for key in self.rank_runs if key not in current_rank_runs]:
+            if server_ids is not None and key[0] not in server_ids:
+                continue
+            run = self.rank_runs.pop(key)
+            end_time = self.end_time(key[0], run)
+            delta.closed_rank_runs.append((
+                *key,
+                run.start_time,
+                end_time,
+                duration_seconds(run.start_time, end_time)
+            ))
+        for key in current_rank_runs:
+            run = self.rank_runs.get(key)
+            if run is None:
+                self.rank_runs[key] = OpenRun(timestamp, timestamp)
+                delta.opened_rank_runs.append((*key, timestamp))
+            else:
+                run.last_seen = timestamp
+
+        batch_server_ids = {data['server_id'] for data in batch}
+        for server_id in list(self.server_last_seen):
+            if server_id not in batch_server_ids and (server_ids is None or server_id in server_ids):
+                del self.server_last_seen[server_id]
+        self.touch(batch_server_ids, timestamp)
+        return delta
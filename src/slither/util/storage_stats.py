@@ -0,0 +1,79 @@
+import time
+
+from .metrics import MetricsRegistry, REGISTRY
+
+
+class StorageStats():
+    """Row count and size of the snapshot storage without scanning it every cycle.
+
+    The expensive numbers (catalog estimates on Postgres, COUNT(*) and dbstat on SQLite)
+    are sampled at most every `sample_interval` seconds. In between, the row count is
+    advanced by the rows each insert reports and the size is extrapolated from the
+    bytes per row of the last sample. Both are published as gauges on `registry`.
+    """
+    def __init__(self, database, sample_interval: float = 300.0, registry: MetricsRegistry = REGISTRY):
+        self.database = database
+        self.logger = database.logger
+        self.sample_interval = sample_interval
+        self.sampled_rows: int | None = None
+        self.sampled_size_mb: float | None = None
+        self.rows_since_sample = 0
+        self.last_sample: float | None = None
+
+        self.rows_gauge = registry.gauge('slither_storage_rows', "Estimated rows in the snapshot storage")
+        self.size_gauge = registry.gauge('slither_storage_size_mb', "Estimated size of the snapshot storage incl. indexes in MB")
+        self.inserted_counter = registry.counter('slither_storage_rows_inserted_total', "Snapshot rows inserted by this process")
+        self.sample_gauge = registry.gauge('slither_storage_last_sample_seconds', "Duration of the last storage size sample")
+
+    @property
+    def row_count(self) -> int:
+        return (self.sampled_rows or 0) + self.rows_since_sample
+
+    @property
+    def size_in_mb(self) -> float:
+        if not self.sampled_size_mb:
+            return 0.0
+        if not self.sampled_rows:
+            return self.sampled_size_mb
+        return self.sampled_size_mb * self.row_count / self.sampled_rows
+
+    def record_insert(self, n_rows: int):
+        """Account for rows an insert reported as written."""
+        if n_rows <= 0:
+            return
+        self.rows_since_sample += n_rows
+        self.inserted_counter.inc(n_rows)
+        self.publish()
+
+    def invalidate(self):
+        """Force a new sample on the next `refresh`, e.g. after dropping a partition."""
+        self.last_sample = None
+
+    def sample(self):
+        start = time.perf_counter()
+        self.sampled_rows = self.database.estimate_table_size_in_rows()
+        self.sampled_size_mb = float(self.database.fetch_table_size_in_mb())
+        self.rows_since_sample = 0
+        self.last_sample = time.monotonic()
+        elapsed = time.perf_counter() - start
+        self.sample_gauge.set(elapsed)
+        self.logger.debug(
+            f"└─ sampled storage in {elapsed:.3f}s: {self.sampled_rows} rows, {self.sampled_size_mb:.1f} MB"
+        )
+
+    def refresh(self, flg_force: bool = False) -> bool:
+        """
+        Sample the storage if the last sample is older than `sample_interval`.
+
+        Returns:
+            True if a new sample was taken.
+        """
+        flg_due = flg_force or self.last_sample is None or time.monotonic() - self.last_sample >= self.sample_interval
+        if flg_due:
+            self.sample()
+        self.publish()
+        return flg_due
+
+    def publish(self):
+        self.rows_gauge.set(self.row_count)
+        self.size_gauge.set(self.size_in_mb)
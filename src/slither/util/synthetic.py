@@ -0,0 +1,48 @@
+import datetime as dt
+import itertools
+import random
+
+
+def synthetic_cycles(
+    n_servers: int,
+    n_rows: int,
+    n_cycles: int | None,
+    churn: float,
+    seed: int = 0,
+    n_nicks: int = 100_000,
+    interval: float = 3.0,
+    start: dt.datetime = dt.datetime(2025, 1, 1, tzinfo=dt.timezone.utc)
+):
+    """
+    Yield (created_at, batch) of synthetic leaderboards in the shape parse_leaderboard returns.
+
+    Scores drift up every cycle and the tables are re-sorted, so ranks shuffle.
+
+    Args:
+        n_cycles: number of cycles, None for an endless stream.
+        churn: share of the ranks per server taken over by a new player every cycle.
+        n_nicks: number of distinct nicks players are drawn from; a small pool makes the
+            same nick show up on several servers and return after leaving.
+        interval: seconds between the cycles' created_at.
+    """
+    rng = random.Random(seed)
+    boards = {
+        f"bench_{server_idx}": [[f"player_{rng.randrange(n_nicks)}", rng.randint(1_000, 50_000)] for _ in range(n_rows)]
+        for server_idx in range(n_servers)
+    }
+    for cycle in range(n_cycles) if n_cycles is not None else itertools.count():
+        created_at = start + dt.timedelta(seconds=interval * cycle)
+        batch = []
+        for server_id, board in boards.items():
+            for entry in board:
+                entry[1] += rng.randint(0, 50)
+                if rng.random() < churn:
+                    entry[0] = f"player_{rng.randrange(n_nicks)}"
+                    entry[1] = rng.randint(1_000, 50_000)
+            board.sort(key=lambda entry: -entry[1])
+            batch.append({
+                'server_id': server_id,
+                'server_time': created_at.isoformat(),
+                'records': [{'rank': rank, 'nick': nick, 'score': score} for rank, (nick, score) in enumerate(board, start=1)]
+            })
+        yield created_at, batch
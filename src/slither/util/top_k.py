@@ -0,0 +1,155 @@
+import datetime as dt
+import heapq
+
+from .analytics import ALL_SERVERS
+from .run_tracker import RunDelta
+
+# metric -> user_run column it ranks by
+TOP_RUN_METRICS = {'duration': 'duration_seconds', 'score': 'max_score'}
+
+
+class TopK():
+    """The `k` largest entries seen, in a min-heap of (value, tie breaker, ...) tuples."""
+    def __init__(self, k: int):
+        self.k = k
+        self.heap: list[tuple] = []
+
+    def push(self, entry: tuple) -> bool:
+        """Offer an entry; returns True if it made it into the top k."""
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+            return True
+        if entry > self.heap[0]:
+            heapq.heapreplace(self.heap, entry)
+            return True
+        return False
+
+    def items(self) -> list[tuple]:
+        """Entries, largest first."""
+        return sorted(self.heap, reverse=True)
+
+
+class TopRuns():
+    """Top `k` finished runs by duration and by score, per server and over all servers.
+
+    Each closed run is offered to the heap of its server and to the global one, O(log k)
+    per run. Heaps that changed in a cycle are written to top_run inside the cycle's
+    transaction, so widgets read k rows by primary key, however long user_run grows.
+    The heaps are reloaded from top_run on first use after startup.
+    """
+    def __init__(self, database, k: int = 10):
+        self.database = database
+        self.logger = database.logger
+        self.k = k
+        self.heaps: dict[tuple[str, str], TopK] = {}
+        self.flg_loaded = False
+
+    @staticmethod
+    def entry(value: int, nick: str, start_time: dt.datetime, end_time: dt.datetime) -> tuple:
+        # on equal values the earlier run ranks higher, then the larger nick like in `rebuild`
+        return (value, -start_time.timestamp(), nick, start_time, end_time)
+
+    def heap(self, metric: str, server_id: str) -> TopK:
+        heap = self.heaps.get((metric, server_id))
+        if heap is None:
+            heap = self.heaps[(metric, server_id)] = TopK(self.k)
+        return heap
+
+    def reset(self):
+        self.heaps.clear()
+        self.flg_loaded = False
+
+    def load(self):
+        self.heaps.clear()
+        rows = self.database.query(
+            "SELECT metric, server_id, nick, value, start_time, end_time FROM top_run",
+            fetch = 'all'
+        )
+        for metric, server_id, nick, value, start_time, end_time in rows:
+            self.heap(metric, server_id).push(self.entry(
+                value, nick, self.database.from_db_timestamp(start_time), self.database.from_db_timestamp(end_time)
+            ))
+        self.flg_loaded = True
+        self.logger.info(f"└─ Loaded {len(self.heaps)} top run lists.")
+
+    def apply(self, delta: RunDelta):
+        """Offer the runs closed by one cycle and persist the lists that changed, on the caller's connection."""
+        if not self.flg_loaded:
+            self.load()
+        changed = set()
+        for server_id, nick, start_time, end_time, duration, max_score, _ in delta.closed_runs:
+            for metric, value in (('duration', duration), ('score', max_score)):
+                if value is None:
+                    continue
+                entry = self.entry(value, nick, start_time, end_time)
+                for scope in (server_id, ALL_SERVERS):
+                    if self.heap(metric, scope).push(entry):
+                        changed.add((metric, scope))
+        if changed:
+            self.persist(changed)
+
+    def persist(self, keys: set[tuple[str, str]]):
+        ts = self.database.to_db_timestamp
+        with self.database.get_conn() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.executemany(
+                    self.database.parameterize("DELETE FROM top_run WHERE metric = %s AND server_id = %s"),
+                    sorted(keys)
+                )
+                cursor.executemany(
+                    self.database.parameterize(
+                        "INSERT INTO top_run (metric, server_id, position, nick, value, start_time, end_time) VALUES (%s, %s, %s, %s, %s, %s, %s)"
+                    ),
+                    [
+                        (metric, server_id, position, nick, value, ts(start_time), ts(end_time))
+                        for metric, server_id in sorted(keys)
+                        for position, (value, _, nick, start_time, end_time) in enumerate(self.heaps[(metric, server_id)].items(), start=1)
+                    ]
+                )
+            finally:
+                cursor.close()
+
+    def top(self, metric: str, server_id: str = ALL_SERVERS) -> list[tuple]:
+        """(nick, value, start_time, end_time) of the top runs, best first, from memory."""
+        if metric not in TOP_RUN_METRICS:
+            raise ValueError(f"Invalid metric: {metric}")
+        if not self.flg_loaded:
+            self.load()
+        heap = self.heaps.get((metric, server_id))
+        return [(nick, value, start_time, end_time) for value, _, nick, start_time, end_time in (heap.items() if heap else [])]
+
+    def rebuild(self):
+        """Recompute top_run from all finished runs in user_run."""
+        self.logger.info("Rebuilding top_run...")
+        with self.database.get_conn() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("DELETE FROM top_run")
+                for metric, column in TOP_RUN_METRICS.items():
+                    cursor.execute(self.database.parameterize(f'''
+                        WITH finished AS (
+                            SELECT server_id, nick, {column} AS value, start_time, end_time
+                            FROM user_run
+                            WHERE end_time IS NOT NULL AND {column} IS NOT NULL
+                        ),
+                        scoped AS (
+                            SELECT * FROM finished
+                            UNION ALL
+                            SELECT '{ALL_SERVERS}' AS server_id, nick, value, start_time, end_time FROM finished
+                        ),
+                        ranked AS (
+                            SELECT
+                                scoped.*,
+                                ROW_NUMBER() OVER (PARTITION BY server_id ORDER BY value DESC, start_time, nick DESC) AS position
+                            FROM scoped
+                        )
+                        INSERT INTO top_run (metric, server_id, position, nick, value, start_time, end_time)
+                        SELECT %s, server_id, position, nick, value, start_time, end_time
+                        FROM ranked
+                        WHERE position <= %s
+                    '''), (metric, self.k))
+            finally:
+                cursor.close()
+        self.reset()
+        self.logger.info("└─ done.")
@@ -1,13 +1,127 @@
 from pathlib import Path
+import atexit
 import tzlocal
 import logging
 import colorlog
 import logging.config
+import logging.handlers
 import datetime as dt
 import json
+import queue
+import time
 from typing import Literal
 
 
+# TODO: modify to be able to handle extra arguments to give meta information to jsonl entries (make groups of processes)
+class JsonFormatter(logging.Formatter):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # resolving the zone reads the system configuration, do it once and not per record
+        self.local_tz = tzlocal.get_localzone()
+
+    def format(self, record):
+        log_record = {
+            "timestamp": dt.datetime.fromtimestamp(record.created, tz=self.local_tz).strftime("%Y-%m-%dT%H:%M:%S.%f%z"),
+            "level": record.levelname,
+            "filename": record.filename,
+            "lineno": record.lineno,
+            "message": record.getMessage()
+        }
+        return json.dumps(log_record)
+
+
+class BufferedFileHandler(logging.FileHandler):
+    """FileHandler writing through a large buffer.
+
+    logging.StreamHandler flushes after every record. Here records below WARNING are
+    only flushed once `flush_interval` seconds passed since the last flush, or when
+    someone calls flush() (the queue listener does when its queue runs empty).
+    A `flush_interval` of 0 flushes every record like FileHandler.
+    """
+    def __init__(self, filename, mode='a', encoding=None, delay=False, errors=None, buffer_size: int = 1 << 16, flush_interval: float = 1.0):
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.last_flush = time.monotonic()
+        self.flg_in_emit = False
+        super().__init__(filename, mode=mode, encoding=encoding, delay=delay, errors=errors)
+
+    def _open(self):
+        return open(self.baseFilename, self.mode, buffering=self.buffer_size, encoding=self.encoding, errors=self.errors)
+
+    def emit(self, record):
+        self.flg_in_emit = record.levelno < logging.WARNING
+        try:
+            super().emit(record)
+        finally:
+            self.flg_in_emit = False
+
+    def flush(self):
+        # handle() holds the lock around emit, so a flush from another thread (the
+        # 'default' and 'verbose' listeners share this handler) waits for it instead of
+        # seeing its flg_in_emit; the re-entrant lock lets emit's own flush through
+        with self.lock:
+            # StreamHandler.emit flushes after each record; only let that through every flush_interval
+            if self.flg_in_emit and time.monotonic() - self.last_flush < self.flush_interval:
+                return
+            super().flush()
+            self.last_flush = time.monotonic()
+
+
+class TimePartitionedFileHandler(BufferedFileHandler):
+    """Writes to <log_dir>/%Y/%m/%Y-%m-%d<suffix> and moves on to the next file at local midnight."""
+    def __init__(self, log_dir, suffix: str = '', mode='a', **kwargs):
+        self.log_dir = Path(log_dir)
+        self.suffix = suffix
+        self.rollover_at = 0.0
+        super().__init__(self.partition_path(time.time()), mode=mode, delay=True, **kwargs)
+        self.rollover_at = self.next_rollover(time.time())
+
+    def partition_path(self, timestamp: float) -> Path:
+        day = dt.datetime.fromtimestamp(timestamp)
+        path = self.log_dir / day.strftime("%Y/%m/") / f"{day.strftime('%Y-%m-%d')}{self.suffix}"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+    @staticmethod
+    def next_rollover(timestamp: float) -> float:
+        day = dt.datetime.fromtimestamp(timestamp).date()
+        return dt.datetime.combine(day + dt.timedelta(days=1), dt.time()).timestamp()
+
+    def emit(self, record):
+        if record.created >= self.rollover_at:
+            if self.stream is not None:
+                self.stream.close()
+                self.stream = None  # reopened on the new path by FileHandler.emit
+            self.baseFilename = str(self.partition_path(record.created).absolute())
+            self.rollover_at = self.next_rollover(record.created)
+        super().emit(record)
+
+
+class FlushingQueueListener(logging.handlers.QueueListener):
+    """QueueListener that flushes its handlers whenever it has caught up with the queue."""
+    def dequeue(self, block):
+        try:
+            return self.queue.get_nowait()
+        except queue.Empty:
+            for handler in self.handlers:
+                handler.flush()
+            return self.queue.get(block)
+
+
+# listeners started by setup_logging(flg_queue=True)
+_listeners: list[logging.handlers.QueueListener] = []
+
+
+@atexit.register
+def stop_logging():
+    """Write out the queued records and stop the background logging threads."""
+    while _listeners:
+        listener = _listeners.pop()
+        listener.stop()
+        for handler in listener.handlers:
+            handler.flush()
+
+
 def setup_logging(
     log_dir: Path,
     log_file: str,
@@ -19,35 +133,38 @@ def setup_logging(
         logging.CRITICAL
     ],
     flg_time_partitioned: bool = False,
-    flg_replace_log_file: bool = False):
-
-    # TODO: modify to be able to handle extra arguments to give meta information to jsonl entries (make groups of processes)
-    class JsonFormatter(logging.Formatter):
-        def format(self, record):
-            local_tz = tzlocal.get_localzone()
-            log_record = {
-                "timestamp": dt.datetime.fromtimestamp(record.created, tz=local_tz).strftime("%Y-%m-%dT%H:%M:%S.%f%z"),
-                "level": record.levelname,
-                "filename": record.filename,
-                "lineno": record.lineno,
-                "message": record.getMessage()
-            }
-            return json.dumps(log_record)
+    flg_replace_log_file: bool = False,
+    flg_queue: bool = False):
+    """
+    Configure the 'default' and 'verbose' loggers.
 
+    Args:
+        flg_time_partitioned: write to <log_dir>/%Y/%m/%Y-%m-%d*, switching files at midnight.
+        flg_queue: only enqueue records on the logging thread; formatting and buffered
+            file writes happen on a background thread per logger. Call stop_logging()
+            (registered at exit) to write out what is still queued.
+    """
     if flg_replace_log_file:
         handler_mode = 'w'
     else:
         handler_mode = 'a'
 
+    # records are flushed by the queue listener when it catches up, in direct mode after each record
+    flush_interval = 1.0 if flg_queue else 0.0
+
     # Ensure log directory exists
+    log_dir.mkdir(parents=True, exist_ok=True)
     if flg_time_partitioned:
-        log_dir = log_dir / dt.datetime.now().strftime("%Y/%m/")
-        log_file = f"{dt.datetime.now().strftime('%Y-%m-%d')}"
+        file_handlers = {
+            name: {'()': TimePartitionedFileHandler, 'log_dir': log_dir, 'suffix': suffix}
+            for name, suffix in [('file', ''), ('file_verbose', '_verbose.log'), ('json', '.jsonl')]
+        }
     else:
-        log_dir = log_dir
         log_file = log_file.rstrip('.log') # .log is added in the handler
-
-    log_dir.mkdir(parents=True, exist_ok=True)
+        file_handlers = {
+            name: {'()': BufferedFileHandler, 'filename': log_dir / filename}
+            for name, filename in [('file', log_file), ('file_verbose', f"{log_file}_verbose.log"), ('json', f'{log_file}.jsonl')]
+        }
 
     # Define the logging configuration
     logging_config = {
@@ -92,25 +209,25 @@ def setup_logging(
                 'stream': 'ext://sys.stdout',
             },
             'file': {
+                **file_handlers['file'],
                 'level': log_level,
                 'formatter': 'default',
-                'class': 'logging.FileHandler',
-                'filename': log_dir / log_file,
                 'mode': handler_mode,
+                'flush_interval': flush_interval,
             },
             'file_verbose': {
+                **file_handlers['file_verbose'],
                 'level': log_level,
                 'formatter': 'verbose',
-                'class': 'logging.FileHandler',
-                'filename': log_dir / f"{log_file}_verbose.log",
                 'mode': handler_mode,
+                'flush_interval': flush_interval,
             },
             'json': {
+                **file_handlers['json'],
                 'level': log_level,
                 'formatter': 'json',
-                'class': 'logging.FileHandler',
-                'filename': log_dir / f'{log_file}.jsonl',
                 'mode': handler_mode,
+                'flush_interval': flush_interval,
             },
         },
         'loggers': {
@@ -133,5 +250,18 @@ def setup_logging(
     }
 
     # Apply the configuration
+    stop_logging()
     logging.config.dictConfig(logging_config)
 
+    if flg_queue:
+        for name in ['default', 'verbose']:
+            logger = logging.getLogger(name)
+            handlers = list(logger.handlers)
+            records = queue.SimpleQueue()
+            for handler in handlers:
+                logger.removeHandler(handler)
+            logger.addHandler(logging.handlers.QueueHandler(records))
+            listener = FlushingQueueListener(records, *handlers, respect_handler_level=True)
+            listener.start()
+            _listeners.append(listener)
+